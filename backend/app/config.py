@@ -2,8 +2,112 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./debug.db"  # дефолт на SQLite
+    DATABASE_REPLICA_URL: str = ""        # реплика для чтения (get_current_user, GET); пусто — всё на основной
+    READ_REPLICA_MAX_LAG: float = 30.0    # сек; столько после изменения игрок читается с основной
+
+    # --- Пул соединений БД (на каждый движок) ---
+    DB_POOL_SIZE: int = 5                 # постоянных соединений
+    DB_MAX_OVERFLOW: int = 10             # сверх постоянных при пиках, закрываются после возврата
+    DB_POOL_TIMEOUT: float = 30.0         # сек ожидания свободного соединения до ошибки
+    DB_POOL_RECYCLE: int = 1800           # сек жизни соединения; -1 — без ограничения
+
+    # --- SQLite (когда DATABASE_URL — файл SQLite) ---
+    SQLITE_JOURNAL_MODE: str = "WAL"      # читатели не ждут писателя; "" — не трогать режим базы
+    SQLITE_SYNCHRONOUS: str = "NORMAL"    # в WAL fsync только на checkpoint; сбой питания — потеря последних commit
+    SQLITE_CACHE_SIZE: int = -65536       # страниц, отрицательное — КиБ (64 МиБ на соединение)
+    SQLITE_MMAP_SIZE: int = 268435456     # байт файла базы, читаемых через mmap
+    SQLITE_BUSY_TIMEOUT: int = 5000       # мс ожидания чужой блокировки записи
+    SQLITE_WRITE_QUEUE: bool = True       # запись через единственного писателя с групповым commit
+
+    # --- Пароли ---
+    PASSWORD_HASH_WORKERS: int = 0        # процессов для bcrypt; 0 — по числу ядер
+    PASSWORD_HASH_PROCESSES: bool = True  # False — хэшировать в threadpool вместо пула процессов
+
+    # --- Кэш авторизованных игроков ---
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_TTL: float = 60.0     # сек; изменения игрока сбрасывают запись сразу
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10_000
+
+    # --- Ограничение частоты входа/регистрации ---
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: str = ("/lg/login ip=30/60 account=10/60; /lg/token ip=30/60 account=10/60; "
+                        "/auth/register ip=10/60")  # "путь ip=N/сек account=N/сек; ..."
+    RATE_LIMIT_SHARDS: int = 64
+    RATE_LIMIT_SHARED: bool = False       # True — счётчики в общем хранилище (KV_STORE_URL) для всех воркеров
+
+    # --- Общее хранилище для нескольких воркеров ---
+    KV_STORE_URL: str = ""                # redis://...; пусто — в памяти процесса
+
+    # --- Почта ---
+    SMTP_SERVER: str = "smtp.gmail.com"
+    SMTP_PORT: int = 587
+    SMTP_USER: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_STARTTLS: bool = True
+    MAIL_SENDER_ENABLED: bool = True      # фоновая отправка из таблицы mail_outbox
+    MAIL_POOL_SIZE: int = 2               # SMTP-соединений, каждое — залогиненная сессия
+    MAIL_BATCH_SIZE: int = 50             # писем за одну сессию/проход
+    MAIL_MAX_ATTEMPTS: int = 5
+    MAIL_RETRY_BASE: float = 30.0         # сек; backoff 30, 60, 120, ...
+    MAIL_POLL_INTERVAL: float = 5.0       # как часто смотреть в outbox, если никто не разбудил
+
+    # --- Начисление опыта ---
+    XP_BUFFER_ENABLED: bool = False       # опыт через журнал xp_journal и пакетный перенос в players;
+                                          # выигрыш — на PostgreSQL с горячими строками игроков, на SQLite медленнее
+    XP_FLUSH_INTERVAL: float = 2.0        # сек между переносами журнала
+    XP_FLUSH_MAX_PENDING: int = 1000      # записей журнала в процессе, после которых перенос — сразу
+
+    # --- Статистика ---
+    STATS_BACKFILL_ENABLED: bool = True   # дозаполнять сводки по задачам, выполненным до их появления
+    STATS_BACKFILL_CHUNK: int = 10_000    # задач на транзакцию дозаполнения
+
+    # --- Рейтинг ---
+    LEADERBOARD_SNAPSHOT_PATH: str = "./leaderboard.snapshot"  # пусто — без снимков, загрузка из базы
+    LEADERBOARD_SYNC_INTERVAL: float = 30.0       # сек; догонять базу (другие воркеры, новые игроки)
+    LEADERBOARD_SNAPSHOT_INTERVAL: float = 300.0  # сек между снимками на диск
+
+    # --- AI inference ---
+    AI_BASE_URL: str = "https://router.huggingface.co/v1"  # OpenAI-совместимый endpoint
+    AI_TIMEOUT: float = 60.0          # общий таймаут одного вызова модели, сек
+    AI_CONNECT_TIMEOUT: float = 5.0
+    AI_MAX_CONNECTIONS: int = 100     # размер общего пула HTTP-соединений
+    AI_MAX_KEEPALIVE: int = 20
+    AI_MAX_CONCURRENCY: int = 16      # одновременных вызовов модели на процесс
+    AI_MAX_QUEUE: int = 64            # сверх этого — сразу 429 с Retry-After
+    AI_FAIR_QUEUE: bool = True        # раздавать очередь по кругу между пользователями
+
+    # --- Маршрутизация по backend'ам ---
+    AI_BACKENDS: str = ""             # "имя=модель@url,..."; пусто — один backend AI_BASE_URL + AI_MODEL
+    AI_TEMPLATE_BACKEND: bool = True  # локальные шаблонные квесты как последний резерв
+    AI_HEDGE_DELAY: float = 2.0       # через сколько сек дублировать запрос на следующий backend; 0 — выкл.
+    AI_BACKEND_WINDOW: int = 100      # вызовов в скользящем окне статистики backend'а
+    AI_BACKEND_MAX_ERROR_RATE: float = 0.5
+    AI_BACKEND_COOLDOWN: float = 30.0  # сек вне ротации после серии ошибок
+
+    # --- Стриминг (SSE) ---
+    SSE_REPLAY_TTL: float = 600.0         # сколько держать события генерации для переподключения, сек
+    SSE_REPLAY_MAX_STREAMS: int = 1000
+    SSE_RESUME_GRACE: float = 30.0        # сколько ждать переподключения (только при resumable в запросе)
+    SSE_ATTACH_TIMEOUT: float = 5.0       # генерация, к которой так и не подключился клиент, обрывается
+    SSE_HEARTBEAT_INTERVAL: float = 15.0  # комментарий-пинг, чтобы прокси не рвали тихое соединение
+
+    # --- Кэш квестов ---
+    QUEST_CACHE_ENABLED: bool = True
+    QUEST_CACHE_PERSISTENT: bool = True   # второй уровень в таблице quest_cache
+    QUEST_CACHE_MAX_ENTRIES: int = 10_000
+    QUEST_CACHE_TTL: float = 6 * 3600     # сек
+    QUEST_CACHE_VARIANTS: int = 3         # сколько разных квестов копить на один профиль
+
+    # --- Пул предгенерированных квестов ---
+    QUEST_POOL_ENABLED: bool = True
+    QUEST_POOL_SIZE: int = 5              # целевая глубина на каждую пару (диапазон уровней, категория)
+    QUEST_POOL_REFILL_INTERVAL: float = 30.0
+    QUEST_POOL_REFILL_BATCH: int = 10     # максимум генераций за один цикл пополнения
+    QUEST_POOL_CONCURRENCY: int = 2
+    QUEST_POOL_LEVEL_BANDS: str = "1-5,6-10,11-20,21-"
+    QUEST_POOL_CATEGORIES: str = "health,learning,productivity,creativity,sport"
 
     class Config:
         env_file = "../../.env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,81 +1,179 @@
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse, urlunparse, quote
+
 from dotenv import load_dotenv
 import psycopg2
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from backend.app.config import settings
+from backend.app.database.sqlite import SQLiteWriter, is_sqlite_file, sqlite_pragmas
+from backend.app.utils.metrics import metrics
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 database_url = os.getenv("DATABASE_URL")
-engine = create_engine(database_url, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def encode_database_url(url: str) -> str:
+    # Если есть не-ASCII символы в пароле, кодируем их
+    if "postgresql" in url:
+        parsed = urlparse(url)
+        if parsed.password:
+            netloc = f"{parsed.username}:{quote(parsed.password)}@{parsed.hostname}"
+            if parsed.port:
+                netloc += f":{parsed.port}"
+            return urlunparse((parsed.scheme, netloc, parsed.path, parsed.params, parsed.query, parsed.fragment))
+    return url
+
 
 def get_database_url():
+    return encode_database_url(database_url) if database_url else "sqlite:///./app.db"
 
-    if database_url:
-        # Если есть не-ASCII символы в пароле, кодируем их
-        if "postgresql" in database_url:
-            # Разбираем URL и кодируем компоненты
-            from urllib.parse import urlparse, urlunparse, quote
-
-            parsed = urlparse(database_url)
-            if parsed.password:
-                # Кодируем пароль
-                encoded_password = quote(parsed.password)
-                # Собираем URL обратно
-                netloc = f"{parsed.username}:{encoded_password}@{parsed.hostname}"
-                if parsed.port:
-                    netloc += f":{parsed.port}"
-
-                encoded_url = urlunparse((
-                    parsed.scheme,
-                    netloc,
-                    parsed.path,
-                    parsed.params,
-                    parsed.query,
-                    parsed.fragment
-                ))
-                return encoded_url
-
-    return database_url or "sqlite:///./app.db"
 
+def async_database_url(url: str) -> str:
+    """URL синхронного драйвера -> асинхронного: aiosqlite для SQLite, asyncpg для PostgreSQL"""
 
-SQLALCHEMY_DATABASE_URL = get_database_url()
+    scheme, separator, rest = url.partition("://")
+    driver = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}.get(scheme.split("+")[0])
+    return f"{driver}{separator}{rest}" if driver else url
 
-print(f"Database URL: {SQLALCHEMY_DATABASE_URL}")  # Для отладки
 
-try:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        pool_pre_ping=True,
-        connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+class _MeteredPool:
+    """Метрики пула: ожидание соединения (_do_get блокируется, пока все заняты), занятые и сверх pool_size"""
+
+    metrics_label = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.inc("db_pool_timeouts_total", engine=self.metrics_label)
+            raise
+        finally:
+            metrics.observe("db_pool_wait_seconds", time.perf_counter() - started, engine=self.metrics_label)
+            self._update_gauges()
+
+    def _do_return_conn(self, record):
+        # Событие checkin приходит до возврата в пул, поэтому гейджи считаем здесь, после него
+        super()._do_return_conn(record)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        metrics.set_gauge("db_pool_checked_out", self.checkedout(), engine=self.metrics_label)
+        # overflow() отрицателен, пока постоянная часть пула не занята целиком
+        metrics.set_gauge("db_pool_overflow", max(self.overflow(), 0), engine=self.metrics_label)
+
+
+def _metered_pool(base, label: str):
+    # Метка — атрибут класса, а не экземпляра: dispose() пересоздаёт пул через self.__class__
+    return type(f"Metered{base.__name__}", (_MeteredPool, base), {"metrics_label": label})
+
+
+def engine_options(url: str, label: str, is_async: bool = False) -> dict:
+    """Параметры пула из настроек; для SQLite в памяти пул свой (одно соединение), их не передаём"""
+
+    options = {"pool_pre_ping": True}
+    if url.startswith("sqlite"):
+        if not is_async:
+            options["connect_args"] = {"check_same_thread": False}
+        if make_url(url).database in (None, "", ":memory:"):
+            return options
+
+    options.update(
+        poolclass=_metered_pool(AsyncAdaptedQueuePool if is_async else QueuePool, label),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
     )
+    return options
+
 
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def tune_sqlite(engine):
+    """Для файла SQLite — pragmas на каждое новое соединение; остальные движки не трогает"""
+    if is_sqlite_file(engine.url):
+        event.listen(getattr(engine, "sync_engine", engine), "connect", sqlite_pragmas)
+    return engine
 
-    Base = declarative_base()
 
+SQLALCHEMY_DATABASE_URL = get_database_url()
+SQLALCHEMY_REPLICA_URL = encode_database_url(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else ""
+
+logger.info("Database URL: %s", make_url(SQLALCHEMY_DATABASE_URL).render_as_string(hide_password=True))
+
+Base = declarative_base()
+
+# Синхронный движок — фоновым воркерам (пул квестов, outbox, импорт), которые и так живут в потоках
+try:
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL, "background"))
 except Exception as e:
-    print(f"❌ Database connection error: {e}")
-    # Fallback на SQLite если PostgreSQL недоступен
+    logger.error("Database connection error: %s", e)
+    # Fallback на SQLite если драйвер PostgreSQL недоступен
     SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False}
-    )
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base = declarative_base()
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL, "background"))
+tune_sqlite(engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Обработчики запросов работают через асинхронный движок
+async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL),
+                                   **engine_options(SQLALCHEMY_DATABASE_URL, "primary", is_async=True))
+tune_sqlite(async_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# Чтение без записи можно отдать реплике; без DATABASE_REPLICA_URL читаем с основной базы
+if SQLALCHEMY_REPLICA_URL:
+    async_read_engine = create_async_engine(async_database_url(SQLALCHEMY_REPLICA_URL),
+                                            **engine_options(SQLALCHEMY_REPLICA_URL, "replica", is_async=True))
+    tune_sqlite(async_read_engine)
+else:
+    async_read_engine = async_engine
+read_replica_enabled = async_read_engine is not async_engine
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, expire_on_commit=False)
+
 
 def init_db():
+    # Модели объявлены на собственном Base в models.py
+    from backend.app.database import models
+
+    from backend.app.database.migrations import migrate
+
     Base.metadata.create_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    migrate(engine)
 
 # Dependency для получения сессии базы данных
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Dependency для обработчиков, которые только читают: реплика может отставать от основной базы
+async def get_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+@asynccontextmanager
+async def write_session(db: AsyncSession):
+    """Сессия для пишущего блока обработчика.
+
+    На файле SQLite (SQLITE_WRITE_QUEUE) — сессия единственного писателя процесса той же базы,
+    что у db: запись идёт по очереди и коммитится группой, без "database is locked".
+    Иначе — сама db. Внутри блока commit()/rollback() работают как обычно.
+    """
+
+    if not settings.SQLITE_WRITE_QUEUE or db.bind is None or not is_sqlite_file(db.bind.url):
         yield db
-    finally:
-        db.close()
+        return
+    async with SQLiteWriter.for_engine(db.bind).session() as session:
+        yield session
@@ -0,0 +1,118 @@
+import logging
+from datetime import datetime, UTC
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from backend.app.database import models
+from backend.app.utils.leveling import XP_PER_LEVEL_SQUARED
+
+logger = logging.getLogger(__name__)
+
+# create_all создаёт только недостающие таблицы; всё, что меняет уже существующие, — здесь
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("name", String, primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+    """Создаёт индексы, объявленные в моделях, если их ещё нет"""
+
+    def apply(connection: Connection):
+        declared = {index.name: index for table in models.Base.metadata.sorted_tables for index in table.indexes}
+        for name in names:
+            declared[name].create(connection, checkfirst=True)
+
+    return apply
+
+
+def _add_column(table: str, name: str) -> Callable[[Connection], None]:
+    """Добавляет объявленную в моделях колонку (nullable, без default), если её ещё нет"""
+
+    def apply(connection: Connection):
+        if name in {column["name"] for column in inspect(connection).get_columns(table)}:
+            return  # база создана create_all уже с колонкой
+        column = models.Base.metadata.tables[table].c[name]
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+
+    return apply
+
+
+def _cumulative_experience(connection: Connection):
+    """experience хранил опыт внутри уровня; теперь это суммарный опыт: прибавляем порог уровня"""
+
+    player, level = models.Player.__table__, models.Player.__table__.c.level
+    threshold = XP_PER_LEVEL_SQUARED * (level - 1) * level * (2 * level - 1) // 6  # делится нацело
+    connection.execute(update(player).values(experience=func.coalesce(player.c.experience, 0) + threshold))
+
+
+def _quest_pool_level_band(connection: Connection):
+    """Квесты пула предгенерации помечаются level_band — колонка и индекс для выборки пула"""
+
+    _add_column("generated_quests", "level_band")(connection)
+    _create_indexes("ix_generated_quests_level_band")(connection)
+
+
+# Порядок важен: миграции применяются по списку и только один раз
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_history_listing_indexes", _create_indexes(
+        "ix_tasks_user_created",
+        "ix_tasks_user_completed_created",
+        "ix_tasks_quest_id",
+        "ix_generated_quests_user_created",
+        "ix_generated_quests_user_category_created",
+    )),
+    ("0002_cumulative_experience", _cumulative_experience),
+    ("0003_tasks_completed_at_index", _create_indexes("ix_tasks_completed_at")),
+    ("0004_generated_quests_level_band", _quest_pool_level_band),
+]
+
+
+def _schema_is_current(connection: Connection) -> bool:
+    """Все таблицы, колонки и индексы моделей уже есть — база создана create_all по текущим моделям"""
+
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing:
+            return False
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        if not set(table.c.keys()) <= columns or not {index.name for index in table.indexes} <= indexes:
+            return False
+    return True
+
+
+def migrate(engine: Engine) -> List[str]:
+    """Применяет недостающие миграции, каждую в своей транзакции; возвращает применённые"""
+
+    _metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        done = set(connection.scalars(select(schema_migrations.c.name)))
+
+    if not done:
+        with engine.begin() as connection:
+            if _schema_is_current(connection):
+                # create_all без migrate: данные уже в текущем виде, а 0002, например,
+                # прибавила бы порог уровня к опыту, который и так суммарный — только отмечаем
+                now = datetime.now(UTC)
+                connection.execute(insert(schema_migrations),
+                                   [{"name": name, "applied_at": now} for name, _ in MIGRATIONS])
+                logger.info("Schema created by create_all, migrations marked as applied")
+                return []
+
+    applied = []
+    for name, apply in MIGRATIONS:
+        if name in done:
+            continue
+        with engine.begin() as connection:
+            apply(connection)
+            connection.execute(insert(schema_migrations).values(name=name, applied_at=datetime.now(UTC)))
+        logger.info("Applied migration %s", name)
+        applied.append(name)
+    return applied
@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, JSON, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, Boolean, JSON, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, UTC
 
+from backend.app.utils.leveling import level_for_xp
+
 Base = declarative_base()
 
 class Player(Base):
@@ -16,29 +18,32 @@ class Player(Base):
     habits = Column(JSON, default=list)
     goals = Column(JSON, default=list)
     preferences = Column(JSON, default=dict)
-    experience = Column(Integer, default=0)
+    experience = Column(Integer, default=0)  # суммарный опыт; уровень — leveling.level_for_xp
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.now(UTC))
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
     ai_settings = Column(JSON, default={"enabled": True, "model": "Qwen2.5-7B-Instruct"})
 
     quests = relationship("GeneratedQuest", back_populates="user")
     tasks = relationship("Task", back_populates="user")
 
     def add_experience(self, points: int):
-        self.experience += points
+        self.experience = (self.experience or 0) + points
         self.check_level_up()
 
     def check_level_up(self):
-        exp_needed = self.level ** 2 * 100
-        while self.experience >= exp_needed:
-            self.experience -= exp_needed
-            self.level += 1
-            exp_needed = self.level ** 2 * 100
+        # experience — суммарный опыт; уровень по нему в замкнутой форме. Для начисления
+        # из обработчиков — progression.complete_tasks: там прибавка атомарна в SQL
+        self.level = max(self.level or 1, level_for_xp(self.experience or 0))
 
 
 class GeneratedQuest(Base):
     __tablename__ = "generated_quests"
+    # Ключ keyset-пагинации истории квестов: (user_id, created_at, id)
+    __table_args__ = (
+        Index("ix_generated_quests_user_created", "user_id", "created_at", "id"),
+        Index("ix_generated_quests_user_category_created", "user_id", "category", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -48,9 +53,11 @@ class GeneratedQuest(Base):
     difficulty = Column(String)
     category = Column(String)
     ai_generated = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.now(UTC))
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
     ai_model = Column(String, nullable=True)
     generation_prompt = Column(Text, nullable=True)
+    # Квесты из пула предгенерации: user_id пустой, пока квест никто не забрал
+    level_band = Column(String, nullable=True, index=True)
 
     user_id = Column(Integer, ForeignKey("players.id"))
     user = relationship("Player", back_populates="quests")
@@ -60,17 +67,92 @@ class GeneratedQuest(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    # Ключ keyset-пагинации истории задач: (user_id, created_at, id)
+    __table_args__ = (
+        Index("ix_tasks_user_created", "user_id", "created_at", "id"),
+        Index("ix_tasks_user_completed_created", "user_id", "is_completed", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     description = Column(String)
     points = Column(Integer, default=0)
     is_completed = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.now(UTC))
-    completed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+    completed_at = Column(DateTime, nullable=True, index=True)  # синхронизация рейтинга
 
     user_id = Column(Integer, ForeignKey("players.id"))
     user = relationship("Player", back_populates="tasks")
 
-    quest_id = Column(Integer, ForeignKey("generated_quests.id"), nullable=True)
+    quest_id = Column(Integer, ForeignKey("generated_quests.id"), nullable=True, index=True)
     quest = relationship("GeneratedQuest", back_populates="tasks")
+
+
+class QuestCacheEntry(Base):
+    """Второй уровень кэша сгенерированных квестов (по отпечатку профиля игрока)"""
+    __tablename__ = "quest_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    fingerprint = Column(String(64), index=True, nullable=False)
+    quest = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class OutboxMail(Base):
+    """Исходящее письмо: пишется в одной транзакции с событием, отправляет фоновый MailSender"""
+    __tablename__ = "mail_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, default="pending", nullable=False, index=True)  # pending / sent / failed
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=lambda: datetime.now(UTC), nullable=False, index=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+    sent_at = Column(DateTime, nullable=True)
+
+
+class XPJournal(Base):
+    """Начисленный, но ещё не перенесённый в players опыт: пишется в одной транзакции
+    с выполнением задачи, переносит пачками фоновый XPBuffer"""
+    __tablename__ = "xp_journal"
+
+    id = Column(Integer, primary_key=True)  # без лишнего индекса: таблица пишется на каждое выполнение
+    user_id = Column(Integer, ForeignKey("players.id"), nullable=False, index=True)
+    delta = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+
+
+class DailyStat(Base):
+    """Сводка игрока за день (UTC) по категории квеста: обновляется при каждом выполнении задач,
+    чтобы статистика не сканировала tasks. category "" — задачи вне квестов"""
+    __tablename__ = "player_daily_stats"
+
+    user_id = Column(Integer, ForeignKey("players.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    category = Column(String, primary_key=True, default="")
+    tasks_completed = Column(Integer, default=0, nullable=False)
+    experience = Column(Integer, default=0, nullable=False)
+
+
+class PlayerStreak(Base):
+    """Серия дней подряд с выполненными задачами: текущая и лучшая"""
+    __tablename__ = "player_streaks"
+
+    user_id = Column(Integer, ForeignKey("players.id"), primary_key=True)
+    current_streak = Column(Integer, default=0, nullable=False)
+    longest_streak = Column(Integer, default=0, nullable=False)
+    last_active_day = Column(Date, nullable=True)
+
+
+class BackfillProgress(Base):
+    """Докуда дошло заполнение сводок по старым данным: продолжается с last_id после перезапуска"""
+    __tablename__ = "backfill_progress"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, default=0, nullable=False)
+    cutoff = Column(DateTime, nullable=False)  # раньше — заполняет backfill, с этого момента — сами выполнения
+    finished_at = Column(DateTime, nullable=True)
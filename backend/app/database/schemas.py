@@ -1,16 +1,22 @@
-from pydantic import BaseModel, EmailStr, constr
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, conint, conlist, constr
+from datetime import date, datetime
 from typing import Optional, List
 
 class PlayerBase(BaseModel):
     username: str
     email: EmailStr
 
-class PlayerCreate(BaseModel):
+class PlayerCredentials(BaseModel):
     username: str
     email: str
+
+class PlayerCreate(PlayerCredentials):
     password: constr(min_length=8, max_length=72)
 
+class PrehashedPlayerCreate(PlayerCredentials):
+    """Игрок с готовым bcrypt-хэшем (импорт от партнёров)"""
+    hashed_password: constr(pattern=r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")  # 60 символов
+
 class Player(PlayerBase):
     id: int
     level: int
@@ -50,6 +56,7 @@ class TaskCreate(TaskBase):
 class Task(TaskBase):
     id: int
     user_id: int
+    quest_id: Optional[int] = None
     is_completed: bool
     created_at: datetime
     completed_at: Optional[datetime] = None
@@ -61,6 +68,58 @@ class Task(TaskBase):
 class TaskComplete(BaseModel):
     is_completed: bool = True
 
+class TaskBatchComplete(BaseModel):
+    task_ids: conlist(int, min_length=1, max_length=100)
+
+class CompletionResult(BaseModel):
+    completed: List[int]            # закрытые этим запросом; уже выполненные сюда не попадают
+    experience_gained: int
+    experience: int                 # суммарный опыт после начисления
+    level: int
+    leveled_up: bool
+    next_level_experience: int      # суммарный опыт, с которого начнётся следующий уровень
+
+class Progress(BaseModel):
+    experience: int                 # вместе с ещё не перенесённым из журнала опыта
+    level: int
+    next_level_experience: int
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    player_id: int
+    username: Optional[str] = None
+    experience: int                 # в рейтинге категории — опыт за квесты этой категории
+
+class LeaderboardPage(BaseModel):
+    category: Optional[str] = None
+    total: int                      # игроков в рейтинге
+    entries: List[LeaderboardEntry]
+
+class DayStats(BaseModel):
+    day: date
+    tasks_completed: int
+    experience: int
+
+class CategoryStats(BaseModel):
+    category: Optional[str] = None  # None — задачи вне квестов
+    tasks_completed: int
+    experience: int
+
+class PlayerStats(BaseModel):
+    days: List[DayStats]            # каждый день окна, от старых к новым, включая пустые
+    categories: List[CategoryStats] # за то же окно
+    week_tasks_completed: int       # с понедельника текущей недели (UTC)
+    week_experience: int
+    current_streak: int             # дней подряд по сегодня или вчера
+    longest_streak: int
+
+class PlayerRank(BaseModel):
+    category: Optional[str] = None
+    rank: Optional[int] = None      # None — в этой категории игрок ещё ничего не выполнил
+    experience: int
+    total: int
+    neighbours: List[LeaderboardEntry]  # соседи по рейтингу, включая самого игрока
+
 class QuestBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -117,6 +176,34 @@ class QuestGenerationResponse(BaseModel):
     quest: GeneratedQuest
     tasks: List[Task]
 
+class QuestHistoryItem(BaseModel):
+    """Квест в истории; оборванная стрим-генерация оставляет квест без части полей"""
+    id: int
+    title: str
+    description: Optional[str] = None
+    steps: List[QuestStep] = []
+    estimated_time: Optional[str] = None
+    difficulty: Optional[str] = None
+    category: Optional[str] = None
+    ai_model: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class QuestPage(BaseModel):
+    items: List[QuestHistoryItem]
+    next_cursor: Optional[str] = None  # None — страниц больше нет
+
+class TaskPage(BaseModel):
+    items: List[Task]
+    next_cursor: Optional[str] = None
+
+class QuestBatchRequest(BaseModel):
+    count: conint(ge=1, le=10) = 5
+    theme: Optional[str] = None
+    category: Optional[str] = None
+
 class AISettings(BaseModel):
     enabled: bool = True
     model: str = "Qwen2.5-7B-Instruct"
@@ -127,5 +214,8 @@ class QuestGenerationRequest(BaseModel):
     theme: Optional[str] = None
     category: Optional[str] = None
     stream: bool = False
+    resumable: bool = False  # стрим: ждать переподключения по Last-Event-ID вместо обрыва при уходе клиента
     ai_settings: Optional[AISettings] = None
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
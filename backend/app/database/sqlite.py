@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from backend.app.config import settings
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def is_sqlite_file(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def sqlite_pragmas(dbapi_connection, _record):
+    """Настройки соединения SQLite: WAL, synchronous, кэш страниц, mmap, ожидание блокировки"""
+
+    pragmas = [f"synchronous={settings.SQLITE_SYNCHRONOUS}", f"cache_size={settings.SQLITE_CACHE_SIZE}",
+               f"mmap_size={settings.SQLITE_MMAP_SIZE}", f"busy_timeout={settings.SQLITE_BUSY_TIMEOUT}",
+               "temp_store=MEMORY"]
+    if settings.SQLITE_JOURNAL_MODE:
+        pragmas.insert(0, f"journal_mode={settings.SQLITE_JOURNAL_MODE}")  # хранится в файле базы
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+    finally:
+        cursor.close()
+
+
+class SQLiteWriter:
+    """Единственный писатель SQLite с групповым commit.
+
+    SQLite пишет одним писателем на всю базу: параллельные транзакции с разных соединений
+    ждут друг друга в busy timeout и падают с "database is locked". Здесь все пишущие блоки
+    процесса идут по очереди (FIFO asyncio.Lock) через одно соединение: блок — это SAVEPOINT
+    внутри общей транзакции (его commit/rollback — release/rollback savepoint), а COMMIT
+    делает фоновая задача писателя — один на всех, кто успел встать в очередь перед ней.
+    Блок возвращается только после этого COMMIT, так что подтверждённое записано.
+    Когда очередь пуста, соединение закрывается: под нагрузкой оно живёт, простаивая — нет.
+    """
+
+    _writers: Dict[str, "SQLiteWriter"] = {}
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def for_engine(cls, engine: AsyncEngine) -> "SQLiteWriter":
+        """Писатель той же базы, что у engine; один на файл базы в процессе"""
+        url = engine.url.render_as_string(hide_password=False)
+        if url not in cls._writers:
+            writer_engine = create_async_engine(url, poolclass=NullPool)
+            sync_engine = writer_engine.sync_engine
+
+            @event.listens_for(sync_engine, "connect")
+            def connect(dbapi_connection, _record):
+                sqlite_pragmas(dbapi_connection, _record)
+                # Транзакции ведёт SQLAlchemy, а не pysqlite: иначе SAVEPOINT работает неверно
+                dbapi_connection.isolation_level = None
+
+            @event.listens_for(sync_engine, "begin")
+            def begin(connection):
+                # IMMEDIATE берёт блокировку записи сразу: без повышения блокировки посреди транзакции
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+            cls._writers[url] = cls(writer_engine)
+        return cls._writers[url]
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Новый event loop (тесты, перезапуск): объекты asyncio старого к нему не подходят
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._wake = asyncio.Event()
+            self._pending: List[asyncio.Future] = []
+            self._queued = 0  # блоки в очереди и выполняющийся
+            self._conn: Optional[AsyncConnection] = None
+            self._task = loop.create_task(self._run())
+
+    @asynccontextmanager
+    async def session(self):
+        """Сессия пишущего блока; выход из блока ждёт общего COMMIT"""
+        self._bind_loop()
+        done = self._loop.create_future()
+        queued = time.perf_counter()
+        self._queued += 1
+        try:
+            async with self._lock:
+                metrics.observe("sqlite_writer_wait_seconds", time.perf_counter() - queued)
+                if self._conn is None:
+                    self._conn = await self.engine.connect()
+                if not self._conn.in_transaction():
+                    await self._conn.begin()
+                session = AsyncSession(bind=self._conn, join_transaction_mode="create_savepoint",
+                                       expire_on_commit=False)
+                try:
+                    yield session
+                finally:
+                    await session.close()  # незакоммиченное блоком откатывается до его savepoint
+                    self._pending.append(done)
+                    self._wake.set()
+        finally:
+            self._queued -= 1
+        await done
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            # Очередь FIFO: перед писателем — блоки, пришедшие раньше, их изменения войдут в этот COMMIT
+            async with self._lock:
+                await self._commit()
+
+    async def _commit(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        started = time.perf_counter()
+        try:
+            if self._conn is not None and self._conn.in_transaction():
+                await self._conn.commit()
+        except Exception as e:
+            logger.error(f"SQLite group commit failed: {e}")
+            await self._reset()
+            for future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if not self._queued:
+            await self._reset()
+        for future in pending:
+            if not future.done():
+                future.set_result(None)
+        metrics.observe("sqlite_group_commit_size", len(pending))
+        metrics.observe("sqlite_group_commit_seconds", time.perf_counter() - started)
+
+    async def _reset(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.rollback()
+                await conn.close()
+            except Exception:
+                pass
+
+    async def close(self):
+        if self._loop is asyncio.get_running_loop():
+            self._task.cancel()
+            async with self._lock:
+                await self._commit()
+                await self._reset()
+            self._loop = None
+        await self.engine.dispose()
+
+    @classmethod
+    async def close_all(cls):
+        for writer in list(cls._writers.values()):
+            await writer.close()
+        cls._writers.clear()
@@ -1,20 +1,36 @@
+import asyncio
 import json
+import logging
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Header, HTTPException, Request
 from fastapi.responses import StreamingResponse
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.app.config import settings
 from backend.app.database import schemas, models
-from backend.app.database.db import get_db
+from backend.app.database.db import get_db, write_session
+from backend.app.services.admission import QueueFullError
 from backend.app.services.ai_integration import AIservice
-from sqlalchemy.orm import Session
-from backend.app.security import get_current_user, get_current_active_user
+from backend.app.services.quest_pool import QuestPool
+from backend.app.services.quest_store import insert_tasks, save_quests, task_values
+from backend.app.services.quest_stream_parser import QuestStreamParser
+from backend.app.services.single_flight import SharedStream, StreamCancelledError
+from backend.app.services.stream_registry import StreamRegistry, parse_last_event_id
+from backend.app.security import get_current_user, get_current_active_user, invalidate_principal
+
+logger = logging.getLogger(__name__)
 
 ai_router = APIRouter()
 ai_service = AIservice()
+quest_pool = QuestPool.from_settings(ai_service)
+stream_registry = StreamRegistry.from_settings()
 
 @ai_router.post("/users/me/generate-quest", response_model=schemas.GeneratedQuest,)
 async def generate_ai_quest(quest_request: schemas.QuestGenerationRequest, current_user: models.Player = Depends(get_current_user),
-                            db: Session = Depends(get_db)):
+                            db: AsyncSession = Depends(get_db)):
     """Генерация персонализированного квеста с помощью AI"""
 
     # Подготовка данных пользователя
@@ -24,66 +40,259 @@ async def generate_ai_quest(quest_request: schemas.QuestGenerationRequest, curre
         "habits": current_user.habits or [],
         "preferences": current_user.preferences or {},
         "theme": quest_request.theme,
-        "category": quest_request.category
+        "category": quest_request.category,
+        "user_id": current_user.id,
+        "model": (current_user.ai_settings or {}).get("model"),  # подсказка роутеру моделей
     }
+    user_id = current_user.id
+
+    # Готовый квест из пула предгенерации (тематические запросы всегда генерируем вживую)
+    if settings.QUEST_POOL_ENABLED and not quest_request.theme:
+        async with write_session(db) as write_db:
+            pooled = await quest_pool.claim(write_db, user_id, current_user.level, quest_request.category)
+        if pooled is not None:
+            return pooled
+
+    # Не держим соединение из пула, пока ждём модель
+    await db.close()
 
     # Генерация квеста через AI сервис
-    ai_response = await ai_service.generate_quest(user_data)
-
-    # Сохранение в базу данных
-    db_quest = models.GeneratedQuest(
-        title=ai_response["title"],
-        description=ai_response["description"],
-        steps=ai_response["steps"],
-        estimated_time=ai_response["estimated_time"],
-        difficulty=ai_response["difficulty"],
-        category=ai_response["category"],
-        ai_generated=True,
-        ai_model=ai_service.default_model,
-        user_id=current_user.id
+    try:
+        ai_response = await ai_service.generate_quest(user_data)
+    except QueueFullError as e:
+        raise queue_full_exception(e)
+
+    async with write_session(db) as write_db:
+        saved = await save_quests(write_db, user_id, [ai_response], ai_service.default_model)
+    return saved[0].quest
+
+def queue_full_exception(error: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many quest generations in progress, try again later",
+        headers={"Retry-After": str(error.retry_after)},
     )
 
-    db.add(db_quest)
-    db.commit()
-
-    # Создание задач из шагов квеста
-    for step in ai_response["steps"]:
-        db_task = models.Task(
-            title=step["title"],
-            description=step["description"],
-            points=step["points"],
-            user_id=current_user.id,
-            quest_id=db_quest.id
-        )
-        db.add(db_task)
+@ai_router.post("/users/me/generate-quests", response_model=List[schemas.QuestGenerationResponse])
+async def generate_ai_quests_batch(batch_request: schemas.QuestBatchRequest,
+                                   current_user: models.Player = Depends(get_current_active_user),
+                                   db: AsyncSession = Depends(get_db)):
+    """Пачка стартовых квестов одним вызовом модели (онбординг)"""
+
+    user_data = {
+        "level": current_user.level,
+        "goals": current_user.goals or [],
+        "habits": current_user.habits or [],
+        "preferences": current_user.preferences or {},
+        "theme": batch_request.theme,
+        "category": batch_request.category,
+        "user_id": current_user.id,
+        "model": (current_user.ai_settings or {}).get("model"),  # подсказка роутеру моделей
+    }
+    user_id = current_user.id
+    await db.close()
 
-    db.commit()
-    return db_quest
+    try:
+        quests = await ai_service.generate_quests(user_data, batch_request.count)
+    except QueueFullError as e:
+        raise queue_full_exception(e)
+
+    async with write_session(db) as write_db:
+        return await save_quests(write_db, user_id, quests, ai_service.default_model)
 
 @ai_router.post("/users/me/generate-quest-stream")
-async def generate_ai_quest_stream(quest_stream: schemas.QuestGenerationRequest,
-                                   current_user: models.Player = Depends(get_current_active_user)):
-    """Стриминговая генерация текста (Server-Sent Events)"""
+async def generate_ai_quest_stream(quest_stream: schemas.QuestGenerationRequest, request: Request,
+                                   current_user: models.Player = Depends(get_current_active_user),
+                                   db: AsyncSession = Depends(get_db),
+                                   last_event_id: Optional[str] = Header(None)):
+    """Стриминговая генерация квеста (Server-Sent Events).
+
+    События: title, description, step (на каждый готовый шаг, уже сохранённый как Task),
+    done (итоговый квест) или error. У каждого события id "<stream_id>:<номер>";
+    повторный запрос с заголовком Last-Event-ID продолжает ту же генерацию с места обрыва.
+    Без resumable генерация обрывается, как только ушёл клиент; с ним — ждёт его SSE_RESUME_GRACE.
+    """
+
+    if last_event_id:
+        try:
+            stream_id, position = parse_last_event_id(last_event_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        events = stream_registry.get(stream_id, current_user.id)
+        if events is None:
+            raise HTTPException(status_code=404, detail="Quest stream not found or expired")
+        await db.close()
+        return sse_response(request, stream_id, events, position)
 
     user_data = {
         "level": current_user.level,
         "goals": current_user.goals or [],
         "habits": current_user.habits or [],
         "preferences": current_user.preferences or {},
+        "theme": quest_stream.theme,
+        "category": quest_stream.category,
+        "user_id": current_user.id,
+        "model": (current_user.ai_settings or {}).get("model"),  # подсказка роутеру моделей
     }
+    writer = StreamingQuestWriter(db.bind, current_user.id, ai_service.default_model)
+    await db.close()
+
+    try:
+        chunks = await ai_service.generate_quest(user_data, stream=True)
+    except QueueFullError as e:
+        raise queue_full_exception(e)
+
+    stream_id, events = stream_registry.start(current_user.id, quest_events(chunks, writer),
+                                              resumable=quest_stream.resumable)
+    return sse_response(request, stream_id, events, 0)
+
+async def quest_events(chunks, writer: "StreamingQuestWriter"):
+    """События квеста из кусков ответа модели; каждое событие уже сохранено в БД"""
+
+    parser = QuestStreamParser()
+    try:
+        async for chunk in chunks:
+            for event, payload in parser.feed(chunk):
+                yield event, await writer.handle(event, payload)
+            if parser.finished:
+                break
+    except Exception as e:
+        logger.error(f"Quest stream failed: {e}")
+    finally:
+        # Отписка от общего стрима; без подписчиков upstream-генерация обрывается
+        await chunks.aclose()
 
+    if not parser.finished:
+        yield "error", {"detail": "AI response was incomplete or invalid", "quest_id": writer.quest_id}
+
+def sse_response(request: Request, stream_id: str, events: SharedStream, position: int) -> StreamingResponse:
     async def generate():
-        full_response = ""
-        async for chunk in ai_service.generate_quest(user_data, stream=True):
-            full_response += chunk
-            yield f"data: {json.dumps({'chunk': chunk, 'is_complete': False})}\n\n"
-        yield f"data: {json.dumps({'is_complete': True, 'full_response': full_response})}\n\n"
+        subscription = events.subscribe(position)
+        seq = position
+        pending = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(subscription.__anext__())
+                done, _ = await asyncio.wait({pending}, timeout=settings.SSE_HEARTBEAT_INTERVAL)
+                if await request.is_disconnected():
+                    logger.info(f"SSE client disconnected from quest stream {stream_id}")
+                    return
+                if not done:
+                    yield ": ping\n\n"
+                    continue
+                finished, pending = pending, None
+                try:
+                    event, data = finished.result()
+                except StopAsyncIteration:
+                    return
+                seq += 1
+                yield sse_event(event, data, f"{stream_id}:{seq}")
+        except StreamCancelledError:
+            return
+        finally:
+            if pending is not None:
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            await subscription.aclose()
 
     return StreamingResponse(
         generate(),
         media_type="text/event-stream",  # ← Server-Sent Events
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Stream-ID": stream_id}
     )
+
+def sse_event(event: str, data: dict, event_id: Optional[str] = None) -> str:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class StreamingQuestWriter:
+    """Сохраняет квест из стрима по частям.
+
+    Квест создаётся, как только известны название и описание, каждый шаг сразу
+    становится Task, а на done квест дописывается — без повторного разбора ответа.
+    Генерация переживает обрыв соединения, поэтому каждое событие пишется своей сессией
+    через write_session, а не сессией запроса.
+    """
+
+    def __init__(self, bind, user_id: int, ai_model: str):
+        self.bind = bind
+        self.user_id = user_id
+        self.ai_model = ai_model
+        self.quest_id = None
+        self.title = None
+        self.description = None
+        self._pending_steps = []
+
+    @asynccontextmanager
+    async def _session(self):
+        async with AsyncSession(bind=self.bind, expire_on_commit=False) as db, write_session(db) as write_db:
+            yield write_db
+
+    async def handle(self, event: str, payload) -> dict:
+        async with self._session() as db:
+            if event == "done":
+                return await self._finish(db, payload)
+
+            if event == "step":
+                self._pending_steps.append(payload)
+            else:
+                setattr(self, event, payload)
+            task_ids = await self._save(db)
+
+        data = dict(payload) if event == "step" else {event: payload}
+        if event == "step":
+            data["task_id"] = task_ids[-1] if task_ids else None
+        data["quest_id"] = self.quest_id
+        return data
+
+    async def _save(self, db: AsyncSession) -> List[int]:
+        """Создаёт квест, если его ещё нет, и сохраняет накопленные шаги"""
+
+        if self.quest_id is None and self.title is not None and self.description is not None:
+            db_quest = models.GeneratedQuest(
+                title=self.title,
+                description=self.description,
+                steps=[],
+                ai_generated=True,
+                ai_model=self.ai_model,
+                user_id=self.user_id,
+            )
+            db.add(db_quest)
+            await db.flush()
+            self.quest_id = db_quest.id
+
+        task_ids = []
+        if self.quest_id is not None and self._pending_steps:
+            rows = await insert_tasks(db, task_values(self._pending_steps, self.user_id, self.quest_id))
+            self._pending_steps = []
+            task_ids = [row.id for row in rows]
+        if db.in_transaction():
+            await db.commit()
+        return task_ids
+
+    async def _finish(self, db: AsyncSession, quest: dict) -> dict:
+        self.title, self.description = quest["title"], quest["description"]
+        await self._save(db)
+
+        await db.execute(
+            update(models.GeneratedQuest)
+            .where(models.GeneratedQuest.id == self.quest_id)
+            .values(
+                title=quest["title"],
+                description=quest["description"],
+                steps=quest["steps"],
+                estimated_time=quest["estimated_time"],
+                difficulty=quest["difficulty"],
+                category=quest["category"],
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+        db_quest = await db.get(models.GeneratedQuest, self.quest_id, populate_existing=True)
+        return {"quest": schemas.GeneratedQuest.model_validate(db_quest).model_dump(mode="json")}
+
 @ai_router.get("/users/me/ai-settings", response_model=schemas.AISettings)
 def get_ai_settings(current_user: models.Player = Depends(get_current_active_user)):
     """Получение настроек AI пользователя"""
@@ -91,12 +300,23 @@ def get_ai_settings(current_user: models.Player = Depends(get_current_active_use
     return current_user.ai_settings or {"enable": True, "model": "Qwen2.5-7B-Instruct"}
 
 @ai_router.put("/users/me/ai-settings", response_model=schemas.AISettings)
-def update_ai_settings(settings: schemas.AISettings,
+async def update_ai_settings(settings: schemas.AISettings,
     current_user: models.Player = Depends(get_current_active_user),
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_db)):
     """Обновление настроек AI"""
 
-    current_user.ai_settings = settings.dict()
-    db.commit()
-    db.refresh(current_user)
-    return current_user.ai_settings
\ No newline at end of file
+    ai_settings = settings.dict()
+    # current_user может прийти из кэша и не быть привязан к сессии — пишем по id
+    async with write_session(db) as write_db:
+        await save_ai_settings(write_db, current_user.id, ai_settings)
+    await invalidate_principal(current_user)
+    return ai_settings
+
+async def save_ai_settings(db: AsyncSession, user_id: int, ai_settings: dict):
+    await db.execute(
+        update(models.Player)
+        .where(models.Player.id == user_id)
+        .values(ai_settings=ai_settings)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
@@ -1,41 +1,71 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.status import HTTP_400_BAD_REQUEST
 
 from backend.app.database import models, schemas
-from backend.app.database.db import get_db
-from backend.app.security import get_password_hash, create_email_token, SECRET_KEY, ALGORITHM
-from backend.app.utils.mailer import send_verification_email
+from backend.app.database.db import get_db, write_session
+from backend.app.security import get_password_hash_async, create_email_token, invalidate_principal, SECRET_KEY, ALGORITHM
+from backend.app.services.mail_outbox import MailSender
+from backend.app.utils.mailer import enqueue_verification_email
 
 auth_router = APIRouter()
+mail_sender = MailSender.from_settings()
 
 @auth_router.post("/register", response_model=schemas.Player)
-def register_user(user: schemas.PlayerCreate, db: Session = Depends(get_db)):
-    if db.query(models.Player).filter(models.Player.email == user.email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-    if db.query(models.Player).filter(models.Player.username == user.username).first():
-        raise HTTPException(status_code=400, detail="Username already taken")
+async def register_user(user: schemas.PlayerCreate, db: AsyncSession = Depends(get_db)):
+    # bcrypt — в пуле процессов, поток и event loop не заняты
+    hashed_password = await get_password_hash_async(user.password)
+
+    # Письмо с подтверждением уходит в outbox в той же транзакции, что и игрок; шлёт его MailSender
+    token = create_email_token({"sub": user.email})
+    async with write_session(db) as write_db:
+        new_user = await create_player(write_db, user, hashed_password, token)
+    mail_sender.wake()
+
+    return new_user
 
-    hashed_password = get_password_hash(user.password)
+async def create_player(db: AsyncSession, user: schemas.PlayerCreate, hashed_password: str,
+                  verification_token: Optional[str] = None) -> schemas.Player:
+    """Один INSERT ... RETURNING; уникальность проверяют ограничения БД, а не отдельные SELECT'ы"""
 
-    new_user = models.Player(
+    statement = insert(models.Player).values(
         username=user.username,
         email=user.email,
         hashed_password=hashed_password,
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    ).returning(models.Player)
+    try:
+        # Схема собирается до commit: после него объект истекает и потребовал бы ещё один SELECT
+        new_user = schemas.Player.model_validate((await db.execute(statement)).scalar_one())
+        if verification_token is not None:
+            enqueue_verification_email(db, new_user.email, verification_token)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        column = unique_violation(e)
+        if column == "email":
+            raise HTTPException(status_code=400, detail="Email already registered")
+        if column == "username":
+            raise HTTPException(status_code=400, detail="Username already taken")
+        raise
+    return new_user
 
-    # Генерируем токен для подтверждения
-    token = create_email_token({"sub": new_user.email})
-    #send_verification_email(new_user.email, token)
+def unique_violation(error: IntegrityError) -> Optional[str]:
+    """Какая колонка players нарушила уникальность: "email", "username" или None"""
 
-    return new_user
+    # SQLite: "UNIQUE constraint failed: players.email"; PostgreSQL: constraint ix_players_email / Key (email)=
+    message = str(error.orig)
+    for column in ("email", "username"):
+        if f"players.{column}" in message or f"ix_players_{column}" in message or f"({column})=" in message:
+            return column
+    return None
 
 @auth_router.get("/verify-email")
-def verify_email(token: str, db: Session = Depends(get_db)):
+async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -45,15 +75,24 @@ def verify_email(token: str, db: Session = Depends(get_db)):
     except JWTError:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid or expired token")
 
-    user = db.query(models.Player).filter(models.Player.email == email).first()
+    async with write_session(db) as write_db:
+        user = await mark_email_verified(write_db, email)
+    if user is None:
+        return {"message": "Email already verified"}
+
+    await invalidate_principal(user)
+    return {"message": "Email successfully verified"}
+
+async def mark_email_verified(db: AsyncSession, email: str) -> Optional[models.Player]:
+    """Отмечает email подтверждённым; None — если уже был подтверждён"""
+
+    user = (await db.execute(select(models.Player).where(models.Player.email == email))).scalars().first()
     if not user:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="User not found")
 
     if user.is_verified:
-        return {"message": "Email already verified"}
+        return None
 
     user.is_verified = True
-    db.commit()
-    db.refresh(user)
-
-    return {"message": "Email successfully verified"}
\ No newline at end of file
+    await db.commit()
+    return user
@@ -0,0 +1,85 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, exists, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.database import models, schemas
+from backend.app.database.db import get_read_db
+from backend.app.security import get_current_active_user
+
+history_router = APIRouter()
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def fetch_page(db: AsyncSession, query, model, cursor: Optional[str], limit: int):
+    """Keyset-страница от курсора, от новых к старым.
+
+    Условие (created_at, id) < курсора и сортировка по убыванию идут по индексу
+    (user_id, [фильтр,] created_at, id): база сразу встаёт на место курсора, поэтому
+    страница 10 000 стоит столько же, сколько первая, — в отличие от OFFSET.
+    """
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    query = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(query)).scalars().all()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.created_at, last.id)
+
+
+@history_router.get("/users/me/quests", response_model=schemas.QuestPage)
+async def list_quests(cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100),
+                      category: Optional[str] = None, completed: Optional[bool] = None,
+                      current_user: models.Player = Depends(get_current_active_user),
+                      db: AsyncSession = Depends(get_read_db)):
+    """История квестов игрока; completed — все задачи квеста выполнены"""
+
+    query = select(models.GeneratedQuest).where(models.GeneratedQuest.user_id == current_user.id)
+    if category:
+        query = query.where(models.GeneratedQuest.category == category)
+    if completed is not None:
+        has_tasks = exists().where(models.Task.quest_id == models.GeneratedQuest.id)
+        pending = exists().where(models.Task.quest_id == models.GeneratedQuest.id,
+                                 models.Task.is_completed.is_not(True))
+        query = query.where(and_(has_tasks, ~pending) if completed else or_(~has_tasks, pending))
+
+    items, next_cursor = await fetch_page(db, query, models.GeneratedQuest, cursor, limit)
+    return schemas.QuestPage(items=items, next_cursor=next_cursor)
+
+
+@history_router.get("/users/me/tasks", response_model=schemas.TaskPage)
+async def list_tasks(cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100),
+                     category: Optional[str] = None, completed: Optional[bool] = None,
+                     current_user: models.Player = Depends(get_current_active_user),
+                     db: AsyncSession = Depends(get_read_db)):
+    """История задач игрока; category — категория квеста, к которому относится задача"""
+
+    query = select(models.Task).where(models.Task.user_id == current_user.id)
+    if completed is not None:
+        query = query.where(models.Task.is_completed == completed)
+    if category:
+        query = query.join(models.GeneratedQuest, models.Task.quest_id == models.GeneratedQuest.id).where(
+            models.GeneratedQuest.category == category)
+
+    items, next_cursor = await fetch_page(db, query, models.Task, cursor, limit)
+    return schemas.TaskPage(items=items, next_cursor=next_cursor)
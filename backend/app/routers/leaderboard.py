@@ -0,0 +1,59 @@
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.database import models, schemas
+from backend.app.database.db import get_read_db
+from backend.app.security import get_current_active_user
+from backend.app.services.leaderboard import Leaderboard
+from backend.app.services.progression import read_progress
+
+leaderboard_router = APIRouter()
+leaderboard = Leaderboard.from_settings()
+
+
+def get_leaderboard() -> Leaderboard:
+    """Рейтинг процесса; зависимостью — чтобы тесты подставляли свой, на тестовой базе"""
+    return leaderboard
+
+
+@leaderboard_router.get("/leaderboard", response_model=schemas.LeaderboardPage)
+async def top_players(category: Optional[str] = None, limit: int = Query(10, ge=1, le=100),
+                      offset: int = Query(0, ge=0),
+                      current_user: models.Player = Depends(get_current_active_user),
+                      db: AsyncSession = Depends(get_read_db),
+                      leaderboard: Leaderboard = Depends(get_leaderboard)):
+    """Топ игроков по опыту — общий или по категории квестов"""
+
+    await leaderboard.ready()
+    board = leaderboard.board(category)
+    entries = await with_usernames(db, board.page(offset, limit))
+    return schemas.LeaderboardPage(category=category, total=len(board), entries=entries)
+
+
+@leaderboard_router.get("/users/me/rank", response_model=schemas.PlayerRank)
+async def my_rank(category: Optional[str] = None, neighbours: int = Query(2, ge=0, le=50),
+                  current_user: models.Player = Depends(get_current_active_user),
+                  db: AsyncSession = Depends(get_read_db),
+                  leaderboard: Leaderboard = Depends(get_leaderboard)):
+    """Место игрока и его соседи по рейтингу"""
+
+    await leaderboard.ready()
+    if leaderboard.board().score(current_user.id) is None:
+        # Зарегистрировался после последней синхронизации — добавить сейчас, не дожидаясь её
+        experience, _ = await read_progress(db, current_user.id)
+        leaderboard.record(current_user.id, experience, {})
+    board = leaderboard.board(category)
+    entries = await with_usernames(db, board.around(current_user.id, neighbours))
+    return schemas.PlayerRank(category=category, rank=board.rank(current_user.id),
+                              experience=board.score(current_user.id) or 0, total=len(board), neighbours=entries)
+
+
+async def with_usernames(db: AsyncSession, rows: List[Tuple[int, int, int]]) -> List[schemas.LeaderboardEntry]:
+    names = dict((await db.execute(
+        select(models.Player.id, models.Player.username).where(models.Player.id.in_([row[1] for row in rows]))
+    )).all()) if rows else {}
+    return [schemas.LeaderboardEntry(rank=rank, player_id=player_id, username=names.get(player_id), experience=score)
+            for rank, player_id, score in rows]
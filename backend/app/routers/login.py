@@ -1,29 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException
+import math
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.app.database.db import get_db
-from backend.app.database import models
-from backend.app.security import verify_password, create_access_token, create_refresh_token
+from backend.app.database import models, schemas
+from backend.app.security import (verify_password_async, create_access_token, create_refresh_token,
+                                  decode_refresh_token, refresh_store)
+from backend.app.services.rate_limiter import RateLimiter
+from backend.app.services.refresh_tokens import RefreshTokenError
 
 lg_router = APIRouter()
+rate_limiter = RateLimiter.from_settings()  # его же читает RateLimitMiddleware в main
 
-@lg_router.post("/login")
-def login(form_data:OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-
-    user = (
-        db.query(models.Player)
-        .filter(
-            (models.Player.username == form_data.username)
-            | (models.Player.email == form_data.username)
-        )
-        .first()
+async def find_player(db: AsyncSession, login: str) -> Optional[models.Player]:
+    """Игрок по username или email"""
+    result = await db.execute(
+        select(models.Player).where(or_(models.Player.username == login, models.Player.email == login))
     )
+    return result.scalars().first()
+
+async def check_player_limit(request: Request, user: models.Player):
+    """Лимит попыток на саму учётку, до bcrypt: вход по username и по email — одно ведро"""
+    retry_after = await rate_limiter.hit_player(request.url.path, user.id)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Too many requests, try again later",
+                            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+@lg_router.post("/login")
+async def login(request: Request, form_data:OAuth2PasswordRequestForm = Depends(),
+                db: AsyncSession = Depends(get_db)):
+
+    user = await find_player(db, form_data.username)
+    await db.close()  # соединение возвращается в пул и не простаивает, пока идёт bcrypt
 
     if not user:
         raise HTTPException(status_code=400, detail="Invalid email or password")
+    await check_player_limit(request, user)
 
-    if not verify_password(form_data.password, user.hashed_password):
+    # bcrypt — в пуле процессов, поток и event loop не заняты
+    if not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
     if not user.is_active:
@@ -39,25 +58,54 @@ def login(form_data:OAuth2PasswordRequestForm = Depends(), db: Session = Depends
     }
 
 @lg_router.post("/token")
-def login_for_access_token(
+async def login_for_access_token(
+        request: Request,
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
 
-    user = (
-        db.query(models.Player)
-        .filter(
-            (models.Player.username == form_data.username)
-            | (models.Player.email == form_data.username)
-        )
-        .first()
-    )
+    user = await find_player(db, form_data.username)
+    await db.close()
 
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
+    await check_player_limit(request, user)
 
-    if not verify_password(form_data.password, user.hashed_password):
+    if not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
     access_token = create_access_token({"sub": str(user.id)})
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@lg_router.post("/refresh")
+async def refresh(body: schemas.RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """Новая пара токенов по refresh-токену — без bcrypt.
+
+    Предъявленный токен становится использованным; его повторное предъявление
+    отзывает все токены этого входа.
+    """
+
+    invalid_exception = HTTPException(
+        status_code=401,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    claims = decode_refresh_token(body.refresh_token)
+    if claims is None:
+        raise invalid_exception
+
+    try:
+        await refresh_store.rotate(claims)
+    except RefreshTokenError:
+        raise invalid_exception
+
+    user = await find_player(db, claims["sub"])
+    if not user or not user.is_active:
+        raise invalid_exception
+
+    return {
+        "access_token": create_access_token({"sub": claims["sub"]}),
+        "refresh_token": create_refresh_token({"sub": claims["sub"], "fam": claims["fam"]}),
+        "token_type": "bearer"
+    }
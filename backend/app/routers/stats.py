@@ -0,0 +1,21 @@
+from datetime import datetime, UTC
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.database import models, schemas
+from backend.app.database.db import get_read_db
+from backend.app.security import get_current_active_user
+from backend.app.services.stats import StatsBackfill, read_stats
+
+stats_router = APIRouter()
+stats_backfill = StatsBackfill.from_settings()
+
+
+@stats_router.get("/users/me/stats", response_model=schemas.PlayerStats)
+async def get_stats(days: int = Query(30, ge=1, le=365),
+                    current_user: models.Player = Depends(get_current_active_user),
+                    db: AsyncSession = Depends(get_read_db)):
+    """Опыт и задачи по дням, категории, неделя и серия — из дневных сводок, без прохода по tasks"""
+
+    return await read_stats(db, current_user.id, days, datetime.now(UTC).date())
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.database import models, schemas
+from backend.app.database.db import get_db, write_session
+from backend.app.routers.leaderboard import get_leaderboard
+from backend.app.security import get_current_active_user, invalidate_principal
+from backend.app.services.leaderboard import Leaderboard
+from backend.app.services.progression import Completion, complete_tasks, read_progress
+from backend.app.services.xp_buffer import XPBuffer
+from backend.app.utils.leveling import xp_for_level
+
+tasks_router = APIRouter()
+xp_buffer = XPBuffer.from_settings()
+
+
+@tasks_router.post("/users/me/tasks/{task_id}/complete", response_model=schemas.CompletionResult)
+async def complete_task(task_id: int, current_user: models.Player = Depends(get_current_active_user),
+                        db: AsyncSession = Depends(get_db), leaderboard: Leaderboard = Depends(get_leaderboard)):
+    """Выполнение задачи: опыт за неё начисляется один раз, повторный вызов ничего не даёт"""
+
+    async with write_session(db) as write_db:
+        completion = await complete_tasks(write_db, current_user.id, [task_id], xp_buffer)
+    if not completion.completed and not await task_exists(db, current_user.id, task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    return await completion_result(current_user, completion, leaderboard)
+
+
+@tasks_router.post("/users/me/tasks/complete", response_model=schemas.CompletionResult)
+async def complete_tasks_batch(batch: schemas.TaskBatchComplete,
+                               current_user: models.Player = Depends(get_current_active_user),
+                               db: AsyncSession = Depends(get_db),
+                               leaderboard: Leaderboard = Depends(get_leaderboard)):
+    """Пачка задач одной транзакцией; чужие, несуществующие и уже выполненные id пропускаются"""
+
+    async with write_session(db) as write_db:
+        completion = await complete_tasks(write_db, current_user.id, list(dict.fromkeys(batch.task_ids)), xp_buffer)
+    return await completion_result(current_user, completion, leaderboard)
+
+
+@tasks_router.get("/users/me/progress", response_model=schemas.Progress)
+async def get_progress(current_user: models.Player = Depends(get_current_active_user),
+                       db: AsyncSession = Depends(get_db)):
+    """Опыт и уровень с учётом журнала; читается с основной базы — реплика может отставать от своих записей"""
+
+    experience, level = await read_progress(db, current_user.id)
+    return schemas.Progress(experience=experience, level=level, next_level_experience=xp_for_level(level + 1))
+
+
+async def task_exists(db: AsyncSession, user_id: int, task_id: int) -> bool:
+    task = await db.get(models.Task, task_id)
+    return task is not None and task.user_id == user_id
+
+
+async def completion_result(player: models.Player, completion: Completion,
+                            leaderboard: Leaderboard) -> schemas.CompletionResult:
+    if completion.experience_gained:
+        await invalidate_principal(player)  # в кэше авторизации — прежние опыт и уровень
+        leaderboard.record(player.id, completion.experience, completion.categories)
+    return schemas.CompletionResult(
+        completed=completion.completed,
+        experience_gained=completion.experience_gained,
+        experience=completion.experience,
+        level=completion.level,
+        leveled_up=completion.leveled_up,
+        next_level_experience=xp_for_level(completion.level + 1),
+    )
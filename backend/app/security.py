@@ -1,18 +1,25 @@
 import os
+import uuid
 from datetime import datetime, timedelta, UTC
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.app.database.db import get_db
+from backend.app.config import settings
+from backend.app.database.db import AsyncSessionLocal, get_read_db, read_replica_enabled
 from backend.app.database import models
+from backend.app.services.password_hasher import PasswordHasher, pwd_context
+from backend.app.services.kv_store import shared_store
+from backend.app.services.principal_cache import PrincipalCache
+from backend.app.services.refresh_tokens import RefreshTokenStore
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher.from_settings()
+principal_cache = PrincipalCache.from_settings()
 
 SECRET_KEY = os.getenv("SECRET_KEY", "changeme")
 ALGORITHM = "HS256"
@@ -24,10 +31,12 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 REFRESH_SECRET_KEY = os.getenv("REFRESH_SECRET_KEY", "superrefresh")
 
+refresh_store = RefreshTokenStore(shared_store, family_ttl=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS).total_seconds())
+
 # --- USERS ---
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ) -> models.Player:
     """Получает текущего пользователя по JWT токену"""
     credentials_exception = HTTPException(
@@ -44,12 +53,45 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.Player).filter(models.Player.username == username).first()
+    version = ""
+    if principal_cache.enabled:
+        cached, version = await principal_cache.lookup(username)
+        if cached is not None:
+            return cached
+
+    # Игрока недавно меняли — реплика может ещё не догнать запись. Метка своя, не версия кэша:
+    # она есть и при выключенном кэше и живёт READ_REPLICA_MAX_LAG, а не TTL кэша
+    recently_written = read_replica_enabled and await shared_store.get(_written_key(username)) is not None
+    user = None if recently_written else await _load_player(db, username)
+    if user is None and read_replica_enabled:
+        # Только что изменённого или зарегистрированного игрока дочитываем с основной базы
+        async with AsyncSessionLocal() as primary:
+            user = await _load_player(primary, username)
     if user is None:
         raise credentials_exception
+
+    if principal_cache.enabled:
+        principal_cache.put(username, user, version)
     return user
 
 
+async def _load_player(db: AsyncSession, username: str) -> Optional[models.Player]:
+    result = await db.execute(select(models.Player).where(models.Player.username == username))
+    return result.scalars().first()
+
+
+async def invalidate_principal(player: models.Player):
+    """Вызывать после любой записи, меняющей игрока (настройки, верификация, деактивация)"""
+    await principal_cache.invalidate_player(player)
+    if read_replica_enabled:
+        for subject in PrincipalCache.subjects(player):
+            await shared_store.set(_written_key(subject), 1, ttl=settings.READ_REPLICA_MAX_LAG)
+
+
+def _written_key(subject: str) -> str:
+    return f"principal:w:{subject}"
+
+
 def get_current_active_user(current_user: models.Player = Depends(get_current_user)) -> models.Player:
     """Проверяет что пользователь активен"""
     if not current_user.is_active:
@@ -62,10 +104,24 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 def get_password_hash(password: str) -> str:
-    print("Hashing password:", password[:20])
+    _check_password_length(password)
+    return pwd_context.hash(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password в пуле процессов — для async-обработчиков"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash в пуле процессов — для async-обработчиков"""
+    _check_password_length(password)
+    return await password_hasher.hash(password)
+
+
+def _check_password_length(password: str):
     if len(password.encode("utf-8")) > 72:
         raise ValueError(f"Password too long ({len(password)} chars)")
-    return pwd_context.hash(password)
 
 # --- TOKENS ---
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -75,21 +131,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """Refresh-токен с уникальным jti; fam — семейство токенов одного входа (по умолчанию новое)"""
     to_encode = data.copy()
-    expire = datetime.now(UTC) + (expires_delta or timedelta(minutes=REFRESH_TOKEN_EXPIRE_DAYS))
-    to_encode.update({"exp": expire})
+    expire = datetime.now(UTC) + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    jti = uuid.uuid4().hex
+    to_encode.update({"exp": expire, "jti": jti})
+    to_encode.setdefault("fam", jti)
     return jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
 
-def verify_refresh_token(token: str) -> Optional[str]:
-    """Валидирует refresh-токен и возвращает username/email"""
+def decode_refresh_token(token: str) -> Optional[Dict[str, Any]]:
+    """Claims валидного refresh-токена или None"""
     try:
         payload = jwt.decode(token, REFRESH_SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        return username
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+def verify_refresh_token(token: str) -> Optional[str]:
+    """Валидирует refresh-токен и возвращает username/email"""
+    payload = decode_refresh_token(token)
+    return payload["sub"] if payload else None
 
 # --- EMAIL TOKENS ---
 def create_email_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -0,0 +1,112 @@
+#admission
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Hashable
+
+from backend.app.utils.metrics import metrics
+
+
+class QueueFullError(Exception):
+    """Очередь генераций переполнена; retry_after — через сколько секунд стоит повторить"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"AI generation queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Ограничитель одновременных генераций с ограниченной FIFO-очередью.
+
+    При per_user_fair очередь раздаётся по кругу между пользователями
+    (внутри одного пользователя — FIFO), чтобы один клиент не занял всю очередь.
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 64, per_user_fair: bool = True,
+                 initial_service_time: float = 2.0, clock: Callable[[], float] = time.monotonic):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.per_user_fair = per_user_fair
+        self.clock = clock
+        self.active = 0
+        self.queued = 0
+        self.service_time = initial_service_time  # EWMA наблюдаемого времени обслуживания
+        self._queues: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+
+    def retry_after(self) -> int:
+        waves = (self.queued + 1) / self.max_concurrency
+        return max(1, math.ceil(waves * self.service_time))
+
+    async def acquire(self, user_key: Any = None):
+        if self.active < self.max_concurrency and self.queued == 0:
+            self.active += 1
+            self._report()
+            return
+
+        if self.queued >= self.max_queue:
+            metrics.inc("ai_admission_rejected_total")
+            raise QueueFullError(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        queue_key = user_key if self.per_user_fair else None
+        self._queues.setdefault(queue_key, deque()).append(future)
+        self.queued += 1
+        self._report()
+
+        started = self.clock()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но ожидающий ушёл — отдаём слот следующему
+                self.release()
+            else:
+                self._remove(queue_key, future)
+            raise
+        finally:
+            metrics.observe("ai_queue_wait_seconds", self.clock() - started)
+
+    def release(self, service_time: float = None):
+        if service_time is not None:
+            self.service_time = 0.8 * self.service_time + 0.2 * service_time
+            metrics.observe("ai_service_seconds", service_time)
+
+        while self._queues:
+            user_key, waiters = next(iter(self._queues.items()))
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._queues.move_to_end(user_key)  # следующий пользователь по кругу
+            else:
+                del self._queues[user_key]
+            if not future.done():
+                future.set_result(None)  # слот переходит ожидающему, active не меняется
+                self._report()
+                return
+
+        self.active -= 1
+        self._report()
+
+    @asynccontextmanager
+    async def slot(self, user_key: Any = None):
+        await self.acquire(user_key)
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.release(self.clock() - started)
+
+    def _remove(self, queue_key: Hashable, future: asyncio.Future):
+        waiters = self._queues.get(queue_key)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self._queues[queue_key]
+        self._report()
+
+    def _report(self):
+        metrics.set_gauge("ai_queue_depth", self.queued)
+        metrics.set_gauge("ai_active_generations", self.active)
@@ -0,0 +1,73 @@
+#ai_backends
+import json
+import logging
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class ChatBackend:
+    """Асинхронный клиент OpenAI-совместимого chat completions API.
+
+    Один экземпляр держит общий пул HTTP-соединений (httpx.AsyncClient),
+    поэтому его нужно создавать один раз на процесс и закрывать через aclose().
+    """
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None, timeout: float = 60.0,
+                 connect_timeout: float = 5.0, max_connections: int = 100, max_keepalive: int = 20,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers=headers,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            transport=transport,
+        )
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                       **params: Any) -> str:
+        """Полная генерация: возвращает текст ответа модели"""
+
+        response = await self.http.post(
+            "/chat/completions",
+            json={"model": model, "messages": messages, **params},
+            timeout=timeout if timeout is not None else self.timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data["choices"][0]["message"]["content"]
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                     **params: Any) -> AsyncGenerator[str, None]:
+        """Стриминговая генерация: отдаёт куски текста по мере прихода SSE-событий"""
+
+        async with self.http.stream(
+            "POST",
+            "/chat/completions",
+            json={"model": model, "messages": messages, "stream": True, **params},
+            timeout=timeout if timeout is not None else self.timeout,
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(payload)
+                except json.JSONDecodeError:
+                    logger.warning(f"Malformed stream chunk: {payload[:100]}")
+                    continue
+                choices = chunk.get("choices") or []
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+
+    async def aclose(self):
+        await self.http.aclose()
@@ -1,43 +1,179 @@
 #ai_integration
+import copy
 import os
+import hashlib
 import logging
-from typing import Dict, Any, AsyncGenerator
-from huggingface_hub import InferenceClient
+import json
+from typing import Dict, Any, AsyncGenerator, List, Optional
 from dotenv import load_dotenv
 
+from backend.app.config import settings
+from backend.app.database import schemas
+from backend.app.services.admission import AdmissionController, QueueFullError
+from backend.app.services.model_router import ModelRouter, RoutedBackend
+from backend.app.services.quest_cache import QuestCache, profile_fingerprint
+from backend.app.services.single_flight import SingleFlight
+from backend.app.utils.metrics import metrics
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 class AIservice:
 
-    def __init__(self):
+    def __init__(self, client=None, cache: Optional[QuestCache] = None):
         self.api_key = os.getenv("HUGGINGFACEHUB_API_TOKEN")
         self.default_model = os.getenv("AI_MODEL")
 
-        if not self.api_key:
+        if client is not None:
+            self.client = client
+        elif not self.api_key:
             logger.warning("HUGGINGFACEHUB_API_TOKEN not found. Some AI features may be disabled.")
             self.client = None
         else:
-            self.client = InferenceClient(api_key=self.api_key)
+            self.client = ModelRouter.from_settings(self.api_key, self.default_model, render=self._render_template)
+        self.flights = SingleFlight()
+        self.admission = AdmissionController(
+            max_concurrency=settings.AI_MAX_CONCURRENCY,
+            max_queue=settings.AI_MAX_QUEUE,
+            per_user_fair=settings.AI_FAIR_QUEUE,
+        )
+
+        if cache is not None:
+            self.cache = cache
+        elif settings.QUEST_CACHE_ENABLED:
+            self.cache = QuestCache.from_settings()
+        else:
+            self.cache = None
+
+    @property
+    def client(self) -> Optional[ModelRouter]:
+        return self._router
+
+    @client.setter
+    def client(self, client):
+        """Принимает ModelRouter или один backend (ChatBackend/совместимый) — его оборачиваем в роутер"""
+        if client is None or isinstance(client, ModelRouter):
+            self._router = client
+        else:
+            self._router = ModelRouter([RoutedBackend("default", client, self.default_model)],
+                                       hedge_delay=settings.AI_HEDGE_DELAY)
 
-    async def generate_quest(self, user_data: Dict[str, Any], stream: bool = False
-                              ) -> AsyncGenerator[str, None] | Dict[str, Any]:
+    async def aclose(self):
+        """Закрывает пул HTTP-соединений (вызывается при остановке приложения)"""
+        if self.client:
+            await self.client.aclose()
+
+    async def generate_quest(self, user_data: Dict[str, Any], stream: bool = False, use_cache: bool = True,
+                             fallback: bool = True) -> AsyncGenerator[str, None] | Dict[str, Any]:
+        """Генерация квеста. use_cache=False — свежий квест мимо кэша и склейки одинаковых запросов"""
 
         if not self.client:
+            if stream:
+                return self._fallback_streaming(user_data)
             return self._generate_fallback_quest(user_data)
 
         promt = self._built_quest_promt(user_data)
 
         try:
+            if not use_cache:
+                if stream:
+                    await self.admission.acquire(user_data.get("user_id"))
+                    return self._released_after(self._generate_streaming(promt, user_data, last_resort=fallback))
+                return await self._generate_complete(promt, user_data, last_resort=fallback)
+
+            # Одинаковые одновременные запросы идут в модель один раз
+            key = self._flight_key(promt, user_data.get("model"))
             if stream:
-                return self._generate_streaming(promt, user_data)
-            else:
-                return await self._generate_complete(promt, user_data)
+                return await self._shared_stream(key, promt, user_data, last_resort=fallback)
+            return await self.flights.do(key, lambda: self._generate_cached(promt, user_data))
+        except QueueFullError:
+            raise
         except Exception as e:
             logger.error(f"AI generation error: {e}")
+            if not fallback:
+                raise
+            metrics.inc("ai_fallback_total")
             return self._generate_fallback_quest(user_data)
 
+    async def _generate_cached(self, prompt: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        # Шаблонный backend здесь не зовём: резервный квест не должен попасть в кэш,
+        # его вернёт generate_quest при ошибке мимо кэша
+        if not self.cache:
+            return await self._generate_complete(prompt, user_data)
+
+        key = profile_fingerprint(user_data)
+        quest = await self.cache.get(key)
+        if quest is None:
+            quest = await self._generate_complete(prompt, user_data)
+            await self.cache.put(key, quest)
+        return quest
+
+    async def generate_quests(self, user_data: Dict[str, Any], count: int, fallback: bool = True
+                              ) -> List[Dict[str, Any]]:
+        """Несколько разных квестов одним вызовом модели. С fallback — всегда ровно count:
+        без модели, при её ошибке или коротком ответе недостающие добираются резервными"""
+
+        if not self.client:
+            return self._generate_fallback_quests(user_data, count)
+
+        promt = self._built_batch_promt(user_data, count)
+
+        try:
+            async with self.admission.slot(user_data.get("user_id")):
+                content = await self.client.complete(
+                    messages=[{"role": "user", "content": promt}],
+                    hint=user_data.get("model"),
+                    last_resort=fallback,
+                    batch=count,
+                    max_tokens=min(1024 * count, 8192),
+                    temperature=0.9,
+                    top_p=0.9
+                )
+            quests = self._parse_ai_batch_response(content)[:count]
+        except QueueFullError:
+            raise
+        except Exception as e:
+            logger.error(f"AI batch generation error: {e}")
+            if not fallback:
+                raise
+            metrics.inc("ai_fallback_total")
+            return self._generate_fallback_quests(user_data, count)
+
+        if fallback and len(quests) < count:
+            titles = {quest["title"] for quest in quests}
+            spare = [quest for quest in self._generate_fallback_quests(user_data, count) if quest["title"] not in titles]
+            quests += spare[:count - len(quests)]
+        return quests
+
+    async def _shared_stream(self, key: str, prompt: str, user_data: Dict[str, Any],
+                             last_resort: bool = True) -> AsyncGenerator[str, None]:
+        joined = self.flights.join(key)
+        if joined is not None:
+            return joined
+
+        # Слот берём до старта ответа, чтобы переполненная очередь вернула 429, а не оборванный стрим
+        await self.admission.acquire(user_data.get("user_id"))
+        joined = self.flights.join(key)
+        if joined is not None:
+            # Пока ждали слот, такой же стрим уже запустили
+            self.admission.release()
+            return joined
+        return self.flights.stream(
+            key, lambda: self._released_after(self._generate_streaming(prompt, user_data, last_resort)))
+
+    async def _released_after(self, source: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+        """Отдаёт куски стрима и освобождает слот генерации, когда стрим закончился"""
+        started = self.admission.clock()
+        try:
+            async for chunk in source:
+                yield chunk
+        finally:
+            self.admission.release(self.admission.clock() - started)
+
+    def _flight_key(self, prompt: str, hint: Optional[str] = None) -> str:
+        return hashlib.sha256(f"{self.default_model}\n{hint}\n{prompt}".encode("utf-8")).hexdigest()
+
     def _built_quest_promt(self, user_data: Dict[str, Any]) -> str:
         return f"""
         Ты — наставник в RPG-игре о саморазвитии. создай персональный квест для игрока на основе его данных:
@@ -45,6 +181,8 @@ class AIservice:
         Цели: {', '.join(user_data.get('goals', []))}
         Привычки: {', '.join(user_data.get('habits', []))}
         Предпочтения: {user_data.get('preferences', {})}
+        Тема: {user_data.get('theme') or 'любая'}
+        Категория: {user_data.get('category') or 'любая'}
         
         Создай квест который:
         1. Соответствует целям пользователя
@@ -72,35 +210,82 @@ class AIservice:
             "category": "категория"
     }}"""
 
-    async def _generate_complete(self, prompt, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _built_batch_promt(self, user_data: Dict[str, Any], count: int) -> str:
+        return self._built_quest_promt(user_data) + f"""
+
+        Создай {count} РАЗНЫХ квестов по этим правилам (разные шаги, по возможности разные категории).
+        Верни ТОЛЬКО JSON-массив из {count} объектов в формате выше: [{{...}}, {{...}}]"""
+
+    async def _generate_complete(self, prompt, user_data: Dict[str, Any], last_resort: bool = False) -> Dict[str, Any]:
         """Полная генерация ответа"""
 
-        response = self.client.chat.completions.create(
-            model=self.default_model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1024,
-            temperature=0.7,
-            top_p=0.9
-        )
+        async with self.admission.slot(user_data.get("user_id")):
+            content = await self.client.complete(
+                messages=[{"role": "user", "content": prompt}],
+                hint=user_data.get("model"),
+                last_resort=last_resort,
+                max_tokens=1024,
+                temperature=0.7,
+                top_p=0.9
+            )
 
-        content = response.choices[0].message.content
         return self._parse_ai_response(content, user_data)
 
-    async def _generate_streaming(self, prompt: str, user_data: Dict[str, Any]) -> AsyncGenerator[str, None]:
+    async def _generate_streaming(self, prompt: str, user_data: Dict[str, Any],
+                                  last_resort: bool = True) -> AsyncGenerator[str, None]:
         """Стриминговая генерация"""
 
-        stream = self.client.chat.completions.create(
-            model=self.default_model,
+        async for chunk in self.client.stream(
             messages=[{"role": "user", "content": prompt}],
+            hint=user_data.get("model"),
+            last_resort=last_resort,
             max_tokens=1024,
             temperature=0.7,
-            top_p=0.9,
-            stream=True
-        )
+            top_p=0.9
+        ):
+            yield chunk
+
+    async def _fallback_streaming(self, user_data: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        """Резервный квест одним куском для стримингового режима"""
+        yield json.dumps(self._generate_fallback_quest(user_data), ensure_ascii=False)
+
+    def _render_template(self, prompt: str, batch: Optional[int] = None) -> str:
+        """Локальный шаблонный backend: резервный квест по промпту, при batch — массив из batch разных"""
+
+        goals_line = next((line for line in prompt.splitlines() if line.strip().startswith("Цели:")), "")
+        goals = [goal.strip() for goal in goals_line.split(":", 1)[-1].split(",") if goal.strip()]
+        if batch is not None:
+            return json.dumps(self._generate_fallback_quests({"goals": goals}, batch), ensure_ascii=False)
+        return json.dumps(self._generate_fallback_quest({"goals": goals}), ensure_ascii=False)
+
+    def _parse_ai_response(self, content: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Достаёт JSON квеста из ответа модели (модель любит оборачивать его в текст/```json)"""
+
+        start, end = content.find("{"), content.rfind("}")
+        if start == -1 or end <= start:
+            raise ValueError("AI response contains no JSON object")
+
+        quest = schemas.GeneratedQuestBase.model_validate_json(content[start:end + 1])
+        return quest.model_dump()
 
-        for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta_content:
-                yield chunk.choices[0].delta_content
+    def _parse_ai_batch_response(self, content: str) -> List[Dict[str, Any]]:
+        """Достаёт JSON-массив квестов; невалидные элементы отбрасываются"""
+
+        start, end = content.find("["), content.rfind("]")
+        if start == -1 or end <= start:
+            raise ValueError("AI response contains no JSON array")
+
+        items = json.loads(content[start:end + 1])
+        quests = []
+        for item in items:
+            try:
+                quests.append(schemas.GeneratedQuestBase.model_validate(item).model_dump())
+            except ValueError as e:
+                logger.warning(f"Skipping invalid quest in batch: {e}")
+
+        if not quests:
+            raise ValueError("AI batch response contains no valid quests")
+        return quests
 
     def _generate_fallback_quest(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Резервная генерация квеста (если AI недоступен"""
@@ -109,35 +294,98 @@ class AIservice:
 
         # Простая логика на основе целей пользователя
         if any('здор' in goal.lower() for goal in goals):
-            return {
-                "title": "Путь к здоровому образу жизни",
-                "description": "7-дневный челлендж для улучшения здоровья",
-                "steps": [
-                    {
-                        "title": "Утренняя зарядка 15 минут",
-                        "description": "Выполни комплекс утренних упражнений",
-                        "points": 25,
-                        "estimated_time": "15 минут"
-                    }
-                ],
-                "estimated_time": "7 дней",
-                "difficulty": "medium",
-                "category": "health"
-            }
+            return copy.deepcopy(FALLBACK_QUESTS[0])
+        return copy.deepcopy(FALLBACK_QUESTS[1])
 
-        return {
-            "title": "Базовый квест продуктивности",
-            "description": "Начни свой путь к эффективности",
-            "steps": [
-                {
-                    "title": "Планирование дня",
-                    "description": "Составь план на день",
-                    "points": 30,
-                    "estimated_time": "10 минут"
-                }
-            ],
-            "estimated_time": "1 день",
-            "difficulty": "easy",
-            "category": "productivity"
-        }
+    def _generate_fallback_quests(self, user_data: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+        """count разных резервных квестов: первый — как _generate_fallback_quest, дальше остальные шаблоны"""
+
+        first = self._generate_fallback_quest(user_data)
+        templates = [first] + [quest for quest in FALLBACK_QUESTS if quest["title"] != first["title"]]
+        quests = []
+        for i in range(count):
+            quest = copy.deepcopy(templates[i % len(templates)])
+            if i >= len(templates):  # шаблоны кончились — повторы различаются этапом
+                quest["title"] = f"{quest['title']} — этап {i // len(templates) + 1}"
+            quests.append(quest)
+        return quests
 
+
+# Шаблоны резервных квестов: первые два — по целям игрока, остальные добирают пачку до count
+FALLBACK_QUESTS: List[Dict[str, Any]] = [
+    {
+        "title": "Путь к здоровому образу жизни",
+        "description": "7-дневный челлендж для улучшения здоровья",
+        "steps": [
+            {
+                "title": "Утренняя зарядка 15 минут",
+                "description": "Выполни комплекс утренних упражнений",
+                "points": 25,
+                "estimated_time": "15 минут"
+            }
+        ],
+        "estimated_time": "7 дней",
+        "difficulty": "medium",
+        "category": "health"
+    },
+    {
+        "title": "Базовый квест продуктивности",
+        "description": "Начни свой путь к эффективности",
+        "steps": [
+            {
+                "title": "Планирование дня",
+                "description": "Составь план на день",
+                "points": 30,
+                "estimated_time": "10 минут"
+            }
+        ],
+        "estimated_time": "1 день",
+        "difficulty": "easy",
+        "category": "productivity"
+    },
+    {
+        "title": "Час нового знания",
+        "description": "Узнай сегодня что-то, чего не знал вчера",
+        "steps": [
+            {
+                "title": "Прочитай главу книги или статью",
+                "description": "Выбери тему, которая давно интересует, и запиши три главные мысли",
+                "points": 30,
+                "estimated_time": "40 минут"
+            }
+        ],
+        "estimated_time": "1 день",
+        "difficulty": "easy",
+        "category": "learning"
+    },
+    {
+        "title": "Творческая разминка",
+        "description": "Немного творчества без цели и оценок",
+        "steps": [
+            {
+                "title": "Скетч, стих или мелодия",
+                "description": "Удели 20 минут любому творческому занятию и сохрани результат",
+                "points": 25,
+                "estimated_time": "20 минут"
+            }
+        ],
+        "estimated_time": "1 день",
+        "difficulty": "easy",
+        "category": "creativity"
+    },
+    {
+        "title": "Больше движения",
+        "description": "Добавь активности в обычный день",
+        "steps": [
+            {
+                "title": "Прогулка 5000 шагов",
+                "description": "Пройди пешком часть привычного маршрута",
+                "points": 35,
+                "estimated_time": "45 минут"
+            }
+        ],
+        "estimated_time": "1 день",
+        "difficulty": "medium",
+        "category": "sport"
+    },
+]
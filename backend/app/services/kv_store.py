@@ -0,0 +1,141 @@
+#kv_store
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from backend.app.config import settings
+
+
+class KeyValueStore(ABC):
+    """Общее хранилище счётчиков и маркеров для нескольких воркеров.
+
+    MemoryStore — в пределах процесса (и локальная замена в тестах),
+    RedisStore — общее между процессами и машинами.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def set_if_absent(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Атомарно увеличивает счётчик; ttl выставляется при создании ключа"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    async def aclose(self):
+        pass
+
+
+class MemoryStore(KeyValueStore):
+    def __init__(self, clock: Callable[[], float] = time.monotonic, compact_every: int = 1024):
+        self.clock = clock
+        self.compact_every = compact_every
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._put(key, value, ttl)
+
+    async def set_if_absent(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        with self._lock:
+            current = self._get(key)
+            if current is None:
+                self._put(key, amount, ttl)
+                return amount
+            expires_at = self._data[key][1]
+            self._data[key] = (current + amount, expires_at)
+            return current + amount
+
+    async def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= self.clock():
+            del self._data[key]
+            return None
+        return value
+
+    def _put(self, key: str, value: Any, ttl: Optional[float]):
+        self._data[key] = (value, self.clock() + ttl if ttl is not None else None)
+        self._writes += 1
+        if self._writes % self.compact_every == 0:
+            self._compact()
+
+    def _compact(self):
+        """Выкидывает истёкшие ключи, которые никто не читает (иначе они копились бы вечно)"""
+        now = self.clock()
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+
+
+class RedisStore(KeyValueStore):
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # опциональная зависимость, нужна только для общего хранилища
+
+        self.redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self.redis.get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self.redis.set(key, value, px=int(ttl * 1000) if ttl is not None else None)
+
+    async def set_if_absent(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return bool(await self.redis.set(key, value, px=int(ttl * 1000) if ttl is not None else None, nx=True))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incrby(key, amount)
+            if ttl is not None:
+                pipe.pexpire(key, int(ttl * 1000), nx=True)
+            result = await pipe.execute()
+        return result[0]
+
+    async def delete(self, key: str):
+        await self.redis.delete(key)
+
+    async def aclose(self):
+        await self.redis.aclose()
+
+
+def store_from_settings() -> KeyValueStore:
+    if settings.KV_STORE_URL:
+        return RedisStore(settings.KV_STORE_URL)
+    return MemoryStore()
+
+
+shared_store = store_from_settings()
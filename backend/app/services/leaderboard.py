@@ -0,0 +1,310 @@
+#leaderboard
+import asyncio
+import logging
+import os
+import pickle
+import time
+from array import array
+from datetime import datetime, timedelta, UTC
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.app.config import settings
+from backend.app.database import models
+from backend.app.utils.metrics import metrics
+from backend.app.utils.ranking import RankedList
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = ""          # имя общего рейтинга среди рейтингов по категориям
+ID_BITS = 32         # ключ рейтинга: -опыт в старших битах, id игрока в младших
+SNAPSHOT_VERSION = 1
+
+
+class Board:
+    """Один рейтинг: игроки по убыванию опыта, при равенстве — по возрастанию id.
+
+    Ключ (-опыт << 32 | id) упорядочивает так одним числом, поэтому ранг — это позиция
+    ключа в RankedList. Текущий опыт игрока — в array по id: по нему находится старый
+    ключ при обновлении (-1 — игрока в рейтинге нет).
+    """
+
+    def __init__(self, keys: Optional[RankedList] = None, scores: Optional[array] = None):
+        self.keys = keys if keys is not None else RankedList()
+        self.scores = scores if scores is not None else array("q")
+
+    @staticmethod
+    def key(player_id: int, score: int) -> int:
+        return (-score << ID_BITS) | player_id
+
+    @staticmethod
+    def unpack(key: int) -> Tuple[int, int]:
+        return key & ((1 << ID_BITS) - 1), -(key >> ID_BITS)
+
+    @classmethod
+    def from_scores(cls, scores: Iterable[Tuple[int, int]]) -> "Board":
+        board = cls()
+        keys = array("q")
+        for player_id, score in scores:
+            board._reserve(player_id)
+            board.scores[player_id] = score
+            keys.append(cls.key(player_id, score))
+        board.keys = RankedList.from_sorted(array("q", sorted(keys)))
+        return board
+
+    def _reserve(self, player_id: int):
+        if player_id >= len(self.scores):
+            self.scores.extend(array("q", [-1]) * (max(player_id + 1, len(self.scores) * 2) - len(self.scores)))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def score(self, player_id: int) -> Optional[int]:
+        if player_id < len(self.scores) and self.scores[player_id] >= 0:
+            return self.scores[player_id]
+        return None
+
+    def set(self, player_id: int, score: int):
+        old = self.score(player_id)
+        if old == score:
+            return
+        if old is not None:
+            self.keys.remove(self.key(player_id, old))
+        self._reserve(player_id)
+        self.scores[player_id] = score
+        self.keys.add(self.key(player_id, score))
+
+    def add(self, player_id: int, delta: int):
+        self.set(player_id, (self.score(player_id) or 0) + delta)
+
+    def rank(self, player_id: int) -> Optional[int]:
+        score = self.score(player_id)
+        return None if score is None else self.keys.index(self.key(player_id, score)) + 1
+
+    def page(self, offset: int, limit: int) -> List[Tuple[int, int, int]]:
+        """(ранг, id, опыт) с позиции offset"""
+        return [(offset + i + 1, *self.unpack(key)) for i, key in enumerate(self.keys.slice(offset, offset + limit))]
+
+    def around(self, player_id: int, neighbours: int) -> List[Tuple[int, int, int]]:
+        rank = self.rank(player_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - neighbours, 0)
+        return self.page(start, rank - start + neighbours)
+
+
+class Leaderboard:
+    """Рейтинги игроков в памяти процесса: общий по опыту и по категориям квестов.
+
+    Загружается из снимка (или один раз полным проходом по базе), обновляется
+    по каждому выполнению задач этого процесса, а раз в sync_interval догоняет базу:
+    перечитывает игроков, у которых с прошлой синхронизации закрывались задачи
+    (индекс tasks.completed_at), и новых игроков (id больше известного). Так видны
+    и начисления других воркеров. Снимок пишется раз в snapshot_interval и при остановке.
+    """
+
+    SYNC_OVERLAP = timedelta(seconds=60)  # запас на незакоммиченные транзакции и разницу часов
+    CHUNK = 500
+
+    def __init__(self, session_factory: Callable[[], Session], snapshot_path: str = "",
+                 sync_interval: float = 30.0, snapshot_interval: float = 300.0):
+        self.session_factory = session_factory
+        self.snapshot_path = snapshot_path
+        self.sync_interval = sync_interval
+        self.snapshot_interval = snapshot_interval
+        self.boards: Dict[str, Board] = {GLOBAL: Board()}
+        self.synced_at: Optional[datetime] = None
+        self.max_player_id = 0
+        self.loaded = False
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> "Leaderboard":
+        from backend.app.database.db import SessionLocal
+        return cls(
+            SessionLocal,
+            snapshot_path=settings.LEADERBOARD_SNAPSHOT_PATH,
+            sync_interval=settings.LEADERBOARD_SYNC_INTERVAL,
+            snapshot_interval=settings.LEADERBOARD_SNAPSHOT_INTERVAL,
+        )
+
+    def board(self, category: Optional[str] = None) -> Board:
+        return self.boards.get(category or GLOBAL) or Board()
+
+    # --- обновления ---
+    def record(self, player_id: int, experience: int, categories: Dict[str, int]):
+        """Выполнение задач: общий опыт — итоговый, по категориям — прибавка"""
+        if not self.loaded:
+            return  # загрузка прочитает это из базы
+        self.boards[GLOBAL].set(player_id, experience)
+        for category, gained in categories.items():
+            self.boards.setdefault(category, Board()).add(player_id, gained)
+        self.max_player_id = max(self.max_player_id, player_id)
+
+    # --- загрузка ---
+    async def ready(self):
+        """Ждёт загрузки рейтинга; первый вызов её и запускает"""
+        if self.loaded:
+            return
+        async with self._lock:
+            if not self.loaded:
+                await self.load()
+
+    async def load(self):
+        started = time.perf_counter()
+        snapshot = await asyncio.to_thread(self._read_snapshot)
+        if snapshot is not None:
+            self._apply_snapshot(snapshot)
+            self.loaded = True
+            await self.sync()
+            source = "snapshot"
+        else:
+            await self.rebuild()
+            source = "database"
+        metrics.observe("leaderboard_load_seconds", time.perf_counter() - started)
+        logger.info(f"Leaderboard loaded from {source}: {len(self.boards[GLOBAL])} players")
+
+    async def rebuild(self):
+        started_at = datetime.now(UTC)
+        boards, max_player_id = await asyncio.to_thread(self._scan_all)
+        self.boards, self.max_player_id = boards, max_player_id
+        self.synced_at, self.loaded = started_at, True
+
+    def _experience_query(self):
+        pending = (select(models.XPJournal.user_id, func.sum(models.XPJournal.delta).label("delta"))
+                   .group_by(models.XPJournal.user_id).subquery())
+        return (select(models.Player.id,
+                       func.coalesce(models.Player.experience, 0) + func.coalesce(pending.c.delta, 0))
+                .outerjoin(pending, pending.c.user_id == models.Player.id))
+
+    def _category_query(self):
+        return (select(models.Task.user_id, models.GeneratedQuest.category, func.sum(models.Task.points))
+                .join(models.GeneratedQuest, models.GeneratedQuest.id == models.Task.quest_id)
+                .where(models.Task.is_completed.is_(True), models.GeneratedQuest.category.is_not(None))
+                .group_by(models.Task.user_id, models.GeneratedQuest.category))
+
+    def _scan_all(self) -> Tuple[Dict[str, Board], int]:
+        """Полный проход по базе — только когда снимка нет"""
+        db = self.session_factory()
+        try:
+            max_player_id = db.scalar(select(func.max(models.Player.id))) or 0  # новые после — подхватит sync
+            players = db.execute(self._experience_query().execution_options(yield_per=50_000))
+            boards = {GLOBAL: Board.from_scores((player_id, score or 0) for player_id, score in players)}
+            categories: Dict[str, List[Tuple[int, int]]] = {}
+            for player_id, category, points in db.execute(self._category_query()):
+                categories.setdefault(category, []).append((player_id, points or 0))
+            boards.update({category: Board.from_scores(rows) for category, rows in categories.items()})
+        finally:
+            db.close()
+        return boards, max_player_id
+
+    async def sync(self):
+        """Догоняет базу с прошлой синхронизации: начисления других воркеров и новые игроки"""
+        started_at = datetime.now(UTC)
+        experience, categories = await asyncio.to_thread(self._scan_changed, self.synced_at - self.SYNC_OVERLAP)
+        board = self.boards[GLOBAL]
+        for player_id, score in experience:
+            board.set(player_id, score or 0)
+            self.max_player_id = max(self.max_player_id, player_id)
+        for player_id, category, points in categories:
+            self.boards.setdefault(category, Board()).set(player_id, points or 0)
+        self.synced_at = started_at
+        metrics.inc("leaderboard_synced_players_total", len(experience))
+
+    def _scan_changed(self, since: datetime):
+        db = self.session_factory()
+        try:
+            changed = set(db.scalars(select(models.Task.user_id).distinct()
+                                     .where(models.Task.completed_at >= since, models.Task.user_id.is_not(None))))
+            changed.update(db.scalars(select(models.Player.id).where(models.Player.id > self.max_player_id)))
+            changed = sorted(changed)
+            experience, categories = [], []
+            for i in range(0, len(changed), self.CHUNK):
+                chunk = changed[i:i + self.CHUNK]
+                experience += db.execute(self._experience_query().where(models.Player.id.in_(chunk))).all()
+                categories += db.execute(self._category_query().where(models.Task.user_id.in_(chunk))).all()
+            return experience, categories
+        finally:
+            db.close()
+
+    # --- снимки ---
+    def snapshot(self) -> dict:
+        """Состояние для записи на диск; снимается в цикле событий, пока рейтинг не меняется"""
+        return {
+            "version": SNAPSHOT_VERSION,
+            "synced_at": self.synced_at,
+            "max_player_id": self.max_player_id,
+            "boards": {name: (board.keys.to_array(), board.scores) for name, board in self.boards.items()},
+        }
+
+    def write_snapshot(self, snapshot: dict):
+        if not self.snapshot_path:
+            return
+        started = time.perf_counter()
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.snapshot_path)  # читатель видит либо старый снимок, либо новый целиком
+        metrics.observe("leaderboard_snapshot_seconds", time.perf_counter() - started)
+
+    async def save_snapshot(self):
+        if self.loaded and self.snapshot_path:
+            snapshot = self.snapshot()
+            # scores меняются на месте — копия до передачи в поток
+            snapshot["boards"] = {name: (keys, array("q", scores)) for name, (keys, scores) in snapshot["boards"].items()}
+            await asyncio.to_thread(self.write_snapshot, snapshot)
+
+    def _read_snapshot(self) -> Optional[dict]:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Leaderboard snapshot unreadable, rebuilding: {e}")
+            return None
+        return snapshot if snapshot.get("version") == SNAPSHOT_VERSION else None
+
+    def _apply_snapshot(self, snapshot: dict):
+        self.boards = {name: Board(RankedList.from_sorted(keys), scores)
+                       for name, (keys, scores) in snapshot["boards"].items()}
+        self.boards.setdefault(GLOBAL, Board())
+        self.synced_at = snapshot["synced_at"]
+        self.max_player_id = snapshot["max_player_id"]
+
+    # --- фоновая синхронизация ---
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.save_snapshot()
+        except Exception as e:
+            logger.error(f"Leaderboard snapshot on shutdown failed: {e}")
+
+    async def run(self):
+        snapshot_at = time.monotonic()
+        while True:
+            try:
+                await self.ready()
+                await asyncio.sleep(self.sync_interval)
+                await self.sync()
+                if time.monotonic() - snapshot_at >= self.snapshot_interval:
+                    await self.save_snapshot()
+                    snapshot_at = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Leaderboard sync error: {e}")
+                await asyncio.sleep(self.sync_interval)
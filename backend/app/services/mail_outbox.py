@@ -0,0 +1,258 @@
+#mail_outbox
+import asyncio
+import logging
+import smtplib
+import time
+from datetime import datetime, timedelta, UTC
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from backend.app.config import settings
+from backend.app.database import models
+from backend.app.utils.mailer import build_message
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# (id письма, ошибка или None, ошибка постоянная — повторять бессмысленно)
+DeliveryResult = Tuple[int, Optional[str], bool]
+
+
+class SMTPPool:
+    """Пул залогиненных SMTP-сессий: STARTTLS и login — один раз на соединение, а не на письмо.
+
+    smtplib синхронный, поэтому пачка писем уходит по одному соединению в отдельном
+    потоке; одновременно работает не больше size соединений. Простаивающие дольше
+    max_idle соединения закрываются — серверы сами рвут долгие сессии.
+    """
+
+    def __init__(self, host: str, port: int, user: str = "", password: str = "", starttls: bool = True,
+                 size: int = 2, timeout: float = 30.0, max_idle: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.clock = clock
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def deliver(self, messages: List[dict]) -> List[DeliveryResult]:
+        async with self._slots:
+            connection = self._take_idle()
+            connection, results = await asyncio.to_thread(self._send_batch, connection, messages)
+            if connection is not None:
+                self._idle.append((connection, self.clock()))
+            return results
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            await asyncio.to_thread(self._quit, connection)
+
+    def _take_idle(self) -> Optional[smtplib.SMTP]:
+        while self._idle:
+            connection, released = self._idle.pop()
+            if self.clock() - released < self.max_idle:
+                return connection
+            self._quit(connection)
+        return None
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls()
+            if self.user:
+                connection.login(self.user, self.password)
+        except Exception:
+            self._quit(connection)
+            raise
+        metrics.inc("smtp_connections_total")
+        return connection
+
+    def _send_batch(self, connection: Optional[smtplib.SMTP],
+                    messages: List[dict]) -> Tuple[Optional[smtplib.SMTP], List[DeliveryResult]]:
+        results = []
+        for i, mail in enumerate(messages):
+            try:
+                if connection is None:
+                    connection = self._connect()
+            except (smtplib.SMTPException, OSError) as e:
+                # Сервер недоступен — остаток пачки повторим позже, не пытаясь подключаться на каждое письмо
+                results.extend((m["id"], f"connect: {e!r}", False) for m in messages[i:])
+                return None, results
+
+            msg = build_message(mail["to_email"], mail["subject"], mail["body"])
+            try:
+                connection.sendmail(self.user, [mail["to_email"]], msg.as_string())
+                results.append((mail["id"], None, False))
+            except smtplib.SMTPRecipientsRefused as e:
+                codes = [code for code, _ in e.recipients.values()]
+                results.append((mail["id"], str(e.recipients), min(codes) >= 500))
+            except smtplib.SMTPResponseException as e:
+                results.append((mail["id"], f"{e.smtp_code} {e.smtp_error!r}", e.smtp_code >= 500))
+            except (smtplib.SMTPException, OSError) as e:
+                self._quit(connection)
+                connection = None
+                results.append((mail["id"], repr(e), False))
+        return connection, results
+
+    @staticmethod
+    def _quit(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+
+class MailSender:
+    """Фоновая отправка писем из таблицы mail_outbox.
+
+    Письмо «захватывается» сдвигом next_attempt_at на время аренды, поэтому
+    упавший посреди отправки процесс не теряет его, а несколько воркеров не
+    шлют одно письмо дважды. Неудачи откладываются с экспоненциальным backoff,
+    после max_attempts письмо помечается failed.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], pool: SMTPPool, batch_size: int = 50,
+                 max_attempts: int = 5, retry_base: float = 30.0, poll_interval: float = 5.0,
+                 lease: float = 300.0):
+        self.session_factory = session_factory
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> "MailSender":
+        from backend.app.database.db import SessionLocal
+        pool = SMTPPool(settings.SMTP_SERVER, settings.SMTP_PORT, settings.SMTP_USER, settings.SMTP_PASSWORD,
+                        starttls=settings.SMTP_STARTTLS, size=settings.MAIL_POOL_SIZE)
+        return cls(
+            SessionLocal,
+            pool,
+            batch_size=settings.MAIL_BATCH_SIZE,
+            max_attempts=settings.MAIL_MAX_ATTEMPTS,
+            retry_base=settings.MAIL_RETRY_BASE,
+            poll_interval=settings.MAIL_POLL_INTERVAL,
+        )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.pool.close()
+
+    def wake(self):
+        """В outbox появилось письмо — не ждать следующего опроса"""
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                claimed = await self.send_once()
+            except Exception as e:
+                logger.error(f"Mail outbox error: {e}")
+                claimed = 0
+            if claimed < self.batch_size * self.pool.size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def send_once(self) -> int:
+        """Один проход: захватить готовые к отправке письма, разослать пачками по пулу, записать итог"""
+
+        mails = await asyncio.to_thread(self._claim, self.batch_size * self.pool.size)
+        if not mails:
+            return 0
+        batches = [mails[i:i + self.batch_size] for i in range(0, len(mails), self.batch_size)]
+        delivered = await asyncio.gather(*(self.pool.deliver(batch) for batch in batches))
+        attempts = {mail["id"]: mail["attempts"] for mail in mails}
+        await asyncio.to_thread(self._record, [r for results in delivered for r in results], attempts)
+        return len(mails)
+
+    def _claim(self, limit: int) -> List[dict]:
+        now = datetime.now(UTC)
+        lease_until = now + timedelta(seconds=self.lease)
+        db = self.session_factory()
+        try:
+            ids = db.execute(
+                select(models.OutboxMail.id)
+                .where(models.OutboxMail.status == "pending", models.OutboxMail.next_attempt_at <= now)
+                .order_by(models.OutboxMail.next_attempt_at)
+                .limit(limit)
+            ).scalars().all()
+            if not ids:
+                return []
+            # Условие на next_attempt_at повторяется: письмо, которое успел захватить другой воркер, не трогаем
+            db.execute(
+                update(models.OutboxMail)
+                .where(models.OutboxMail.id.in_(ids), models.OutboxMail.next_attempt_at <= now)
+                .values(next_attempt_at=lease_until, attempts=models.OutboxMail.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            rows = db.execute(
+                select(models.OutboxMail.id, models.OutboxMail.to_email, models.OutboxMail.subject,
+                       models.OutboxMail.body, models.OutboxMail.attempts)
+                .where(models.OutboxMail.id.in_(ids), models.OutboxMail.next_attempt_at == lease_until)
+            ).all()
+            return [row._asdict() for row in rows]
+        finally:
+            db.close()
+
+    def _record(self, results: List[DeliveryResult], attempts: dict):
+        now = datetime.now(UTC)
+        sent = [mail_id for mail_id, error, _ in results if error is None]
+        db = self.session_factory()
+        try:
+            if sent:
+                db.execute(
+                    update(models.OutboxMail)
+                    .where(models.OutboxMail.id.in_(sent))
+                    .values(status="sent", sent_at=now, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+                metrics.inc("mail_outbox_total", len(sent), result="sent")
+
+            for mail_id, error, permanent in results:
+                if error is None:
+                    continue
+                if permanent or attempts[mail_id] >= self.max_attempts:
+                    values = {"status": "failed", "last_error": error}
+                    metrics.inc("mail_outbox_total", result="failed")
+                    logger.error(f"Mail {mail_id} failed after {attempts[mail_id]} attempts: {error}")
+                else:
+                    delay = self.retry_base * 2 ** (attempts[mail_id] - 1)
+                    values = {"next_attempt_at": now + timedelta(seconds=delay), "last_error": error}
+                    metrics.inc("mail_outbox_total", result="retry")
+                db.execute(
+                    update(models.OutboxMail)
+                    .where(models.OutboxMail.id == mail_id)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+        finally:
+            db.close()
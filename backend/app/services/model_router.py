@@ -0,0 +1,318 @@
+#model_router
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from backend.app.config import settings
+from backend.app.services.ai_backends import ChatBackend
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class NoBackendAvailableError(Exception):
+    pass
+
+
+def parse_backends(spec: str) -> List[Tuple[str, str, str]]:
+    """Разбирает "имя=модель@url,..." в список (имя, модель, url)"""
+
+    backends = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, rest = part.partition("=")
+        model, _, url = rest.partition("@")
+        if not name or not model or not url:
+            raise ValueError(f"Invalid AI backend spec: {part!r}")
+        backends.append((name.strip(), model.strip(), url.strip()))
+    return backends
+
+
+class BackendStats:
+    """Скользящее окно последних вызовов backend'а: задержки, ошибки и «автомат» здоровья.
+
+    После 3 ошибок подряд или доли ошибок в окне выше max_error_rate backend
+    выключается на cooldown секунд; первая же ошибка после паузы выключает его снова.
+    """
+
+    def __init__(self, window: int = 100, max_error_rate: float = 0.5, min_samples: int = 5,
+                 cooldown: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.clock = clock
+        # Полная генерация и время до первого куска стрима — разные величины, копим отдельно
+        self.latencies: Dict[str, Deque[float]] = {"complete": deque(maxlen=window), "stream": deque(maxlen=window)}
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record(self, kind: str, latency: Optional[float], ok: bool):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies[kind].append(latency)
+            self.consecutive_failures = 0
+            return
+
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= 3 or (
+                len(self.outcomes) >= self.min_samples and self.error_rate() >= self.max_error_rate):
+            self.open_until = self.clock() + self.cooldown
+
+    def percentile(self, kind: str, q: float) -> Optional[float]:
+        values = sorted(self.latencies[kind])
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def expected_latency(self, kind: str) -> float:
+        """p50 для ранжирования: неизмеренный backend считаем быстрым, чтобы он получил трафик,
+        а backend, у которого есть только ошибки, — самым медленным"""
+        p50 = self.percentile(kind, 0.5)
+        if p50 is not None:
+            return p50
+        return float("inf") if self.outcomes else 0.0
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def healthy(self) -> bool:
+        return self.clock() >= self.open_until
+
+
+class RoutedBackend:
+    """Backend под управлением роутера: клиент (ChatBackend или совместимый) и его модель"""
+
+    def __init__(self, name: str, client: Any, model: Optional[str], last_resort: bool = False,
+                 stats: Optional[BackendStats] = None):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.last_resort = last_resort  # только когда удалённые backend'ы не справились
+        self.stats = stats or BackendStats()
+
+    def matches(self, hint: Optional[str]) -> bool:
+        if not hint or not self.model:
+            return False
+        hint, model = hint.lower(), self.model.lower()
+        return hint in (model, self.name.lower()) or model.endswith("/" + hint)
+
+    def record(self, kind: str, latency: Optional[float], ok: bool):
+        self.stats.record(kind, latency, ok)
+        metrics.inc("ai_backend_requests_total", backend=self.name, result="ok" if ok else "error")
+        if latency is not None:
+            metrics.observe("ai_backend_seconds", latency, backend=self.name, kind=kind)
+        metrics.set_gauge("ai_backend_error_rate", self.stats.error_rate(), backend=self.name)
+        metrics.set_gauge("ai_backend_healthy", int(self.stats.healthy()), backend=self.name)
+
+
+class TemplateBackend:
+    """Локальный «движок» шаблонных квестов: отвечает мгновенно и без сети.
+
+    batch — сколько квестов нужно (массив вместо одного квеста); передаётся явно,
+    а не угадывается по тексту промпта.
+    """
+
+    def __init__(self, render: Callable[[str, Optional[int]], str]):
+        self.render = render
+
+    async def complete(self, model: Optional[str], messages: List[Dict[str, str]], batch: Optional[int] = None,
+                       **params: Any) -> str:
+        return self.render(messages[-1]["content"], batch)
+
+    async def stream(self, model: Optional[str], messages: List[Dict[str, str]], batch: Optional[int] = None,
+                     **params: Any) -> AsyncGenerator[str, None]:
+        yield self.render(messages[-1]["content"], batch)
+
+
+def _with_batch(backend: RoutedBackend, batch: Optional[int], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Параметры вызова; batch — только шаблонному backend'у, в тело запроса к API он не уходит"""
+    if batch is not None and isinstance(backend.client, TemplateBackend):
+        return {**params, "batch": batch}
+    return params
+
+
+class ModelRouter:
+    """Маршрутизация вызовов модели по нескольким backend'ам.
+
+    Запрос уходит самому быстрому здоровому backend'у (по p50 в скользящем окне,
+    backend с моделью из подсказки пользователя — в приоритете). Если ответа нет
+    дольше hedge_delay, дублируем запрос на следующий backend и берём того, кто
+    ответит первым; проигравший вызов отменяется. Ошибка — переход к следующим.
+    """
+
+    def __init__(self, backends: List[RoutedBackend], hedge_delay: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.backends = backends
+        self.hedge_delay = hedge_delay
+        self.clock = clock
+
+    @classmethod
+    def from_settings(cls, api_key: Optional[str], default_model: Optional[str],
+                      render: Optional[Callable[[str, Optional[int]], str]] = None) -> "ModelRouter":
+        specs = parse_backends(settings.AI_BACKENDS) or [("default", default_model, settings.AI_BASE_URL)]
+        backends = [
+            RoutedBackend(name, ChatBackend(
+                base_url=url,
+                api_key=api_key,
+                timeout=settings.AI_TIMEOUT,
+                connect_timeout=settings.AI_CONNECT_TIMEOUT,
+                max_connections=settings.AI_MAX_CONNECTIONS,
+                max_keepalive=settings.AI_MAX_KEEPALIVE,
+            ), model, stats=BackendStats(
+                window=settings.AI_BACKEND_WINDOW,
+                max_error_rate=settings.AI_BACKEND_MAX_ERROR_RATE,
+                cooldown=settings.AI_BACKEND_COOLDOWN,
+            ))
+            for name, model, url in specs
+        ]
+        if settings.AI_TEMPLATE_BACKEND and render is not None:
+            backends.append(RoutedBackend("template", TemplateBackend(render), None, last_resort=True))
+        return cls(backends, hedge_delay=settings.AI_HEDGE_DELAY)
+
+    def candidates(self, kind: str, hint: Optional[str] = None, last_resort: bool = True) -> List[RoutedBackend]:
+        remote = [b for b in self.backends if not b.last_resort]
+        local = [b for b in self.backends if b.last_resort] if last_resort else []
+
+        healthy = [b for b in remote if b.stats.healthy()]
+        if not healthy and not local:
+            healthy = remote  # лучше попробовать больной backend, чем сразу отказать
+
+        ordered = sorted(healthy, key=lambda b: (not b.matches(hint), b.stats.expected_latency(kind)))
+        return ordered + local
+
+    async def complete(self, messages: List[Dict[str, str]], hint: Optional[str] = None, last_resort: bool = True,
+                       batch: Optional[int] = None, **params: Any) -> str:
+        """batch — ответ ждём массивом из batch квестов; удалённым backend'ам это сказано в промпте"""
+
+        async def start(backend: RoutedBackend) -> str:
+            started = self.clock()
+            try:
+                content = await backend.client.complete(model=backend.model, messages=messages,
+                                                        **_with_batch(backend, batch, params))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"AI backend {backend.name} failed: {e}")
+                backend.record("complete", None, ok=False)
+                raise
+            backend.record("complete", self.clock() - started, ok=True)
+            return content
+
+        return await self._route(self.candidates("complete", hint, last_resort), start)
+
+    async def stream(self, messages: List[Dict[str, str]], hint: Optional[str] = None, last_resort: bool = True,
+                     batch: Optional[int] = None, **params: Any) -> AsyncGenerator[str, None]:
+        """Стрим с backend'а, первым приславшего кусок; после первого куска backend уже не меняется"""
+
+        async def start(backend: RoutedBackend) -> Tuple[AsyncGenerator[str, None], str]:
+            started = self.clock()
+            chunks = backend.client.stream(model=backend.model, messages=messages,
+                                           **_with_batch(backend, batch, params))
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                backend.record("stream", None, ok=False)
+                raise ValueError(f"AI backend {backend.name} returned an empty stream")
+            except asyncio.CancelledError:
+                await chunks.aclose()
+                raise
+            except Exception as e:
+                logger.warning(f"AI backend {backend.name} failed: {e}")
+                backend.record("stream", None, ok=False)
+                await chunks.aclose()
+                raise
+            backend.record("stream", self.clock() - started, ok=True)
+            return chunks, first
+
+        def discard(result: Tuple[AsyncGenerator[str, None], str]):
+            asyncio.ensure_future(result[0].aclose())
+
+        chunks, first = await self._route(self.candidates("stream", hint, last_resort), start, discard)
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def _route(self, candidates: List[RoutedBackend], start: Callable[[RoutedBackend], Awaitable[Any]],
+                     discard: Optional[Callable[[Any], None]] = None) -> Any:
+        if not candidates:
+            raise NoBackendAvailableError("No AI backends configured")
+
+        last_error: Optional[BaseException] = None
+        i = 0
+        while i < len(candidates):
+            primary = candidates[i]
+            hedge = None
+            if (self.hedge_delay > 0 and i + 1 < len(candidates)
+                    and not primary.last_resort and not candidates[i + 1].last_resort):
+                hedge = candidates[i + 1]
+            try:
+                return await self._race(primary, hedge, start, discard)
+            except Exception as e:
+                last_error = e
+            i += 2 if hedge is not None else 1
+
+        raise NoBackendAvailableError(f"All AI backends failed: {last_error}") from last_error
+
+    async def _race(self, primary: RoutedBackend, hedge: Optional[RoutedBackend],
+                    start: Callable[[RoutedBackend], Awaitable[Any]],
+                    discard: Optional[Callable[[Any], None]]) -> Any:
+        """Вызов primary; если он медлит дольше hedge_delay или упал — параллельно hedge"""
+
+        owners = {}
+        pending = set()
+
+        def launch(backend: RoutedBackend):
+            task = asyncio.ensure_future(start(backend))
+            owners[task] = backend
+            pending.add(task)
+
+        launch(primary)
+        hedged = hedge is None
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=None if hedged else self.hedge_delay,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        discard(task.result())  # оба ответили одновременно — лишний закрываем
+                if winner is not None:
+                    if len(owners) > 1:
+                        metrics.inc("ai_hedge_wins_total", winner="hedge" if owners[winner] is hedge else "primary")
+                    return winner.result()
+
+                if not hedged:
+                    hedged = True
+                    metrics.inc("ai_hedged_requests_total", reason="error" if done else "slow")
+                    launch(hedge)
+            raise error
+        finally:
+            for task in pending:
+                if discard is not None:
+                    task.add_done_callback(
+                        lambda t: discard(t.result()) if not t.cancelled() and t.exception() is None else None)
+                else:
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                task.cancel()
+
+    async def aclose(self):
+        for backend in self.backends:
+            aclose = getattr(backend.client, "aclose", None)
+            if aclose is not None:
+                await aclose()
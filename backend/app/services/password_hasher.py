@@ -0,0 +1,81 @@
+#password_hasher
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from passlib.context import CryptContext
+
+from backend.app.config import settings
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Модуль импортируется в процессах пула, поэтому никаких зависимостей от БД/приложения здесь
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """Асинхронный bcrypt в отдельном пуле процессов.
+
+    Хэш занимает сотни миллисекунд CPU; в пуле процессов он не держит потоки
+    threadpool'а FastAPI и GIL, а масштабируется по ядрам. use_processes=False —
+    тот же API поверх threadpool'а event loop (для сред без multiprocessing).
+    """
+
+    def __init__(self, workers: int = 0, use_processes: bool = True):
+        self.workers = workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self._executor: Optional[Executor] = None
+
+    @classmethod
+    def from_settings(cls) -> "PasswordHasher":
+        return cls(workers=settings.PASSWORD_HASH_WORKERS, use_processes=settings.PASSWORD_HASH_PROCESSES)
+
+    def start(self):
+        if self.use_processes and self._executor is None:
+            # spawn: fork процесса с потоками uvicorn/SQLAlchemy небезопасен
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run("verify", check_password, password, hashed_password)
+
+    async def _run(self, op: str, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        metrics.inc("password_hash_total", op=op)
+        try:
+            if not self.use_processes:
+                return await loop.run_in_executor(None, fn, *args)
+            self.start()
+            try:
+                return await loop.run_in_executor(self._executor, fn, *args)
+            except BrokenProcessPool:
+                # Воркер упал (OOM-killer и т.п.) — пересоздаём пул и повторяем один раз
+                logger.error("Password hashing pool is broken, restarting it")
+                self.shutdown()
+                self.start()
+                return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            metrics.observe("password_hash_seconds", time.perf_counter() - started, op=op)
@@ -0,0 +1,213 @@
+#player_import
+"""Массовый импорт игроков из CSV/NDJSON (миграция когорт из партнёрских приложений).
+
+Файл читается потоково, пароли хэшируются параллельно в пуле PasswordHasher,
+вставка — пачками по batch_size одним executemany. Пока пачка пишется в БД,
+хэшируется следующая. Запуск из корня репозитория:
+
+    python -m backend.app.services.player_import players.csv --batch-size 1000
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.app.database import models, schemas
+from backend.app.services.password_hasher import PasswordHasher
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")  # партнёры иногда отдают готовые bcrypt-хэши
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def error(self, line: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {message}")
+
+
+@dataclass
+class MalformedRecord:
+    """Строка, которую не удалось разобрать: отклоняется с номером строки, импорт продолжается"""
+    message: str
+
+
+Record = Union[Dict[str, Any], MalformedRecord]
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Record]]:
+    """Потоково отдаёт (номер строки в файле, запись); fmt — "csv" или "ndjson" """
+
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row  # последняя строка записи: поле в кавычках может занимать несколько
+    elif fmt == "ndjson":
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, MalformedRecord(f"invalid JSON: {e.msg} at column {e.colno}")
+                continue
+            yield number, record if isinstance(record, dict) else MalformedRecord("expected a JSON object")
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+
+class PlayerImporter:
+    def __init__(self, session_factory: Callable[[], Session], hasher: PasswordHasher, batch_size: int = 1000):
+        self.session_factory = session_factory
+        self.hasher = hasher
+        self.batch_size = batch_size
+
+    async def run(self, records: Iterable[Tuple[int, Record]]) -> ImportReport:
+        report = ImportReport()
+        pending: Optional[asyncio.Task] = None
+        batch: List[Dict[str, Any]] = []
+
+        for line, record in records:
+            row = self._validate(line, record, report)
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= self.batch_size:
+                rows = await self._hash(batch)
+                if pending is not None:
+                    await pending
+                pending = asyncio.create_task(run_in_threadpool(self._insert, rows, report))
+                batch = []
+
+        if batch:
+            rows = await self._hash(batch)
+            if pending is not None:
+                await pending
+            pending = asyncio.create_task(run_in_threadpool(self._insert, rows, report))
+        if pending is not None:
+            await pending
+
+        logger.info(f"Player import done: {report.inserted} inserted, {report.duplicates} duplicates, "
+                    f"{report.invalid} invalid")
+        return report
+
+    @staticmethod
+    def _validate(line: int, record: Record, report: ImportReport) -> Optional[Dict[str, Any]]:
+        if isinstance(record, MalformedRecord):
+            report.error(line, record.message)
+            return None
+        hashed = record.get("hashed_password") or ""
+        if not isinstance(hashed, str):
+            report.error(line, "hashed_password: must be a string")
+            return None
+        schema = schemas.PrehashedPlayerCreate if hashed.startswith(BCRYPT_PREFIXES) else schemas.PlayerCreate
+        try:
+            user = schema.model_validate(record)
+        except ValidationError as e:
+            report.error(line, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            return None
+        return user.model_dump()
+
+    async def _hash(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        plain = [row for row in batch if "password" in row]
+        hashes = await asyncio.gather(*(self.hasher.hash(row["password"]) for row in plain))
+        for row, hashed in zip(plain, hashes):
+            row["hashed_password"] = hashed
+            del row["password"]
+        return batch
+
+    def _insert(self, rows: List[Dict[str, Any]], report: ImportReport):
+        """Пачка одним executemany; занятые в БД и повторяющиеся внутри пачки логины/почты пропускаются"""
+
+        db = self.session_factory()
+        try:
+            usernames = {row["username"] for row in rows}
+            emails = {row["email"] for row in rows}
+            taken = db.execute(
+                select(models.Player.username, models.Player.email)
+                .where(or_(models.Player.username.in_(usernames), models.Player.email.in_(emails)))
+            ).all()
+            seen_usernames = {username for username, _ in taken}
+            seen_emails = {email for _, email in taken}
+
+            fresh = []
+            for row in rows:
+                if row["username"] in seen_usernames or row["email"] in seen_emails:
+                    continue
+                seen_usernames.add(row["username"])
+                seen_emails.add(row["email"])
+                fresh.append(row)
+
+            if fresh:
+                try:
+                    db.execute(insert(models.Player), fresh)
+                    db.commit()
+                except IntegrityError:
+                    # Кто-то успел зарегистрироваться параллельно — дописываем пачку построчно
+                    db.rollback()
+                    fresh = self._insert_one_by_one(db, fresh)
+
+            report.inserted += len(fresh)
+            report.duplicates += len(rows) - len(fresh)
+            metrics.inc("player_import_rows_total", len(fresh), result="inserted")
+            metrics.inc("player_import_rows_total", len(rows) - len(fresh), result="duplicate")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _insert_one_by_one(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        inserted = []
+        for row in rows:
+            try:
+                db.execute(insert(models.Player), [row])
+                db.commit()
+                inserted.append(row)
+            except IntegrityError:
+                db.rollback()
+        return inserted
+
+
+def main():
+    from backend.app.database.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk import players from CSV or NDJSON")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default=None,
+                        help="по умолчанию — по расширению файла")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    hasher = PasswordHasher.from_settings()
+    hasher.start()
+    try:
+        with open(args.path, newline="", encoding="utf-8") as stream:
+            importer = PlayerImporter(SessionLocal, hasher, batch_size=args.batch_size)
+            report = asyncio.run(importer.run(read_records(stream, fmt)))
+    finally:
+        hasher.shutdown()
+
+    print(f"inserted {report.inserted}, duplicates {report.duplicates}, invalid {report.invalid}")
+    for error in report.errors:
+        print(error)
+
+
+if __name__ == "__main__":
+    main()
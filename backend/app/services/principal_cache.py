@@ -0,0 +1,103 @@
+#principal_cache
+import copy
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from backend.app.config import settings
+from backend.app.database import models
+from backend.app.services.kv_store import KeyValueStore, shared_store
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = [column.key for column in models.Player.__table__.columns]
+
+
+@dataclass
+class _Entry:
+    snapshot: Dict[str, Any]
+    version: str
+    expires_at: float
+
+
+class PrincipalCache:
+    """LRU+TTL кэш игроков по subject токена, чтобы get_current_user не ходил в БД на каждый запрос.
+
+    Каждый subject имеет версию в общем хранилище. Запись изменённого игрока
+    ставит новую версию (invalidate), и записи с другой версией отбрасываются
+    во всех воркерах, а не только в том, где прошла запись. Версия — случайная
+    строка, а не счётчик: после истечения ключа она не повторится, и старая
+    запись не совпадёт с новой версией.
+    """
+
+    def __init__(self, store: KeyValueStore, max_entries: int = 10_000, ttl: float = 60.0, enabled: bool = True,
+                 clock: Callable[[], float] = time.monotonic):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    @classmethod
+    def from_settings(cls) -> "PrincipalCache":
+        return cls(
+            store=shared_store,
+            max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+            ttl=settings.PRINCIPAL_CACHE_TTL,
+            enabled=settings.PRINCIPAL_CACHE_ENABLED,
+        )
+
+    async def lookup(self, subject: str) -> Tuple[Optional[models.Player], str]:
+        """Игрок из кэша (или None) и текущая версия subject для последующего put"""
+
+        version = await self.store.get(self._version_key(subject)) or ""
+        entry = self._entries.get(subject)
+        if entry is None:
+            metrics.inc("principal_cache_total", result="miss")
+            return None, version
+        if entry.version != version or entry.expires_at <= self.clock():
+            del self._entries[subject]
+            metrics.inc("principal_cache_total", result="stale")
+            return None, version
+
+        self._entries.move_to_end(subject)
+        metrics.inc("principal_cache_total", result="hit")
+        # Каждому запросу — свой объект: JSON-поля изменяемые, общий экземпляр был бы опасен
+        return models.Player(**copy.deepcopy(entry.snapshot)), version
+
+    def put(self, subject: str, player: models.Player, version: str):
+        """version — та, что вернул lookup до чтения из БД: если игрока успели изменить, запись сразу устареет"""
+
+        snapshot = {key: getattr(player, key) for key in _COLUMNS}
+        self._entries[subject] = _Entry(copy.deepcopy(snapshot), version, self.clock() + self.ttl)
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        metrics.set_gauge("principal_cache_entries", len(self._entries))
+
+    async def invalidate(self, *subjects: str):
+        for subject in subjects:
+            self._entries.pop(subject, None)
+            # Версия живёт дольше записи кэша: записи, сделанные до неё без версии, к её
+            # истечению уже истекли сами, а записи с ней после истечения не совпадут с ""
+            await self.store.set(self._version_key(subject), uuid.uuid4().hex, ttl=self.ttl * 2)
+
+    async def invalidate_player(self, player: models.Player):
+        await self.invalidate(*self.subjects(player))
+
+    @staticmethod
+    def subjects(player: models.Player) -> set:
+        # Токены выдаются и на username/email, и на id — сбрасываем все варианты
+        return {str(s) for s in (player.username, player.email, player.id) if s is not None}
+
+    def clear(self):
+        self._entries.clear()
+
+    @staticmethod
+    def _version_key(subject: str) -> str:
+        return f"principal:v:{subject}"
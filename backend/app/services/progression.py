@@ -0,0 +1,153 @@
+#progression
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.database import models
+from backend.app.services.stats import record_completions
+from backend.app.services.xp_buffer import XPBuffer
+from backend.app.utils.leveling import level_for_xp
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Completion:
+    completed: List[int] = field(default_factory=list)  # id задач, закрытых этим вызовом
+    experience_gained: int = 0
+    experience: int = 0
+    level: int = 1
+    leveled_up: bool = False
+    categories: Dict[str, int] = field(default_factory=dict)  # опыт по категориям квестов
+
+
+async def complete_tasks(db: AsyncSession, user_id: int, task_ids: List[int],
+                         buffer: Optional[XPBuffer] = None) -> Completion:
+    """Закрывает задачи игрока и начисляет опыт одной транзакцией.
+
+    Опыт прибавляется в SQL (experience = experience + :xp), а не через загруженный объект,
+    поэтому параллельные завершения не теряют начислений. Условие is_completed IS NOT TRUE
+    не даёт закрыть задачу и получить за неё опыт дважды. С включённым buffer опыт пишется
+    в журнал xp_buffer, а players обновит его перенос; ответ считается с учётом журнала.
+    """
+
+    if buffer is not None and buffer.enabled:
+        return await _complete_buffered(db, user_id, task_ids, buffer)
+
+    try:
+        done = await _close_tasks(db, user_id, task_ids)
+        gained = sum(points or 0 for _, points, _ in done)
+
+        if done:
+            await record_completions(db, user_id, done, datetime.now(UTC).date())
+        if gained:
+            player = (await db.execute(
+                update(models.Player)
+                .where(models.Player.id == user_id)
+                .values(experience=func.coalesce(models.Player.experience, 0) + gained)
+                .returning(models.Player.experience, models.Player.level)
+                .execution_options(synchronize_session=False)
+            )).one()
+        else:
+            player = (await db.execute(
+                select(models.Player.experience, models.Player.level).where(models.Player.id == user_id)
+            )).one()
+        level, current = level_for_xp(player.experience or 0), player.level or 1
+        if level > current:
+            # Строка игрока уже заблокирована первым UPDATE; level < :level — уровень только растёт
+            await db.execute(
+                update(models.Player)
+                .where(models.Player.id == user_id, models.Player.level < level)
+                .values(level=level)
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    metrics.inc("tasks_completed_total", len(done))
+    metrics.inc("experience_awarded_total", gained)
+    return Completion(
+        completed=sorted(task_id for task_id, _, _ in done),
+        experience_gained=gained,
+        experience=player.experience or 0,
+        level=max(level, current),
+        leveled_up=level > current,
+        categories=by_category(done),
+    )
+
+
+async def _complete_buffered(db: AsyncSession, user_id: int, task_ids: List[int], buffer: XPBuffer) -> Completion:
+    try:
+        done = await _close_tasks(db, user_id, task_ids)
+        gained = sum(points or 0 for _, points, _ in done)
+        if done:
+            await record_completions(db, user_id, done, datetime.now(UTC).date())
+        if gained:
+            await buffer.record(db, user_id, gained)
+        # Журнал читается в той же транзакции: своя запись уже видна, строка игрока не блокируется
+        player = (await db.execute(
+            select(func.coalesce(models.Player.experience, 0) + XPBuffer.pending_sql(models.Player.id),
+                   models.Player.level)
+            .where(models.Player.id == user_id)
+        )).one()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    if gained:
+        buffer.note()
+    experience, current = player[0], player[1] or 1
+    level, before = level_for_xp(experience), max(current, level_for_xp(experience - gained))
+    metrics.inc("tasks_completed_total", len(done))
+    metrics.inc("experience_awarded_total", gained)
+    return Completion(
+        completed=sorted(task_id for task_id, _, _ in done),
+        experience_gained=gained,
+        experience=experience,
+        level=max(level, current),
+        leveled_up=level > before,
+        categories=by_category(done),
+    )
+
+
+async def read_progress(db: AsyncSession, user_id: int) -> Tuple[int, int]:
+    """(опыт, уровень) игрока вместе с ещё не перенесённым из журнала — то, что он только что заработал"""
+
+    experience, level = (await db.execute(
+        select(func.coalesce(models.Player.experience, 0) + XPBuffer.pending_sql(models.Player.id),
+               models.Player.level)
+        .where(models.Player.id == user_id)
+    )).one()
+    return experience, max(level or 1, level_for_xp(experience))
+
+
+async def _close_tasks(db: AsyncSession, user_id: int, task_ids: List[int]):
+    """Отмечает невыполненные задачи игрока выполненными, возвращает (id, points, категория квеста) закрытых"""
+
+    category = (select(models.GeneratedQuest.category)
+                .where(models.GeneratedQuest.id == models.Task.quest_id)
+                .scalar_subquery())
+    return (await db.execute(
+        update(models.Task)
+        .where(models.Task.user_id == user_id, models.Task.id.in_(task_ids),
+               models.Task.is_completed.is_not(True))
+        .values(is_completed=True, completed_at=datetime.now(UTC))
+        .returning(models.Task.id, models.Task.points, category)
+        .execution_options(synchronize_session=False)
+    )).all()
+
+
+def by_category(done) -> Dict[str, int]:
+    gained: Dict[str, int] = {}
+    for _, points, category in done:
+        if category:
+            gained[category] = gained.get(category, 0) + (points or 0)
+    return gained
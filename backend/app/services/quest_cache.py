@@ -0,0 +1,179 @@
+#quest_cache
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, UTC
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.app.config import settings
+from backend.app.database import models
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def profile_fingerprint(user_data: Dict[str, Any]) -> str:
+    """Нормализованный отпечаток профиля: одинаковые профили дают одинаковый ключ"""
+
+    def normalize_list(values):
+        return sorted({str(v).strip().lower() for v in values or [] if str(v).strip()})
+
+    normalized = {
+        "level": int(user_data.get("level") or 1),
+        "goals": normalize_list(user_data.get("goals")),
+        "habits": normalize_list(user_data.get("habits")),
+        "preferences": user_data.get("preferences") or {},
+        "theme": (user_data.get("theme") or "").strip().lower(),
+        "category": (user_data.get("category") or "").strip().lower(),
+        "model": (user_data.get("model") or "").strip(),  # подсказка роутеру: разные модели — разные квесты
+    }
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    expires_at: float
+    variants: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class QuestCache:
+    """Двухуровневый кэш квестов: LRU с TTL в памяти + таблица quest_cache в БД.
+
+    На каждый ключ копится до `variants` разных квестов. Пока их меньше —
+    запрос считается промахом и идёт в модель (больше разнообразия),
+    когда набрались — отдаётся случайный вариант (больше попаданий).
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 6 * 3600, variants: int = 3,
+                 session_factory: Optional[Callable] = None, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self.session_factory = session_factory
+        self.clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    @classmethod
+    def from_settings(cls) -> "QuestCache":
+        session_factory = None
+        if settings.QUEST_CACHE_PERSISTENT:
+            from backend.app.database.db import SessionLocal
+            session_factory = SessionLocal
+        return cls(
+            max_entries=settings.QUEST_CACHE_MAX_ENTRIES,
+            ttl=settings.QUEST_CACHE_TTL,
+            variants=settings.QUEST_CACHE_VARIANTS,
+            session_factory=session_factory,
+        )
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory_entry(key)
+
+        if entry is None and self.session_factory is not None:
+            try:
+                variants = await asyncio.to_thread(self._load_variants, key)
+            except Exception as e:
+                logger.error(f"Quest cache lookup error: {e}")
+                variants = []
+            if variants:
+                entry = self._store(key, variants)
+                if len(entry.variants) >= self.variants:
+                    metrics.inc("quest_cache_hits_total", tier="db")
+                    return random.choice(entry.variants)
+
+        elif entry is not None and len(entry.variants) >= self.variants:
+            metrics.inc("quest_cache_hits_total", tier="memory")
+            return random.choice(entry.variants)
+
+        metrics.inc("quest_cache_misses_total")
+        return None
+
+    async def put(self, key: str, quest: Dict[str, Any]):
+        entry = self._memory_entry(key)
+        if entry is None:
+            self._store(key, [quest])
+        elif len(entry.variants) < self.variants:
+            entry.variants.append(quest)
+
+        if self.session_factory is not None:
+            try:
+                await asyncio.to_thread(self._save_variant, key, quest)
+            except Exception as e:
+                logger.error(f"Quest cache persistence error: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "entries": len(self._entries),
+            "hits_memory": metrics.counter("quest_cache_hits_total", tier="memory"),
+            "hits_db": metrics.counter("quest_cache_hits_total", tier="db"),
+            "misses": metrics.counter("quest_cache_misses_total"),
+            "evictions_lru": metrics.counter("quest_cache_evictions_total", reason="lru"),
+            "evictions_ttl": metrics.counter("quest_cache_evictions_total", reason="ttl"),
+        }
+
+    def clear(self):
+        self._entries.clear()
+        metrics.set_gauge("quest_cache_entries", 0)
+
+    # --- память ---
+    def _memory_entry(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= self.clock():
+            del self._entries[key]
+            metrics.inc("quest_cache_evictions_total", reason="ttl")
+            metrics.set_gauge("quest_cache_entries", len(self._entries))
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, variants: List[Dict[str, Any]]) -> _Entry:
+        entry = _Entry(expires_at=self.clock() + self.ttl, variants=variants[:self.variants])
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.inc("quest_cache_evictions_total", reason="lru")
+        metrics.set_gauge("quest_cache_entries", len(self._entries))
+        return entry
+
+    # --- БД ---
+    def _load_variants(self, key: str) -> List[Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(models.QuestCacheEntry.quest)
+                .filter(models.QuestCacheEntry.fingerprint == key,
+                        models.QuestCacheEntry.expires_at > datetime.now(UTC))
+                .order_by(models.QuestCacheEntry.id.desc())
+                .limit(self.variants)
+                .all()
+            )
+            return [row.quest for row in rows]
+        finally:
+            db.close()
+
+    def _save_variant(self, key: str, quest: Dict[str, Any]):
+        now = datetime.now(UTC)
+        db = self.session_factory()
+        try:
+            # Заодно чистим протухшие варианты этого ключа
+            db.query(models.QuestCacheEntry).filter(
+                models.QuestCacheEntry.fingerprint == key,
+                models.QuestCacheEntry.expires_at <= now,
+            ).delete(synchronize_session=False)
+            db.add(models.QuestCacheEntry(
+                fingerprint=key,
+                quest=quest,
+                expires_at=now + timedelta(seconds=self.ttl),
+            ))
+            db.commit()
+        finally:
+            db.close()
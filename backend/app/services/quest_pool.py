@@ -0,0 +1,215 @@
+#quest_pool
+import asyncio
+import logging
+import time
+from datetime import datetime, UTC
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.app.config import settings
+from backend.app.database import models, schemas
+from backend.app.services.quest_store import insert_tasks, save_pool_quests, task_values
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def parse_level_bands(spec: str) -> List[Tuple[int, Optional[int]]]:
+    """"1-5,6-10,21-" -> [(1, 5), (6, 10), (21, None)]"""
+    bands = []
+    for part in spec.split(","):
+        low, _, high = part.strip().partition("-")
+        bands.append((int(low), int(high) if high else None))
+    return bands
+
+
+def band_label(band: Tuple[int, Optional[int]]) -> str:
+    low, high = band
+    return f"{low}-{high}" if high is not None else f"{low}-"
+
+
+class QuestPool:
+    """Пул заранее сгенерированных квестов без владельца.
+
+    Фоновый воркер держит по `size` квестов на каждую пару (диапазон уровней, категория),
+    а generate-quest забирает готовый квест одним условным UPDATE вместо похода в модель.
+    """
+
+    def __init__(self, ai_service, session_factory: Callable[[], Session], size: int = 5,
+                 refill_interval: float = 30.0, refill_batch: int = 10, concurrency: int = 2,
+                 level_bands: str = "1-5,6-10,11-20,21-",
+                 categories: str = "health,learning,productivity,creativity,sport"):
+        self.ai_service = ai_service
+        self.session_factory = session_factory
+        self.size = size
+        self.refill_interval = refill_interval
+        self.refill_batch = refill_batch
+        self.concurrency = concurrency
+        self.bands = parse_level_bands(level_bands)
+        self.categories = [c.strip() for c in categories.split(",") if c.strip()]
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls, ai_service) -> "QuestPool":
+        from backend.app.database.db import SessionLocal
+        return cls(
+            ai_service,
+            SessionLocal,
+            size=settings.QUEST_POOL_SIZE,
+            refill_interval=settings.QUEST_POOL_REFILL_INTERVAL,
+            refill_batch=settings.QUEST_POOL_REFILL_BATCH,
+            concurrency=settings.QUEST_POOL_CONCURRENCY,
+            level_bands=settings.QUEST_POOL_LEVEL_BANDS,
+            categories=settings.QUEST_POOL_CATEGORIES,
+        )
+
+    def band_for_level(self, level: int) -> str:
+        for band in self.bands:
+            low, high = band
+            if level >= low and (high is None or level <= high):
+                return band_label(band)
+        return band_label(self.bands[0] if level < self.bands[0][0] else self.bands[-1])
+
+    # --- фоновое пополнение ---
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        if not self.ai_service.client:
+            logger.warning("AI client is not configured, quest pool refill disabled")
+            return
+        while True:
+            try:
+                await self.refill_once()
+            except Exception as e:
+                logger.error(f"Quest pool refill error: {e}")
+            await asyncio.sleep(self.refill_interval)
+
+    async def refill_once(self) -> int:
+        """Один цикл пополнения, возвращает число сгенерированных квестов"""
+
+        depths = await asyncio.to_thread(self.depths)
+        jobs = []
+        for band in self.bands:
+            for category in self.categories:
+                missing = self.size - depths.get((band_label(band), category), 0)
+                jobs.extend([(band, category)] * max(0, missing))
+        jobs = jobs[:self.refill_batch]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def generate(band, category):
+            async with semaphore:
+                return await self._generate_one(band, category)
+
+        results = await asyncio.gather(*(generate(b, c) for b, c in jobs), return_exceptions=True)
+        created = sum(1 for r in results if r is True)
+        if created:
+            await asyncio.to_thread(self.depths)
+        return created
+
+    async def _generate_one(self, band: Tuple[int, Optional[int]], category: str) -> bool:
+        low, high = band
+        user_data = {
+            "level": low if high is None else (low + high) // 2,
+            "goals": [], "habits": [], "preferences": {},
+            "category": category,
+        }
+        try:
+            quest = await self.ai_service.generate_quest(user_data, use_cache=False, fallback=False)
+        except Exception as e:
+            logger.warning(f"Quest pool generation failed for {band_label(band)}/{category}: {e}")
+            return False
+
+        await asyncio.to_thread(self._save, band_label(band), category, quest)
+        return True
+
+    def _save(self, level_band: str, category: str, quest: dict):
+        db = self.session_factory()
+        try:
+            save_pool_quests(db, [{**quest, "category": category, "level_band": level_band}],
+                             self.ai_service.default_model)
+        finally:
+            db.close()
+
+    def depths(self) -> Dict[Tuple[str, str], int]:
+        """Текущая глубина пула по (диапазон, категория); заодно обновляет gauge"""
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(models.GeneratedQuest.level_band, models.GeneratedQuest.category, func.count())
+                .filter(models.GeneratedQuest.user_id.is_(None), models.GeneratedQuest.level_band.isnot(None))
+                .group_by(models.GeneratedQuest.level_band, models.GeneratedQuest.category)
+                .all()
+            )
+        finally:
+            db.close()
+
+        depths = {(band, category): count for band, category, count in rows}
+        for band in self.bands:
+            for category in self.categories:
+                key = (band_label(band), category)
+                metrics.set_gauge("quest_pool_depth", depths.get(key, 0), band=key[0], category=category)
+        return depths
+
+    # --- выдача ---
+    async def claim(self, db: AsyncSession, user_id: int, level: int, category: Optional[str] = None,
+                    attempts: int = 3) -> Optional[schemas.GeneratedQuest]:
+        """Атомарно забирает квест из пула и создаёт задачи по его шагам. None — пул пуст.
+
+        db — пишущая сессия: в обработчике её даёт write_session.
+        """
+
+        started = time.perf_counter()
+        band = self.band_for_level(level)
+        try:
+            for _ in range(attempts):
+                query = select(models.GeneratedQuest.id).where(
+                    models.GeneratedQuest.user_id.is_(None),
+                    models.GeneratedQuest.level_band == band,
+                )
+                if category:
+                    query = query.where(models.GeneratedQuest.category == category)
+                candidate = (await db.execute(
+                    query.order_by(models.GeneratedQuest.id).limit(1).with_for_update(skip_locked=True)
+                )).scalar()
+                if candidate is None:
+                    await db.rollback()
+                    metrics.inc("quest_pool_claims_total", result="empty")
+                    return None
+
+                # Условие user_id IS NULL защищает от двойной выдачи одного квеста
+                claimed = await db.execute(
+                    update(models.GeneratedQuest)
+                    .where(models.GeneratedQuest.id == candidate, models.GeneratedQuest.user_id.is_(None))
+                    .values(user_id=user_id, created_at=datetime.now(UTC))
+                    .execution_options(synchronize_session=False)
+                )
+                if not claimed.rowcount:
+                    await db.rollback()
+                    continue
+
+                quest = await db.get(models.GeneratedQuest, candidate)
+                await insert_tasks(db, task_values(quest.steps, user_id, quest.id))
+                response = schemas.GeneratedQuest.model_validate(quest)
+                await db.commit()
+                metrics.inc("quest_pool_claims_total", result="hit")
+                return response
+
+            metrics.inc("quest_pool_claims_total", result="contended")
+            return None
+        finally:
+            metrics.observe("quest_pool_claim_seconds", time.perf_counter() - started)
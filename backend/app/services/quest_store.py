@@ -0,0 +1,124 @@
+#quest_store
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.compiler import InsertmanyvaluesSentinelOpts
+
+from backend.app.database import models, schemas
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_quests = models.GeneratedQuest.__table__
+_tasks = models.Task.__table__
+
+
+def _insert_returning(table, dialect):
+    """INSERT ... RETURNING на всю пачку строк (insertmanyvalues) и упорядочивание результата.
+
+    PostgreSQL сам сопоставляет RETURNING с параметрами (sort_by_parameter_order) в одном
+    запросе. SQLite этого не умеет и вставлял бы по строке; там rowid раздаются по порядку
+    VALUES, поэтому порядок восстанавливаем сортировкой по id.
+    """
+
+    statement = insert(table)
+    if dialect.insertmanyvalues_implicit_sentinel & InsertmanyvaluesSentinelOpts.ANY_AUTOINCREMENT:
+        return statement.returning(*table.columns, sort_by_parameter_order=True), lambda rows: rows
+    return statement.returning(*table.columns), lambda rows: sorted(rows, key=lambda row: row.id)
+
+
+async def _insert_async(db: AsyncSession, table, values: List[Dict[str, Any]]) -> list:
+    statement, ordered = _insert_returning(table, db.get_bind().dialect)
+    return ordered((await db.execute(statement, values)).all())
+
+
+def quest_values(quest: dict, user_id: Optional[int], ai_model: str, category: Optional[str] = None,
+                 level_band: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "title": quest["title"],
+        "description": quest["description"],
+        "steps": quest["steps"],
+        "estimated_time": quest["estimated_time"],
+        "difficulty": quest["difficulty"],
+        "category": category or quest["category"],
+        "ai_generated": True,
+        "ai_model": ai_model,
+        "level_band": level_band,
+        "user_id": user_id,
+    }
+
+
+def task_values(steps: List[dict], user_id: int, quest_id: int) -> List[Dict[str, Any]]:
+    """Задачи по шагам квеста"""
+    return [
+        {"title": step["title"], "description": step["description"], "points": step["points"],
+         "user_id": user_id, "quest_id": quest_id}
+        for step in steps or []
+    ]
+
+
+async def save_quests(db: AsyncSession, user_id: int, quests: List[dict], ai_model: str
+                      ) -> List[schemas.QuestGenerationResponse]:
+    """Квесты игрока и задачи по их шагам: два INSERT ... RETURNING в одной транзакции.
+
+    Либо сохраняется всё, либо ничего — квеста без задач после сбоя не остаётся.
+    """
+
+    started = time.perf_counter()
+    try:
+        quest_rows = await _insert_async(db, _quests, [quest_values(q, user_id, ai_model) for q in quests])
+        tasks = [task_values(quest["steps"], user_id, row.id) for quest, row in zip(quests, quest_rows)]
+        task_rows = await insert_tasks(db, [task for quest_tasks in tasks for task in quest_tasks])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    metrics.observe("quest_store_save_seconds", time.perf_counter() - started)
+    metrics.inc("quest_store_rows_total", len(quest_rows), table="generated_quests")
+    return _responses(quest_rows, task_rows)
+
+
+async def insert_tasks(db: AsyncSession, values: List[Dict[str, Any]]) -> list:
+    """Вставка задач в текущей транзакции, commit — за вызывающим"""
+
+    if not values:
+        return []
+    rows = await _insert_async(db, _tasks, values)
+    metrics.inc("quest_store_rows_total", len(rows), table="tasks")
+    return rows
+
+
+def save_pool_quests(db: Session, quests: List[dict], ai_model: str) -> List[int]:
+    """Квесты пула предгенерации (без владельца и задач) для синхронных воркеров.
+
+    quests — словари квестов с ключами category и level_band; возвращает id в том же порядке.
+    """
+
+    if not quests:
+        return []
+    values = [quest_values(q, None, ai_model, category=q["category"], level_band=q["level_band"]) for q in quests]
+    try:
+        statement, ordered = _insert_returning(_quests, db.get_bind().dialect)
+        ids = [row.id for row in ordered(db.execute(statement, values).all())]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    metrics.inc("quest_store_rows_total", len(ids), table="generated_quests")
+    return ids
+
+
+def _responses(quest_rows: list, task_rows: list) -> List[schemas.QuestGenerationResponse]:
+    tasks_by_quest: Dict[int, List[schemas.Task]] = {}
+    for row in task_rows:
+        tasks_by_quest.setdefault(row.quest_id, []).append(schemas.Task.model_validate(row._mapping))
+    return [
+        schemas.QuestGenerationResponse(quest=schemas.GeneratedQuest.model_validate(row._mapping),
+                                        tasks=tasks_by_quest.get(row.id, []))
+        for row in quest_rows
+    ]
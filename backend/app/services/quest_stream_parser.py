@@ -0,0 +1,112 @@
+#quest_stream_parser
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.app.database import schemas
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, Any]
+
+
+class QuestStreamParser:
+    """Инкрементальный разбор JSON квеста по мере прихода токенов.
+
+    feed() принимает очередной кусок текста и возвращает готовые события:
+    ("title", str), ("description", str), ("step", dict) на каждый завершённый шаг
+    и ("done", dict) с полным квестом, когда закрылся корневой объект.
+    Текст до первой "{" (например ```json) и после корневого объекта игнорируется.
+    """
+
+    def __init__(self):
+        self.finished = False
+        self.steps: List[Dict[str, Any]] = []
+        self._parts: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._string: Optional[List[str]] = None   # строка на первом уровне объекта (ключ или значение)
+        self._string_is_key = False
+        self._step: Optional[List[str]] = None     # текст текущего элемента steps
+
+    def feed(self, chunk: str) -> List[Event]:
+        events: List[Event] = []
+        for ch in chunk:
+            if self.finished:
+                break
+            if not self._stack and ch != "{":
+                continue
+
+            self._parts.append(ch)
+            if self._step is not None:
+                self._step.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    events.extend(self._end_string())
+                    continue
+                if self._string is not None:
+                    self._string.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if len(self._stack) == 1:
+                    self._string = []
+                    self._string_is_key = self._expect_key
+            elif ch in "{[":
+                self._stack.append(ch)
+                if len(self._stack) == 1:
+                    self._expect_key = True
+                elif ch == "{" and len(self._stack) == 3 and self._stack[1] == "[" and self._key == "steps":
+                    self._step = ["{"]
+            elif ch in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    self.finished = True
+                    events.append(("done", self._end_quest()))
+                elif ch == "}" and len(self._stack) == 2 and self._step is not None:
+                    events.extend(self._end_step())
+            elif len(self._stack) == 1:
+                if ch == ":":
+                    self._expect_key = False
+                elif ch == ",":
+                    self._expect_key = True
+        return events
+
+    def _end_string(self) -> List[Event]:
+        if self._string is None:
+            return []
+        value = json.loads('"' + "".join(self._string) + '"')
+        self._string = None
+        if self._string_is_key:
+            self._key = value
+            return []
+        if self._key in ("title", "description"):
+            return [(self._key, value)]
+        return []
+
+    def _end_step(self) -> List[Event]:
+        text = "".join(self._step)
+        self._step = None
+        try:
+            step = schemas.QuestStep.model_validate_json(text).model_dump()
+        except ValueError as e:
+            logger.warning(f"Skipping invalid quest step in stream: {e}")
+            return []
+        self.steps.append(step)
+        return [("step", step)]
+
+    def _end_quest(self) -> Dict[str, Any]:
+        data = json.loads("".join(self._parts))
+        # Шаги уже провалидированы по одному — берём их, а не сырой массив
+        data["steps"] = self.steps
+        return schemas.GeneratedQuestBase.model_validate(data).model_dump()
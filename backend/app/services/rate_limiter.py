@@ -0,0 +1,254 @@
+#rate_limiter
+import json
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from backend.app.config import settings
+from backend.app.services.kv_store import KeyValueStore, shared_store
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_FOR_ACCOUNT = 64 * 1024  # больше на пути с лимитом по учётке — 413: иначе лимит обходился бы набивкой тела
+
+
+@dataclass(frozen=True)
+class Limit:
+    count: int      # размер «ведра» (допустимый всплеск)
+    period: float   # за сколько секунд ведро наполняется целиком
+
+    @property
+    def rate(self) -> float:
+        return self.count / self.period
+
+
+@dataclass(frozen=True)
+class RouteLimits:
+    ip: Optional[Limit] = None
+    account: Optional[Limit] = None
+
+
+def parse_rate_limits(spec: str) -> Dict[str, RouteLimits]:
+    """"/lg/login ip=20/60 account=5/60; /auth/register ip=5/60" -> {путь: лимиты}"""
+
+    routes = {}
+    for part in spec.split(";"):
+        tokens = part.split()
+        if not tokens:
+            continue
+        path, limits = tokens[0], {}
+        for token in tokens[1:]:
+            scope, _, value = token.partition("=")
+            count, _, period = value.partition("/")
+            if scope not in ("ip", "account") or not count.isdigit():
+                raise ValueError(f"Invalid rate limit {token!r} for {path}")
+            limits[scope] = Limit(int(count), float(period or 1))
+        routes[path] = RouteLimits(**limits)
+    return routes
+
+
+class LocalBuckets:
+    """Token bucket'ы в памяти процесса, разбитые на шарды со своими замками.
+
+    Ключ попадает в шард по хэшу, поэтому одновременные запросы к разным
+    ключам почти не делят замок. Полное ведро эквивалентно отсутствующему,
+    такие записи выбрасываются, когда шард разрастается. Момент, когда ведро
+    наполнится, хранится в нём самом: в шарде лежат ведра разных лимитов.
+    """
+
+    def __init__(self, shards: int = 64, max_keys_per_shard: int = 10_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.max_keys_per_shard = max_keys_per_shard
+        self._shards: List[Tuple[threading.Lock, Dict[str, List[float]]]] = [
+            (threading.Lock(), {}) for _ in range(shards)
+        ]
+
+    async def hit(self, key: str, limit: Limit) -> float:
+        """0 — запрос пропущен, иначе сколько секунд ждать следующего токена"""
+
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            now = self.clock()
+            bucket = buckets.get(key)
+            if bucket is None:
+                tokens = float(limit.count)
+                if len(buckets) >= self.max_keys_per_shard:
+                    self._compact(buckets, now)
+            else:
+                tokens = min(float(limit.count), bucket[0] + (now - bucket[1]) * limit.rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / limit.rate
+            buckets[key] = [tokens, now, now + (limit.count - tokens) / limit.rate]  # [токены, когда, полно к]
+            return retry_after
+
+    def _compact(self, buckets: Dict[str, List[float]], now: float):
+        full = [key for key, (_, _, full_at) in buckets.items() if full_at <= now]
+        for key in full:
+            del buckets[key]
+
+
+class StoreBuckets:
+    """Счётчики в общем хранилище (между воркерами): фиксированное окно длиной period на count запросов"""
+
+    def __init__(self, store: KeyValueStore, clock: Callable[[], float] = time.time):
+        self.store = store
+        self.clock = clock
+
+    async def hit(self, key: str, limit: Limit) -> float:
+        now = self.clock()
+        window = int(now // limit.period)
+        count = await self.store.incr(f"rl:{key}:{window}", ttl=limit.period)
+        if count <= limit.count:
+            return 0.0
+        return (window + 1) * limit.period - now
+
+
+class RateLimiter:
+    """Правила по путям + хранилище ведёр. Один объект на процесс, его читает middleware"""
+
+    def __init__(self, rules: Dict[str, RouteLimits], buckets, enabled: bool = True):
+        self.rules = rules
+        self.buckets = buckets
+        self.enabled = enabled
+
+    @classmethod
+    def from_settings(cls) -> "RateLimiter":
+        buckets = StoreBuckets(shared_store) if settings.RATE_LIMIT_SHARED else LocalBuckets(settings.RATE_LIMIT_SHARDS)
+        return cls(parse_rate_limits(settings.RATE_LIMITS), buckets, enabled=settings.RATE_LIMIT_ENABLED)
+
+    async def hit(self, path: str, scope: str, identity: str, limit: Limit) -> float:
+        return await self.buckets.hit(f"{path}|{scope}|{identity}", limit)
+
+    async def hit_player(self, path: str, player_id: int) -> float:
+        """Ведро учётки по id игрока, когда обработчик его уже нашёл: вход по username и по email
+        тратит одно ведро (middleware видит только то, что прислал клиент)"""
+        limits = self.rules.get(path)
+        if not self.enabled or limits is None or limits.account is None:
+            return 0.0
+        retry_after = await self.hit(path, "account", f"#{player_id}", limits.account)
+        if retry_after:
+            metrics.inc("rate_limited_total", route=path, scope="account")
+        return retry_after
+
+
+class RateLimitMiddleware:
+    """ASGI-middleware: ограничивает POST на перечисленные пути по IP и по учётке.
+
+    Срабатывает до роутинга, то есть до любых запросов в БД и bcrypt. Учётка
+    (username/email) берётся из формы (urlencoded или multipart) или JSON; тело
+    буферизуется и отдаётся приложению заново. На путях с лимитом по учётке
+    тело больше MAX_BODY_FOR_ACCOUNT — 413, тело в другом формате — 415:
+    иначе лимит по учётке обходился бы сменой формата.
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiter
+        if not limiter.enabled or scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        limits = limiter.rules.get(path)
+        if limits is None:
+            return await self.app(scope, receive, send)
+
+        if limits.ip is not None:
+            client = scope.get("client")
+            retry_after = await limiter.hit(path, "ip", client[0] if client else "-", limits.ip)
+            if retry_after:
+                return await self._reject(send, path, "ip", retry_after)
+
+        if limits.account is not None:
+            messages, body, too_large = await self._read_body(receive)
+            if too_large:
+                return await self._reject(send, path, "body", 0, status=413,
+                                          detail=b'{"detail":"Request body too large"}')
+            receive = self._replay(messages, receive)
+            fields = await self._fields(scope, body) if body else {}
+            if fields is None:
+                return await self._reject(send, path, "body", 0, status=415,
+                                          detail=b'{"detail":"Unsupported content type"}')
+            for account in self._accounts(fields):
+                retry_after = await limiter.hit(path, "account", account, limits.account)
+                if retry_after:
+                    return await self._reject(send, path, "account", retry_after)
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _read_body(receive) -> Tuple[list, Optional[bytes], bool]:
+        """(прочитанные сообщения, тело или None, тело больше MAX_BODY_FOR_ACCOUNT)"""
+        messages, chunks, size = [], [], 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                return messages, None, False
+            chunk = message.get("body", b"")
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > MAX_BODY_FOR_ACCOUNT:
+                return messages, None, True
+            if not message.get("more_body", False):
+                return messages, b"".join(chunks), False
+
+    @staticmethod
+    def _replay(messages: list, receive):
+        async def replayed():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+        return replayed
+
+    @staticmethod
+    async def _fields(scope, body: bytes) -> Optional[Dict[str, Any]]:
+        """Поля тела; None — формат, который лимитер не разбирает"""
+        headers = Headers(scope=scope)
+        content_type = headers.get("content-type", "")
+        try:
+            if content_type.startswith("application/x-www-form-urlencoded"):
+                return {k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()}
+            if content_type.startswith("application/json"):
+                values = json.loads(body)
+                return values if isinstance(values, dict) else {}
+            if content_type.startswith("multipart/form-data"):
+                async def chunks():
+                    yield body
+
+                form = await MultiPartParser(headers, chunks()).parse()
+                return {k: v for k, v in form.items() if isinstance(v, str)}
+        except (UnicodeDecodeError, ValueError, MultiPartException):
+            return {}  # битое тело: приложение само ответит 400/422, до БД не дойдёт
+        return None
+
+    @staticmethod
+    def _accounts(fields: Dict[str, Any]) -> List[str]:
+        """Все присланные идентификаторы учётки: с username и email тратятся оба ведра"""
+        accounts = {value.strip().lower() for value in (fields.get("username"), fields.get("email"))
+                    if isinstance(value, str) and value.strip()}
+        return sorted(accounts)
+
+    @staticmethod
+    async def _reject(send, path: str, scope: str, retry_after: float, status: int = 429,
+                      detail: bytes = b'{"detail":"Too many requests, try again later"}'):
+        metrics.inc("rate_limited_total", route=path, scope=scope)
+        headers = [(b"content-type", b"application/json")]
+        if status == 429:
+            headers.append((b"retry-after", str(max(1, math.ceil(retry_after))).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": detail})
@@ -0,0 +1,68 @@
+#refresh_tokens
+import logging
+import time
+from typing import Any, Dict
+
+from backend.app.services.kv_store import KeyValueStore
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenError(Exception):
+    pass
+
+
+class TokenReuseError(RefreshTokenError):
+    """Уже использованный (ротированный) refresh-токен пришёл повторно — вероятна кража"""
+
+
+class TokenRevokedError(RefreshTokenError):
+    pass
+
+
+class RefreshTokenStore:
+    """Учёт ротации refresh-токенов: по ключу на использованный токен (jti) и на отозванное семейство.
+
+    Токены одного входа образуют семейство (fam). Каждый refresh помечает jti
+    использованным; повтор того же jti отзывает всё семейство. Все ключи живут
+    не дольше самих токенов, поэтому хранилище само очищается от истёкших записей.
+    Проверки — O(1) операции хранилища, без БД.
+    """
+
+    def __init__(self, store: KeyValueStore, family_ttl: float, clock=time.time):
+        self.store = store
+        self.family_ttl = family_ttl
+        self.clock = clock
+
+    async def rotate(self, claims: Dict[str, Any]):
+        """Принимает claims предъявленного токена; бросает RefreshTokenError, если ротировать нельзя"""
+
+        jti, family = claims.get("jti"), claims.get("fam")
+        if not jti or not family:
+            metrics.inc("refresh_tokens_total", result="invalid")
+            raise RefreshTokenError("Refresh token has no id")
+
+        if await self.store.get(self._family_key(family)) is not None:
+            metrics.inc("refresh_tokens_total", result="revoked")
+            raise TokenRevokedError("Refresh token family is revoked")
+
+        remaining = max(1.0, claims["exp"] - self.clock())
+        if not await self.store.set_if_absent(self._used_key(jti), family, ttl=remaining):
+            await self.revoke_family(family)
+            metrics.inc("refresh_tokens_total", result="reused")
+            logger.warning(f"Refresh token reuse detected, family {family} revoked")
+            raise TokenReuseError("Refresh token was already used")
+
+        metrics.inc("refresh_tokens_total", result="rotated")
+
+    async def revoke_family(self, family: str):
+        await self.store.set(self._family_key(family), 1, ttl=self.family_ttl)
+
+    @staticmethod
+    def _used_key(jti: str) -> str:
+        return f"rt:u:{jti}"
+
+    @staticmethod
+    def _family_key(family: str) -> str:
+        return f"rt:f:{family}"
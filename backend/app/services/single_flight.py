@@ -0,0 +1,145 @@
+#single_flight
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StreamCancelledError(Exception):
+    pass
+
+
+class SharedStream:
+    """Один upstream-стрим на много подписчиков.
+
+    Куски копятся в буфере, каждый подписчик читает его со своей позиции,
+    поэтому опоздавший получает полный повтор уже пришедших данных.
+    Когда уходит последний подписчик, upstream обрывается — сразу или,
+    при idle_timeout > 0, если за это время никто не переподключился.
+    Если первый подписчик так и не пришёл за attach_timeout (клиент ушёл
+    до начала ответа), upstream тоже обрывается.
+    """
+
+    def __init__(self, source: AsyncIterator[Any], on_done: Optional[Callable[["SharedStream"], None]] = None,
+                 idle_timeout: float = 0.0, attach_timeout: float = 5.0):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.cancelled = False
+        self.subscribers = 0
+        self.idle_timeout = idle_timeout
+        self._on_done = on_done
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._pump(source))
+        # Таймер простоя идёт с самого создания: первая подписка его снимает
+        self._idle_handle: Optional[asyncio.TimerHandle] = asyncio.get_running_loop().call_later(
+            max(attach_timeout, idle_timeout), self._cancel_if_idle)
+
+    async def _pump(self, source: AsyncIterator[Any]):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = StreamCancelledError("Upstream stream was cancelled")
+        except Exception as e:
+            logger.error(f"Shared stream source failed: {e}")
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            if self._on_done:
+                self._on_done(self)
+
+    def _notify(self):
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def cancel(self):
+        """Обрывает upstream: отмена задачи закрывает HTTP-стрим к модели и освобождает слот"""
+        if not self.done and not self.cancelled:
+            self.cancelled = True
+            self._task.cancel()
+            metrics.inc("ai_stream_cancelled_total")
+
+    async def subscribe(self, start: int = 0) -> AsyncIterator[Any]:
+        self.subscribers += 1
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        try:
+            position = start
+            while True:
+                while position < len(self.items):
+                    yield self.items[position]
+                    position += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._wakeup.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self._on_idle()
+
+    def _on_idle(self):
+        if self.done:
+            return
+        if self.idle_timeout > 0:
+            self._idle_handle = asyncio.get_running_loop().call_later(self.idle_timeout, self._cancel_if_idle)
+        else:
+            # Все клиенты ушли — дальше генерировать некому
+            self.cancel()
+
+    def _cancel_if_idle(self):
+        self._idle_handle = None
+        if self.subscribers == 0:
+            self.cancel()
+
+
+class SingleFlight:
+    """Склеивает одновременные одинаковые вызовы в один upstream-вызов"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, SharedStream] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+            metrics.inc("ai_singleflight_total", role="leader")
+        else:
+            metrics.inc("ai_singleflight_total", role="follower")
+        # shield: отмена одного ожидающего не должна отменять общий вызов
+        return await asyncio.shield(future)
+
+    def join(self, key: str) -> Optional[AsyncIterator[Any]]:
+        """Подписка на уже идущий стрим с таким ключом или None"""
+        shared = self._streams.get(key)
+        if shared is None or shared.done or shared.cancelled:
+            return None
+        metrics.inc("ai_singleflight_total", role="stream_follower")
+        return shared.subscribe()
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        joined = self.join(key)
+        if joined is not None:
+            return joined
+        shared = SharedStream(factory(), on_done=lambda s: self._forget_stream(key, s))
+        self._streams[key] = shared
+        metrics.inc("ai_singleflight_total", role="stream_leader")
+        return shared.subscribe()
+
+    def _forget_stream(self, key: str, shared: SharedStream):
+        if self._streams.get(key) is shared:
+            del self._streams[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._streams)
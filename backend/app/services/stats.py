@@ -0,0 +1,271 @@
+#stats
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, UTC
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import case, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.app.config import settings
+from backend.app.database import models, schemas
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+NO_CATEGORY = ""  # задачи вне квестов
+
+_daily = models.DailyStat.__table__
+_streaks = models.PlayerStreak.__table__
+_progress = models.BackfillProgress.__table__
+
+
+def _insert_for(dialect):
+    """INSERT с ON CONFLICT — в SQLAlchemy он свой у каждого диалекта"""
+    return postgresql.insert if dialect.name == "postgresql" else sqlite.insert
+
+
+def _add_daily(insert_):
+    """Upsert сводки дня: счётчики прибавляются к уже накопленным"""
+    statement = insert_(_daily)
+    return statement.on_conflict_do_update(
+        index_elements=[_daily.c.user_id, _daily.c.day, _daily.c.category],
+        set_={"tasks_completed": _daily.c.tasks_completed + statement.excluded.tasks_completed,
+              "experience": _daily.c.experience + statement.excluded.experience},
+    )
+
+
+async def record_completions(db: AsyncSession, user_id: int, done, day: date):
+    """Учитывает закрытые задачи (id, points, категория) в сводках дня и серии — в транзакции выполнения"""
+
+    counters: Dict[str, list] = defaultdict(lambda: [0, 0])
+    for _, points, category in done:
+        counters[category or NO_CATEGORY][0] += 1
+        counters[category or NO_CATEGORY][1] += points or 0
+    insert_ = _insert_for(db.get_bind().dialect)
+    await db.execute(_add_daily(insert_).values([
+        {"user_id": user_id, "day": day, "category": category, "tasks_completed": tasks, "experience": experience}
+        for category, (tasks, experience) in counters.items()
+    ]))
+
+    # Серия: вчера был активен — +1, сегодня уже — без изменений, иначе начинается заново
+    statement = insert_(_streaks).values(user_id=user_id, current_streak=1, longest_streak=1, last_active_day=day)
+    current = case(
+        (_streaks.c.last_active_day == day - timedelta(days=1), _streaks.c.current_streak + 1),
+        else_=1,
+    )
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[_streaks.c.user_id],
+        set_={"current_streak": current,
+              "longest_streak": case((current > _streaks.c.longest_streak, current), else_=_streaks.c.longest_streak),
+              "last_active_day": day},
+        where=(_streaks.c.last_active_day.is_(None)) | (_streaks.c.last_active_day < day),
+    ))
+
+
+async def read_stats(db: AsyncSession, user_id: int, days: int, today: date) -> schemas.PlayerStats:
+    """Статистика только из сводок: читается не больше days дней, сколько бы задач ни было в истории"""
+
+    week_start = today - timedelta(days=today.weekday())
+    since = min(today - timedelta(days=days - 1), week_start)
+    rows = (await db.execute(
+        select(_daily.c.day, _daily.c.category, _daily.c.tasks_completed, _daily.c.experience)
+        .where(_daily.c.user_id == user_id, _daily.c.day >= since)
+    )).all()
+    streak = (await db.execute(
+        select(_streaks.c.current_streak, _streaks.c.longest_streak, _streaks.c.last_active_day)
+        .where(_streaks.c.user_id == user_id)
+    )).first()
+
+    window = today - timedelta(days=days - 1)
+    by_day: Dict[date, list] = {window + timedelta(days=i): [0, 0] for i in range(days)}
+    by_category: Dict[str, list] = defaultdict(lambda: [0, 0])
+    week = [0, 0]
+    for day, category, tasks, experience in rows:
+        if day >= window:
+            by_day[day][0] += tasks
+            by_day[day][1] += experience
+            by_category[category][0] += tasks
+            by_category[category][1] += experience
+        if day >= week_start:
+            week[0] += tasks
+            week[1] += experience
+
+    current = 0
+    if streak and streak.last_active_day and streak.last_active_day >= today - timedelta(days=1):
+        current = streak.current_streak  # последний активный день — сегодня или вчера: серия ещё жива
+    return schemas.PlayerStats(
+        days=[schemas.DayStats(day=day, tasks_completed=tasks, experience=experience)
+              for day, (tasks, experience) in sorted(by_day.items())],
+        categories=[schemas.CategoryStats(category=category or None, tasks_completed=tasks, experience=experience)
+                    for category, (tasks, experience) in sorted(by_category.items())],
+        week_tasks_completed=week[0],
+        week_experience=week[1],
+        current_streak=current,
+        longest_streak=streak.longest_streak if streak else 0,
+    )
+
+
+class StatsBackfill:
+    """Заполнение сводок по задачам, выполненным до их появления.
+
+    prepare() при старте записывает cutoff — момент, с которого сводки ведут сами выполнения
+    (первый стартовавший воркер, до обслуживания запросов). run() идёт по tasks с completed_at
+    раньше cutoff кусками по id: кусок суммируется и прибавляется к сводкам в одной транзакции
+    с продвижением last_id, поэтому перезапуск продолжает с места остановки, а два воркера
+    не посчитают кусок дважды. В конце серии пересчитываются по готовым сводкам.
+    """
+
+    NAME = "daily_stats"
+
+    def __init__(self, session_factory: Callable[[], Session], chunk_size: int = 10_000):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> "StatsBackfill":
+        from backend.app.database.db import SessionLocal
+        return cls(SessionLocal, chunk_size=settings.STATS_BACKFILL_CHUNK)
+
+    def prepare(self, cutoff: Optional[datetime] = None) -> Tuple[datetime, bool]:
+        """(cutoff, уже закончено); cutoff фиксирует только первый вызов"""
+        db = self.session_factory()
+        try:
+            insert_ = _insert_for(db.get_bind().dialect)
+            db.execute(insert_(_progress).values(name=self.NAME, last_id=0, cutoff=cutoff or datetime.now(UTC))
+                       .on_conflict_do_nothing(index_elements=[_progress.c.name]))
+            db.commit()
+            row = db.execute(select(_progress.c.cutoff, _progress.c.finished_at)
+                             .where(_progress.c.name == self.NAME)).one()
+            return row.cutoff, row.finished_at is not None
+        finally:
+            db.close()
+
+    def start(self):
+        if self._task is None:
+            _, finished = self.prepare()
+            if not finished:
+                self._task = asyncio.create_task(asyncio.to_thread(self.run))
+
+    async def stop(self):
+        self._stopping = True  # поток закончит текущий кусок и выйдет
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"Stats backfill failed: {e}")
+            self._task = None
+
+    def run(self) -> int:
+        """Заполняет сводки до конца (или до stop), возвращает число учтённых задач"""
+        started, total = time.perf_counter(), 0
+        while True:
+            if self._stopping:
+                return total
+            moved = self._backfill_chunk()
+            if moved is None:
+                break
+            total += moved
+        self._rebuild_streaks()
+        self._finish()
+        logger.info(f"Stats backfill finished: {total} tasks in {time.perf_counter() - started:.1f}s")
+        return total
+
+    def _backfill_chunk(self) -> Optional[int]:
+        """Один кусок задач; None — задач до cutoff больше нет"""
+        db = self.session_factory()
+        try:
+            last_id, cutoff = db.execute(select(_progress.c.last_id, _progress.c.cutoff)
+                                         .where(_progress.c.name == self.NAME)).one()
+            rows = db.execute(
+                select(models.Task.id, models.Task.user_id, models.Task.completed_at, models.Task.points,
+                       models.GeneratedQuest.category)
+                .outerjoin(models.GeneratedQuest, models.GeneratedQuest.id == models.Task.quest_id)
+                .where(models.Task.id > last_id, models.Task.is_completed.is_(True),
+                       models.Task.completed_at.is_not(None), models.Task.completed_at < cutoff,
+                       models.Task.user_id.is_not(None))
+                .order_by(models.Task.id)
+                .limit(self.chunk_size)
+            ).all()
+            if not rows:
+                return None
+
+            counters: Dict[tuple, list] = defaultdict(lambda: [0, 0])
+            for _, user_id, completed_at, points, category in rows:
+                counter = counters[(user_id, completed_at.date(), category or NO_CATEGORY)]
+                counter[0] += 1
+                counter[1] += points or 0
+            db.execute(_add_daily(_insert_for(db.get_bind().dialect)), [
+                {"user_id": user_id, "day": day, "category": category, "tasks_completed": tasks, "experience": xp}
+                for (user_id, day, category), (tasks, xp) in counters.items()
+            ])
+            moved = db.execute(update(_progress)
+                               .where(_progress.c.name == self.NAME, _progress.c.last_id == last_id)
+                               .values(last_id=rows[-1].id))
+            if moved.rowcount != 1:
+                db.rollback()  # этот кусок уже учёл другой воркер
+                return 0
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        metrics.inc("stats_backfill_tasks_total", len(rows))
+        return len(rows)
+
+    def _rebuild_streaks(self):
+        """Серии по всем дням из сводок — и заполненным, и записанным выполнениями"""
+        db = self.session_factory()
+        try:
+            insert_ = _insert_for(db.get_bind().dialect)
+            statement = insert_(_streaks)
+            statement = statement.on_conflict_do_update(
+                index_elements=[_streaks.c.user_id],
+                set_={column: statement.excluded[column]
+                      for column in ("current_streak", "longest_streak", "last_active_day")},
+            )
+            days = db.execute(
+                select(_daily.c.user_id, _daily.c.day).distinct()
+                .order_by(_daily.c.user_id, _daily.c.day)
+                .execution_options(yield_per=self.chunk_size)
+            )
+            batch, player = [], None
+            for user_id, day in days:
+                if player is None or player["user_id"] != user_id:
+                    if player is not None:
+                        batch.append(player)
+                    player = {"user_id": user_id, "current_streak": 0, "longest_streak": 0, "last_active_day": None}
+                if player["last_active_day"] == day - timedelta(days=1):
+                    player["current_streak"] += 1
+                else:
+                    player["current_streak"] = 1
+                player["longest_streak"] = max(player["longest_streak"], player["current_streak"])
+                player["last_active_day"] = day
+                if len(batch) >= 1000:
+                    db.execute(statement, batch)
+                    batch = []
+            if player is not None:
+                batch.append(player)
+            if batch:
+                db.execute(statement, batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _finish(self):
+        db = self.session_factory()
+        try:
+            db.execute(update(_progress).where(_progress.c.name == self.NAME).values(finished_at=datetime.now(UTC)))
+            db.commit()
+        finally:
+            db.close()
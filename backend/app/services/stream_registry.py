@@ -0,0 +1,96 @@
+#stream_registry
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Hashable, Optional, Tuple
+
+from backend.app.config import settings
+from backend.app.services.single_flight import SharedStream
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    owner: Hashable
+    stream: SharedStream
+    expires_at: float
+
+
+class StreamRegistry:
+    """Реестр идущих и недавно завершённых SSE-генераций для переподключения по Last-Event-ID.
+
+    Каждая генерация получает stream_id, её события копятся в SharedStream
+    (это и есть буфер повтора). Записи живут ttl секунд, сверх max_streams
+    вытесняются самые старые. Генерация без подписчиков обрывается сразу, а если
+    клиент попросил возможность переподключиться (resumable) — через grace секунд.
+    """
+
+    def __init__(self, max_streams: int = 1000, ttl: float = 600.0, grace: float = 30.0,
+                 attach_timeout: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self.max_streams = max_streams
+        self.ttl = ttl
+        self.grace = grace
+        self.attach_timeout = attach_timeout
+        self.clock = clock
+        self._streams: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    @classmethod
+    def from_settings(cls) -> "StreamRegistry":
+        return cls(
+            max_streams=settings.SSE_REPLAY_MAX_STREAMS,
+            ttl=settings.SSE_REPLAY_TTL,
+            grace=settings.SSE_RESUME_GRACE,
+            attach_timeout=settings.SSE_ATTACH_TIMEOUT,
+        )
+
+    def start(self, owner: Hashable, source: AsyncIterator[Any], resumable: bool = False) -> Tuple[str, SharedStream]:
+        self._purge()
+        stream_id = uuid.uuid4().hex
+        stream = SharedStream(source, idle_timeout=self.grace if resumable else 0.0,
+                              attach_timeout=self.attach_timeout)
+        self._streams[stream_id] = _Entry(owner, stream, self.clock() + self.ttl)
+
+        while len(self._streams) > self.max_streams:
+            # Вытесненная генерация доигрывает для текущих подписчиков, но переподключиться к ней уже нельзя
+            self._streams.popitem(last=False)
+            metrics.inc("sse_replay_evictions_total")
+        self._report()
+        return stream_id, stream
+
+    def get(self, stream_id: str, owner: Hashable) -> Optional[SharedStream]:
+        self._purge()
+        entry = self._streams.get(stream_id)
+        if entry is None or entry.owner != owner:
+            metrics.inc("sse_resumes_total", result="miss")
+            return None
+        metrics.inc("sse_resumes_total", result="hit")
+        return entry.stream
+
+    def _purge(self):
+        now = self.clock()
+        # TTL одинаковый, поэтому записи истекают в порядке добавления
+        while self._streams:
+            stream_id, entry = next(iter(self._streams.items()))
+            if entry.expires_at > now:
+                break
+            del self._streams[stream_id]
+        self._report()
+
+    def _report(self):
+        metrics.set_gauge("sse_replay_streams", len(self._streams))
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+
+def parse_last_event_id(value: str) -> Tuple[str, int]:
+    """"<stream_id>:<номер события>" -> (stream_id, номер)"""
+
+    stream_id, _, seq = value.strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        raise ValueError(f"Invalid Last-Event-ID: {value!r}")
+    return stream_id, int(seq)
@@ -0,0 +1,162 @@
+#xp_buffer
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.app.config import settings
+from backend.app.database import models
+from backend.app.utils.leveling import level_for_xp
+from backend.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_players = models.Player.__table__
+_journal = models.XPJournal.__table__
+
+
+class XPBuffer:
+    """Отложенная запись опыта: прибавки копятся в журнале и переносятся в players пачками.
+
+    Выполнение задачи вставляет строку в xp_journal в своей транзакции и не блокирует
+    горячую строку игрока. Перенос (flush) суммирует журнал по игрокам и обновляет
+    players одним executemany — по таймеру или когда в процессе накопилось max_pending
+    записей. Журнал — в базе, поэтому падение процесса ничего не теряет: непереносённое
+    подхватит следующий flush любого воркера. Чтение прибавляет непереносённое (pending_sql).
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], flush_interval: float = 2.0,
+                 max_pending: int = 1000, batch_size: int = 10_000, enabled: bool = True):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self._records = 0  # записей журнала от этого процесса с последнего переноса
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> "XPBuffer":
+        from backend.app.database.db import SessionLocal
+        return cls(
+            SessionLocal,
+            flush_interval=settings.XP_FLUSH_INTERVAL,
+            max_pending=settings.XP_FLUSH_MAX_PENDING,
+            enabled=settings.XP_BUFFER_ENABLED,
+        )
+
+    # --- запись ---
+    async def record(self, db: AsyncSession, user_id: int, delta: int):
+        """Прибавка опыта в текущей транзакции; commit — за вызывающим, затем note()"""
+        await db.execute(_journal.insert().values(user_id=user_id, delta=delta))
+
+    def note(self):
+        """Прибавка закоммичена: учесть её для порога и, если он достигнут, разбудить перенос"""
+        self._records += 1
+        metrics.set_gauge("xp_buffer_pending_records", self._records)
+        if self._records >= self.max_pending:
+            self._wakeup.set()
+
+    @staticmethod
+    def pending_sql(user_id_column):
+        """Подзапрос непереносённого опыта игрока — прибавлять к players.experience при чтении"""
+        return (select(func.coalesce(func.sum(_journal.c.delta), 0))
+                .where(_journal.c.user_id == user_id_column)
+                .scalar_subquery())
+
+    # --- перенос ---
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()  # не оставлять журнал до следующего запуска, если можно перенести сейчас
+        except Exception as e:
+            logger.error(f"XP flush on shutdown failed, journal kept: {e}")
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"XP flush error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def flush(self) -> int:
+        """Переносит весь журнал в players, возвращает число перенесённых записей"""
+        self._records = 0
+        metrics.set_gauge("xp_buffer_pending_records", 0)
+        total = 0
+        while True:
+            moved = await asyncio.to_thread(self._flush_batch)
+            total += moved
+            if moved < self.batch_size:
+                return total
+
+    def _flush_batch(self) -> int:
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            # DELETE ... RETURNING захватывает записи: параллельный flush другого воркера
+            # их уже не увидит, а откат транзакции вернёт их в журнал целиком
+            batch = select(_journal.c.id).order_by(_journal.c.id).limit(self.batch_size).scalar_subquery()
+            rows = db.execute(
+                delete(_journal).where(_journal.c.id.in_(batch)).returning(_journal.c.user_id, _journal.c.delta)
+            ).all()
+            if not rows:
+                db.rollback()
+                return 0
+
+            deltas: Dict[int, int] = defaultdict(int)
+            for user_id, delta in rows:
+                deltas[user_id] += delta
+            db.execute(
+                update(_players)
+                .where(_players.c.id == bindparam("player_id"))
+                .values(experience=func.coalesce(_players.c.experience, 0) + bindparam("delta")),
+                [{"player_id": user_id, "delta": delta} for user_id, delta in deltas.items()],
+            )
+
+            levels = [
+                {"player_id": player_id, "new_level": level_for_xp(experience or 0)}
+                for player_id, experience, level in db.execute(
+                    select(_players.c.id, _players.c.experience, _players.c.level)
+                    .where(_players.c.id.in_(list(deltas)))
+                )
+                if level_for_xp(experience or 0) > (level or 1)
+            ]
+            if levels:
+                db.execute(
+                    update(_players)
+                    .where(_players.c.id == bindparam("player_id"), _players.c.level < bindparam("new_level"))
+                    .values(level=bindparam("new_level")),
+                    levels,
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        metrics.inc("xp_buffer_flushed_records_total", len(rows))
+        metrics.observe("xp_buffer_flush_seconds", time.perf_counter() - started)
+        return len(rows)
@@ -0,0 +1,25 @@
+import math
+
+XP_PER_LEVEL_SQUARED = 100  # переход с уровня L на L+1 стоит 100 * L^2 опыта
+
+
+def xp_for_level(level: int) -> int:
+    """Суммарный опыт, с которого начинается уровень: 100 * (1^2 + ... + (L-1)^2)"""
+    return XP_PER_LEVEL_SQUARED * (level - 1) * level * (2 * level - 1) // 6
+
+
+def level_for_xp(total: int) -> int:
+    """Уровень по суммарному опыту в замкнутой форме, без перебора уровней.
+
+    xp_for_level(L) = 100/6 * (2(L - 1/2)^3 - L/2 + 1/4), отсюда L ~ 1/2 + cbrt(3 * total / 100);
+    float-ошибку на границах уровней исправляют сравнения с точным целочисленным порогом.
+    """
+
+    if total <= 0:
+        return 1
+    level = max(1, int(0.5 + math.cbrt(3 * total / XP_PER_LEVEL_SQUARED)))
+    while xp_for_level(level + 1) <= total:
+        level += 1
+    while level > 1 and xp_for_level(level) > total:
+        level -= 1
+    return level
@@ -1,26 +1,32 @@
-import smtplib
-from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import os
-from pydoc import plain
+from email.mime.text import MIMEText
+from typing import Union
 
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-def send_verification_email(to_email: str, token: str):
-    verify_link = f"http://localhost:8000/auth/verify-email?token={token}"
+from backend.app.config import settings
+from backend.app.database import models
 
+
+def build_message(to_email: str, subject: str, body: str) -> MIMEMultipart:
     msg = MIMEMultipart()
-    msg["From"] = SMTP_USER
+    msg["From"] = settings.SMTP_USER
     msg["To"] = to_email
-    msg["Subject"] = "Подтверждение email для Life Game APP"
-
-    body = f"Привет! Подтверди свой email, перейдя по ссылке: {verify_link}"
+    msg["Subject"] = subject
     msg.attach(MIMEText(body, "plain"))
+    return msg
 
-    with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.sendmail(SMTP_USER, to_email, msg.as_string())
+
+def enqueue_email(db: Union[Session, AsyncSession], to_email: str, subject: str, body: str) -> models.OutboxMail:
+    """Кладёт письмо в outbox в текущей транзакции; commit — за вызывающим"""
+
+    mail = models.OutboxMail(to_email=to_email, subject=subject, body=body)
+    db.add(mail)
+    return mail
+
+
+def enqueue_verification_email(db: Union[Session, AsyncSession], to_email: str, token: str) -> models.OutboxMail:
+    verify_link = f"http://localhost:8000/auth/verify-email?token={token}"
+    body = f"Привет! Подтверди свой email, перейдя по ссылке: {verify_link}"
+    return enqueue_email(db, to_email, "Подтверждение email для Life Game APP", body)
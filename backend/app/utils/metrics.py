@@ -0,0 +1,71 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Any
+
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class Metrics:
+    """Простой in-process реестр метрик: счётчики, gauge и гистограммы по последним значениям"""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._window = window
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.gauges: Dict[str, float] = {}
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self._window))
+        self._totals: Dict[str, list] = defaultdict(lambda: [0, 0.0])
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self.counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._samples[key].append(value)
+            totals = self._totals[key]
+            totals[0] += 1
+            totals[1] += value
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get(_key(name, labels), 0)
+
+    def gauge(self, name: str, **labels) -> float:
+        return self.gauges.get(_key(name, labels), 0)
+
+    def summary(self, name: str, **labels) -> Dict[str, float]:
+        return self._summary_by_key(_key(name, labels))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters, gauges, keys = dict(self.counters), dict(self.gauges), list(self._samples)
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {key: self._summary_by_key(key) for key in keys},
+        }
+
+    def _summary_by_key(self, key: str) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+            count, total = self._totals.get(key, (0, 0.0))
+        if not samples:
+            return {"count": 0, "sum": 0.0}
+
+        def quantile(q):
+            return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+        return {"count": count, "sum": total, "p50": quantile(0.5), "p95": quantile(0.95), "p99": quantile(0.99)}
+
+
+metrics = Metrics()
@@ -0,0 +1,144 @@
+#ranking
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Iterator, List
+
+
+class RankedList:
+    """Упорядоченный список int64 с поиском позиции и элемента по позиции за O(log n).
+
+    Элементы лежат в отсортированных корзинах array('q') по ~load штук (8 байт на элемент),
+    maxes — последние элементы корзин для бинарного поиска корзины, а дерево Фенвика
+    над длинами корзин даёт префиксные суммы: index(x) и self[i] — O(log n) плюс
+    бинарный поиск внутри корзины. Вставка сдвигает не больше 2*load элементов.
+    """
+
+    def __init__(self, values: Iterable[int] = (), load: int = 1000):
+        self.load = load
+        self._build(sorted(values))
+
+    @classmethod
+    def from_sorted(cls, values: array, load: int = 1000) -> "RankedList":
+        """Из уже отсортированного array('q') — без сортировки и без int-объектов на элемент"""
+        ranked = cls.__new__(cls)
+        ranked.load = load
+        ranked._build(values)
+        return ranked
+
+    def _build(self, values):
+        self._buckets = [array("q", values[i:i + self.load]) for i in range(0, len(values), self.load)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(values)
+        self._reindex()
+
+    def _reindex(self):
+        tree = [0] + [len(bucket) for bucket in self._buckets]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _grow(self, k: int, delta: int):
+        k += 1
+        while k < len(self._tree):
+            self._tree[k] += delta
+            k += k & -k
+
+    def _prefix(self, k: int) -> int:
+        """Число элементов в корзинах [0, k)"""
+        total = 0
+        while k:
+            total += self._tree[k]
+            k -= k & -k
+        return total
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[int]:
+        for bucket in self._buckets:
+            yield from bucket
+
+    def __contains__(self, value: int) -> bool:
+        k = bisect_left(self._maxes, value)
+        if k == len(self._buckets):
+            return False
+        bucket = self._buckets[k]
+        i = bisect_left(bucket, value)
+        return bucket[i] == value
+
+    def add(self, value: int):
+        if not self._buckets:
+            self._build(array("q", [value]))
+            return
+        k = min(bisect_right(self._maxes, value), len(self._buckets) - 1)
+        bucket = self._buckets[k]
+        insort(bucket, value)
+        self._maxes[k] = bucket[-1]
+        self._len += 1
+        if len(bucket) > 2 * self.load:
+            self._buckets[k:k + 1] = [bucket[:self.load], bucket[self.load:]]
+            self._maxes[k:k + 1] = [bucket[self.load - 1], bucket[-1]]
+            self._reindex()
+        else:
+            self._grow(k, 1)
+
+    def remove(self, value: int):
+        k = bisect_left(self._maxes, value)
+        bucket = self._buckets[k] if k < len(self._buckets) else None
+        i = bisect_left(bucket, value) if bucket is not None else 0
+        if bucket is None or bucket[i] != value:
+            raise ValueError(f"{value} not in RankedList")
+        del bucket[i]
+        self._len -= 1
+        if bucket:
+            self._maxes[k] = bucket[-1]
+            self._grow(k, -1)
+        else:
+            del self._buckets[k], self._maxes[k]
+            self._reindex()
+
+    def index(self, value: int) -> int:
+        """Сколько элементов меньше value — позиция value, если он есть"""
+        k = bisect_left(self._maxes, value)
+        if k == len(self._buckets):
+            return self._len
+        return self._prefix(k) + bisect_left(self._buckets[k], value)
+
+    def _locate(self, position: int):
+        """(корзина, позиция в ней) для position-го элемента: спуск по дереву Фенвика"""
+        k, rest = 0, position
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            if k + step < len(self._tree) and self._tree[k + step] <= rest:
+                k += step
+                rest -= self._tree[k]
+            step >>= 1
+        return k, rest
+
+    def __getitem__(self, position: int) -> int:
+        if position < 0:
+            position += self._len
+        if not 0 <= position < self._len:
+            raise IndexError("RankedList index out of range")
+        k, i = self._locate(position)
+        return self._buckets[k][i]
+
+    def slice(self, start: int, stop: int) -> List[int]:
+        """Элементы с позиции start до stop (не включая)"""
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return []
+        k, i = self._locate(start)
+        values: List[int] = []
+        while len(values) < stop - start:
+            values.extend(self._buckets[k][i:i + stop - start - len(values)])
+            k, i = k + 1, 0
+        return values
+
+    def to_array(self) -> array:
+        values = array("q")
+        for bucket in self._buckets:
+            values.extend(bucket)
+        return values
@@ -0,0 +1,168 @@
+"""Бенчмарк: асинхронный стек БД против синхронного под смешанной нагрузкой.
+
+Синхронный стек — последний коммит до перехода на AsyncSession: он поднимается
+из временного git worktree, текущее дерево — как есть. Оба сервера — uvicorn в
+отдельном процессе на одной и той же временной SQLite; кэш игроков выключен,
+чтобы каждый запрос с токеном шёл в БД. Клиенты крутят смесь запросов:
+чтение настроек (авторизация = SELECT), запись настроек, /lg/refresh и GET /.
+Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_async_db --baseline 8796b85 --clients 32 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Tuple
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.security import create_access_token, create_refresh_token
+from backend.benchmarks.bench_login_storm import REPO_ROOT, free_port, percentile
+
+# (доля, операция)
+MIX = [(0.6, "read"), (0.2, "write"), (0.1, "refresh"), (0.1, "root")]
+
+
+def create_users(database_url: str, count: int):
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([models.Player(username=f"mixed{i}", email=f"mixed{i}@example.com", hashed_password="x")
+                for i in range(count)])
+    db.commit()
+    db.close()
+    engine.dispose()
+
+
+def start_server(root: str, database_url: str) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "PRINCIPAL_CACHE_ENABLED": "false",
+        "QUEST_POOL_ENABLED": "false",
+        "MAIL_SENDER_ENABLED": "false",
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=root, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/").status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("App server did not start")
+
+
+async def client_loop(client: httpx.AsyncClient, user: int, deadline: float, latencies: dict, errors: list):
+    rng = random.Random(user)
+    username = f"mixed{user}"
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+    refresh_token = create_refresh_token({"sub": f"{username}@example.com"})
+    operations, weights = [op for _, op in MIX], [share for share, _ in MIX]
+
+    while time.monotonic() < deadline:
+        op = rng.choices(operations, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await request(client, op, headers, refresh_token, rng)
+        except httpx.TimeoutException:
+            # Синхронный стек может встать целиком: event loop ждёт соединение из пула,
+            # а вернуть его могут только ответы, которые этот же loop и должен отправить
+            latencies[op].append(time.perf_counter() - started)
+            errors.append(f"{op}: timeout")
+            continue
+        if op == "refresh" and response.status_code == 200:
+            refresh_token = response.json()["refresh_token"]
+        latencies[op].append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors.append(f"{op}: {response.status_code}")
+
+
+async def request(client: httpx.AsyncClient, op: str, headers: dict, refresh_token: str,
+                  rng: random.Random) -> httpx.Response:
+    if op == "read":
+        return await client.get("/ai/users/me/ai-settings", headers=headers)
+    if op == "write":
+        return await client.put("/ai/users/me/ai-settings", headers=headers,
+                                json={"enabled": True, "model": f"model-{rng.randint(1, 5)}"})
+    if op == "refresh":
+        return await client.post("/lg/refresh", json={"refresh_token": refresh_token})
+    return await client.get("/")
+
+
+async def mixed_load(url: str, clients: int, seconds: float, timeout: float) -> dict:
+    latencies = {op: [] for _, op in MIX}
+    errors = []
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        warmup = time.monotonic() + 1
+        await asyncio.gather(*[client_loop(client, i, warmup, {op: [] for _, op in MIX}, [])
+                               for i in range(clients)])
+        started = time.perf_counter()
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(*[client_loop(client, clients + i, deadline, latencies, errors)
+                               for i in range(clients)])
+        elapsed = time.perf_counter() - started
+    return {"elapsed": elapsed, "latencies": latencies, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", default="8796b85", help="коммит с синхронным стеком")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=10.0, help="таймаут запроса, сек")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{tmp}/bench.db"
+        create_users(database_url, args.clients * 2)
+        worktree = os.path.join(tmp, "baseline")
+        subprocess.run(["git", "worktree", "add", "--detach", worktree, args.baseline],
+                       cwd=REPO_ROOT, check=True, capture_output=True)
+        try:
+            for stack, root in (("sync", worktree), ("async", REPO_ROOT)):
+                process, url = start_server(root, database_url)
+                try:
+                    results[stack] = asyncio.run(mixed_load(url, args.clients, args.seconds, args.timeout))
+                finally:
+                    process.terminate()
+                    try:
+                        process.wait(timeout=10)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=REPO_ROOT, capture_output=True)
+
+    print(f"{args.clients} clients x {args.seconds:.0f}s, mix "
+          + ", ".join(f"{op} {share:.0%}" for share, op in MIX) + f", {os.cpu_count()} CPU")
+    print(f"{'stack':<7}{'req/s':>8}{'errors':>8}" + "".join(f"{'p50/p99 ' + op + ', ms':>24}" for _, op in MIX))
+    for stack, result in results.items():
+        total = sum(len(samples) for samples in result["latencies"].values())
+        row = f"{stack:<7}{total / result['elapsed']:>8.0f}{len(result['errors']):>8}"
+        for _, op in MIX:
+            samples = result["latencies"][op]
+            row += f"{percentile(samples, 0.5) * 1000:>14.1f} /{percentile(samples, 0.99) * 1000:>7.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Бенчмарк: N последовательных одиночных генераций против одной пакетной.
+
+Модель — локальный мок с фиксированной задержкой на запрос и на токен ответа,
+сохранение — во временную SQLite. Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_batch_generation --count 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.services.ai_backends import ChatBackend
+from backend.app.services.ai_integration import AIservice
+from backend.app.services.quest_store import save_quests
+from backend.tests.mock_model_server import MockModelServer
+
+
+async def run(count: int, server: MockModelServer, session_factory, user_id: int):
+    service = AIservice(client=ChatBackend(base_url=server.url), cache=None)
+    user_data = {"level": 1, "goals": ["здоровье"], "habits": [], "preferences": {}, "user_id": user_id}
+    results = {}
+
+    server.prompt_tokens = server.completion_tokens = server.requests = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        quest = await service.generate_quest(user_data, use_cache=False)
+        async with session_factory() as db:
+            await save_quests(db, user_id, [quest], "mock")
+    results["single"] = (time.perf_counter() - started, server.requests, server.prompt_tokens, server.completion_tokens)
+
+    server.prompt_tokens = server.completion_tokens = server.requests = 0
+    started = time.perf_counter()
+    quests = await service.generate_quests(user_data, count)
+    async with session_factory() as db:
+        await save_quests(db, user_id, quests, "mock")
+    results["batch"] = (time.perf_counter() - started, server.requests, server.prompt_tokens, server.completion_tokens)
+
+    await service.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.3, help="задержка модели на запрос, сек")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="задержка модели на токен ответа, сек")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        user = models.Player(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        db.close()
+        engine.dispose()
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/bench.db")
+        session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+        with MockModelServer(delay=args.delay, token_delay=args.token_delay) as server:
+            results = asyncio.run(run(args.count, server, session_factory, user_id))
+        asyncio.run(async_engine.dispose())
+
+    print(f"{args.count} quests, model delay {args.delay}s + {args.token_delay * 1000:.1f}ms/token")
+    print(f"{'mode':<8}{'latency, s':>12}{'calls':>8}{'prompt tok':>12}{'output tok':>12}")
+    for mode, (elapsed, calls, prompt_tokens, completion_tokens) in results.items():
+        print(f"{mode:<8}{elapsed:>12.3f}{calls:>8}{prompt_tokens:>12}{completion_tokens:>12}")
+    single, batch = results["single"], results["batch"]
+    print(f"latency x{single[0] / batch[0]:.1f} faster, "
+          f"{single[2] + single[3] - batch[2] - batch[3]} tokens saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Бенчмарк: время страницы истории задач на первой и глубокой странице — keyset против OFFSET.
+
+Игрок с 1M задач (плюс задачи других игроков) во временной SQLite. keyset — реальный
+GET /users/me/tasks с курсором, offset — тот же запрос с OFFSET вместо курсора.
+Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_history_pages --tasks 1000000 --pages 1,100,10000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+import httpx
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.database.db import get_db, get_read_db
+from backend.app.routers.history import encode_cursor
+from backend.app.security import create_access_token
+from backend.benchmarks.bench_login_storm import percentile
+from backend.main import app
+
+
+def fill(engine, tasks: int, others: int) -> int:
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    players = [models.Player(username=f"history{i}", email=f"history{i}@example.com", hashed_password="x")
+               for i in range(2)]
+    db.add_all(players)
+    db.commit()
+    user_id, other_id = players[0].id, players[1].id
+    db.close()
+
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        for offset in range(0, tasks + others, 50_000):
+            connection.execute(insert(models.Task.__table__), [
+                {"title": f"Задача {n}", "user_id": user_id if n < tasks else other_id, "points": 10,
+                 "is_completed": n % 3 == 0, "created_at": start + timedelta(seconds=n // 2)}
+                for n in range(offset, min(offset + 50_000, tasks + others))
+            ])
+    return user_id
+
+
+def boundary(engine, user_id: int, position: int):
+    """(created_at, id) последней задачи перед страницей — курсор на неё"""
+    with engine.connect() as connection:
+        return connection.execute(
+            select(models.Task.created_at, models.Task.id).where(models.Task.user_id == user_id)
+            .order_by(models.Task.created_at.desc(), models.Task.id.desc()).offset(position - 1).limit(1)
+        ).one()
+
+
+async def measure(database_url: str, user_id: int, cursors: dict, limit: int, repeats: int) -> dict:
+    async_engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'history0'})}"}
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for page, cursor in cursors.items():
+            params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+            keyset = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                response = await client.get("/users/me/tasks", headers=headers, params=params)
+                keyset.append(time.perf_counter() - started)
+                assert response.status_code == 200 and len(response.json()["items"]) == limit
+
+            offset = []
+            query = (select(models.Task).where(models.Task.user_id == user_id)
+                     .order_by(models.Task.created_at.desc(), models.Task.id.desc())
+                     .offset((page - 1) * limit).limit(limit + 1))
+            for _ in range(repeats):
+                started = time.perf_counter()
+                async with session_factory() as db:
+                    (await db.execute(query)).scalars().all()
+                offset.append(time.perf_counter() - started)
+            results[page] = (keyset, offset)
+    await async_engine.dispose()
+    app.dependency_overrides.clear()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=1_000_000, help="задач у игрока")
+    parser.add_argument("--others", type=int, default=200_000, help="задач у другого игрока")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--pages", default="1,100,10000")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    pages = [int(p) for p in args.pages.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        started = time.perf_counter()
+        user_id = fill(engine, args.tasks, args.others)
+        print(f"filled {args.tasks + args.others} tasks in {time.perf_counter() - started:.0f}s")
+        cursors = {page: encode_cursor(*boundary(engine, user_id, (page - 1) * args.limit)) if page > 1 else None
+                   for page in pages}
+        engine.dispose()
+        results = asyncio.run(measure(f"sqlite+aiosqlite:///{tmp}/bench.db", user_id, cursors,
+                                      args.limit, args.repeats))
+
+    print(f"{args.tasks} tasks, page size {args.limit}, {args.repeats} requests per page, {os.cpu_count()} CPU")
+    print(f"{'page':>7}{'keyset p50, ms':>16}{'p99':>8}{'offset p50, ms':>16}{'p99':>8}")
+    for page, (keyset, offset) in results.items():
+        print(f"{page:>7}{percentile(keyset, 0.5) * 1000:>16.2f}{percentile(keyset, 0.99) * 1000:>8.2f}"
+              f"{percentile(offset, 0.5) * 1000:>16.2f}{percentile(offset, 0.99) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Бенчмарк рейтинга: операции Leaderboard на 1M и 10M игроков и ранг через SQL для сравнения.
+
+memory — Board в памяти: построение, обновление опыта, ранг игрока, топ-10, соседи,
+         запись и загрузка снимка.
+sql    — ранг одним запросом count(*) WHERE experience > :xp по временной SQLite
+         (--sql-players игроков; индекса по опыту нет — полный проход таблицы)
+         и полная пересборка рейтинга из той же базы.
+Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_leaderboard --players 1000000,10000000 --sql-players 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.services.leaderboard import Board, Leaderboard
+from backend.benchmarks.bench_login_storm import percentile
+
+
+def timed(fn, repeats: int) -> list:
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def row(name: str, latencies: list):
+    print(f"  {name:<12}{percentile(latencies, 0.5) * 1e6:>12.1f}{percentile(latencies, 0.99) * 1e6:>12.1f}")
+
+
+def bench_memory(players: int, repeats: int, tmp: str):
+    rng = random.Random(players)
+    started = time.perf_counter()
+    leaderboard = Leaderboard(None, snapshot_path=os.path.join(tmp, "leaderboard.snapshot"))
+    leaderboard.boards[""] = board = Board.from_scores((i, rng.randrange(10 ** 7)) for i in range(1, players + 1))
+    leaderboard.loaded, leaderboard.max_player_id = True, players
+    print(f"{players} players: build {time.perf_counter() - started:.1f}s")
+    print(f"  {'operation':<12}{'p50, us':>12}{'p99, us':>12}")
+
+    row("update", timed(lambda: board.add(rng.randrange(1, players + 1), rng.randrange(1, 500)), repeats))
+    row("rank", timed(lambda: board.rank(rng.randrange(1, players + 1)), repeats))
+    row("top-10", timed(lambda: board.page(0, 10), repeats))
+    row("neighbours", timed(lambda: board.around(rng.randrange(1, players + 1), 5), repeats))
+
+    started = time.perf_counter()
+    asyncio.run(leaderboard.save_snapshot())
+    written = time.perf_counter() - started
+    started = time.perf_counter()
+    restored = Leaderboard(None, snapshot_path=leaderboard.snapshot_path)
+    restored._apply_snapshot(restored._read_snapshot())
+    loaded = time.perf_counter() - started
+    probe = rng.randrange(1, players + 1)
+    assert restored.board().rank(probe) == board.rank(probe)
+    print(f"  snapshot: write {written:.2f}s, load {loaded:.2f}s, "
+          f"{os.path.getsize(leaderboard.snapshot_path) / 2 ** 20:.0f} MiB")
+
+
+def bench_sql(players: int, repeats: int, tmp: str):
+    engine = create_engine(f"sqlite:///{tmp}/bench.db")
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(1)
+    with engine.begin() as connection:
+        for offset in range(0, players, 100_000):
+            connection.execute(insert(models.Player.__table__), [
+                {"username": f"lb{n}", "email": f"lb{n}@example.com", "hashed_password": "x",
+                 "experience": rng.randrange(10 ** 7), "level": 1}
+                for n in range(offset, min(offset + 100_000, players))
+            ])
+
+    with engine.connect() as connection:
+        rank = timed(lambda: connection.scalar(
+            select(func.count()).select_from(models.Player)
+            .where(models.Player.experience > rng.randrange(10 ** 7))), max(repeats // 100, 5))
+    started = time.perf_counter()
+    asyncio.run(Leaderboard(sessionmaker(bind=engine)).rebuild())
+    print(f"{players} players in SQLite: rebuild from database {time.perf_counter() - started:.1f}s")
+    print(f"  {'operation':<12}{'p50, us':>12}{'p99, us':>12}")
+    row("sql rank", rank)
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", default="1000000,10000000")
+    parser.add_argument("--sql-players", type=int, default=1_000_000, help="0 — без сравнения с SQL")
+    parser.add_argument("--repeats", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU")
+    with tempfile.TemporaryDirectory() as tmp:
+        for players in (int(p) for p in args.players.split(",")):
+            bench_memory(players, args.repeats, tmp)
+        if args.sql_players:
+            bench_sql(args.sql_players, args.repeats, tmp)
+
+
+if __name__ == "__main__":
+    main()
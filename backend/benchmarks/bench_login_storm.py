@@ -0,0 +1,157 @@
+"""Бенчмарк: шторм логинов против bcrypt в threadpool и в пуле процессов.
+
+Поднимает приложение в отдельном процессе uvicorn (временная SQLite), бьёт
+/lg/login с заданной параллельностью и параллельно замеряет задержку GET /.
+Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_login_storm --logins 100 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Tuple
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.security import get_password_hash
+
+PASSWORD = "password123"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def create_users(database_url: str, count: int):
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    hashed = get_password_hash(PASSWORD)  # одна соль на всех — bcrypt всё равно проверяет каждый раз
+    db.add_all([models.Player(username=f"storm{i}", email=f"storm{i}@example.com", hashed_password=hashed)
+                for i in range(count)])
+    db.commit()
+    db.close()
+    engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str, use_processes: bool, workers: int) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "QUEST_POOL_ENABLED": "false",
+        "RATE_LIMIT_ENABLED": "false",  # шторм с одного IP иначе упрётся в лимит
+        "PASSWORD_HASH_PROCESSES": str(use_processes).lower(),
+        "PASSWORD_HASH_WORKERS": str(workers),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/").status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("App server did not start")
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.02)
+
+
+async def storm(url: str, users: int, logins: int, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        # Прогрев: процессы пула стартуют лениво
+        await asyncio.gather(*[client.post("/lg/login", data={"username": f"storm{i % users}", "password": PASSWORD})
+                               for i in range(concurrency)])
+
+        idle = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, idle))
+        await asyncio.sleep(1.0)
+        stop.set()
+        await prober
+
+        semaphore = asyncio.Semaphore(concurrency)
+        failures = 0
+
+        async def login(i):
+            nonlocal failures
+            async with semaphore:
+                response = await client.post("/lg/login", data={"username": f"storm{i % users}", "password": PASSWORD})
+                failures += response.status_code != 200
+
+        loaded = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, loaded))
+        started = time.perf_counter()
+        await asyncio.gather(*[login(i) for i in range(logins)])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    return {"elapsed": elapsed, "failures": failures, "idle": idle, "loaded": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процессов в пуле bcrypt")
+    parser.add_argument("--modes", default="thread,process")
+    args = parser.parse_args()
+
+    cores = min(args.workers, os.cpu_count() or 1)
+    print(f"{args.logins} logins, concurrency {args.concurrency}, {os.cpu_count()} CPU, pool of {args.workers}")
+    print(f"{'mode':<9}{'logins/s':>10}{'per core':>10}{'fails':>7}"
+          f"{'/ p50 idle':>12}{'/ p50 storm':>13}{'/ p99 storm':>13}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{tmp}/bench.db"
+        create_users(database_url, args.concurrency)
+
+        for mode in args.modes.split(","):
+            process, url = start_server(database_url, mode == "process", args.workers)
+            try:
+                result = asyncio.run(storm(url, args.concurrency, args.logins, args.concurrency))
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+
+            throughput = args.logins / result["elapsed"]
+            print(f"{mode:<9}{throughput:>10.1f}{throughput / cores:>10.1f}{result['failures']:>7}"
+                  f"{percentile(result['idle'], 0.5) * 1000:>10.1f}ms"
+                  f"{percentile(result['loaded'], 0.5) * 1000:>11.1f}ms"
+                  f"{percentile(result['loaded'], 0.99) * 1000:>11.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Бенчмарк: авторизованные запросы с кэшем игроков и без него.
+
+GET /ai/users/me/ai-settings через ASGI-транспорт, временная SQLite; считаем
+SQL-запросы к players на запрос и задержку. Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_principal_cache --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+import httpx
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.database.db import get_db
+from backend.app.security import create_access_token, principal_cache
+from backend.main import app
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(requests: int, headers: dict) -> list:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = await client.get("/ai/users/me/ai-settings", headers=headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        db = session_factory()
+        db.add(models.Player(username="bench", email="bench@example.com", hashed_password="x"))
+        db.commit()
+        db.close()
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/bench.db")
+        async_session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+        async def override_get_db():
+            async with async_session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        queries = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *a: queries.append(statement) if "FROM players" in statement else None)
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench'})}"}
+
+        results = {}
+        for mode, enabled in (("no cache", False), ("cache", True)):
+            principal_cache.enabled = enabled
+            principal_cache.clear()
+            asyncio.run(run(50, headers))  # прогрев
+            queries.clear()
+            latencies = asyncio.run(run(args.requests, headers))
+            results[mode] = (len(queries) / args.requests, latencies)
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+    print(f"{args.requests} x GET /ai/users/me/ai-settings")
+    print(f"{'mode':<10}{'player q/req':>14}{'mean, ms':>10}{'p50, ms':>10}{'p99, ms':>10}")
+    for mode, (per_request, latencies) in results.items():
+        print(f"{mode:<10}{per_request:>14.3f}{sum(latencies) / len(latencies) * 1000:>10.3f}"
+              f"{percentile(latencies, 0.5) * 1000:>10.3f}{percentile(latencies, 0.99) * 1000:>10.3f}")
+    saved = results["no cache"][0] - results["cache"][0]
+    print(f"{saved:.3f} player queries saved per request")
+
+
+if __name__ == "__main__":
+    main()
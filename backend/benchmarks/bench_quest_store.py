@@ -0,0 +1,121 @@
+"""Бенчмарк: сохранение квестов с задачами — прежняя схема против quest_store.
+
+legacy — как было в generate_ai_quest: commit квеста, затем задачи по одной и второй commit.
+orm    — один unit of work ORM (квест с relationship tasks, flush, commit).
+store  — quest_store.save_quests: два INSERT ... RETURNING на всю пачку в одной транзакции.
+База — временная SQLite через aiosqlite. Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_quest_store --calls 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.services.quest_store import save_quests
+from backend.benchmarks.bench_login_storm import percentile
+
+
+def make_quest(n: int, steps: int) -> dict:
+    return {
+        "title": f"Квест {n}", "description": "Описание квеста", "estimated_time": "1 час",
+        "difficulty": "medium", "category": "health",
+        "steps": [{"title": f"Шаг {i}", "description": "Сделать шаг", "points": 10, "estimated_time": "10 минут"}
+                  for i in range(steps)],
+    }
+
+
+async def save_legacy(db, user_id: int, quests: list, ai_model: str):
+    for quest in quests:
+        db_quest = models.GeneratedQuest(
+            title=quest["title"], description=quest["description"], steps=quest["steps"],
+            estimated_time=quest["estimated_time"], difficulty=quest["difficulty"], category=quest["category"],
+            ai_generated=True, ai_model=ai_model, user_id=user_id,
+        )
+        db.add(db_quest)
+        await db.commit()
+        await db.refresh(db_quest)
+        for step in quest["steps"]:
+            db.add(models.Task(title=step["title"], description=step["description"], points=step["points"],
+                               user_id=user_id, quest_id=db_quest.id))
+            await db.flush()
+        await db.commit()
+
+
+async def save_orm(db, user_id: int, quests: list, ai_model: str):
+    db_quests = [
+        models.GeneratedQuest(
+            title=quest["title"], description=quest["description"], steps=quest["steps"],
+            estimated_time=quest["estimated_time"], difficulty=quest["difficulty"], category=quest["category"],
+            ai_generated=True, ai_model=ai_model, user_id=user_id,
+            tasks=[models.Task(title=step["title"], description=step["description"], points=step["points"],
+                               user_id=user_id) for step in quest["steps"]],
+        )
+        for quest in quests
+    ]
+    db.add_all(db_quests)
+    await db.flush()
+    await db.commit()
+
+
+async def run(session_factory, user_id: int, per_call: int, calls: int, steps: int, save) -> list:
+    quests = [make_quest(n, steps) for n in range(per_call)]
+    latencies = []
+    for _ in range(calls):
+        async with session_factory() as db:
+            started = time.perf_counter()
+            await save(db, user_id, quests, "bench")
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20, help="вызовов на каждый размер пачки")
+    parser.add_argument("--steps", type=int, default=5, help="шагов (задач) в квесте")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        user = models.Player(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        db.close()
+        engine.dispose()
+
+        asyncio.run(bench(f"sqlite+aiosqlite:///{tmp}/bench.db", user_id, args.calls, args.steps))
+
+
+async def bench(database_url: str, user_id: int, calls: int, steps: int):
+    modes = {"legacy": save_legacy, "orm": save_orm, "store": save_quests}
+    async_engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+    print(f"{steps} tasks per quest, {calls} calls per size, {os.cpu_count()} CPU")
+    print(f"{'quests':>6} {'mode':<7}{'p50, ms':>10}{'p99, ms':>10}{'rows/s':>10}{'stmts/call':>12}")
+    for per_call in (1, 10, 100):
+        for mode, save in modes.items():
+            statements.clear()
+            latencies = await run(session_factory, user_id, per_call, calls, steps, save)
+            rows = per_call * (1 + steps) * calls
+            print(f"{per_call:>6} {mode:<7}{percentile(latencies, 0.5) * 1000:>10.2f}"
+                  f"{percentile(latencies, 0.99) * 1000:>10.2f}{rows / sum(latencies):>10.0f}"
+                  f"{len(statements) / calls:>12.0f}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
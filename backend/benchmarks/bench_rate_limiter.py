@@ -0,0 +1,83 @@
+"""Бенчмарк: накладные расходы RateLimitMiddleware на запрос.
+
+Middleware вызывается напрямую с пустым ASGI-приложением внутри, без сети и
+роутинга — так видна только его собственная цена. Сравниваем с вызовом того же
+приложения без middleware. Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_rate_limiter --requests 100000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+from backend.app.services.kv_store import MemoryStore
+from backend.app.services.rate_limiter import (LocalBuckets, RateLimiter, RateLimitMiddleware, StoreBuckets,
+                                               parse_rate_limits)
+
+RULES = "/lg/login ip=1000000/60 account=1000000/60"
+
+
+async def inner_app(scope, receive, send):
+    await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def make_scope(path: str, i: int) -> dict:
+    return {
+        "type": "http", "method": "POST", "path": path,
+        "client": (f"10.0.{i // 256 % 256}.{i % 256}", 40000),
+        "headers": [(b"content-type", b"application/x-www-form-urlencoded")],
+    }
+
+
+async def measure(handler, path: str, requests: int, keys: int) -> float:
+    scopes = [make_scope(path, i) for i in range(keys)]
+    bodies = [f"username=user{i}&password=password123".encode() for i in range(keys)]
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for n in range(requests):
+        body = bodies[n % keys]
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await handler(scopes[n % keys], receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--keys", type=int, default=10_000)
+    args = parser.parse_args()
+
+    local = RateLimitMiddleware(inner_app, RateLimiter(parse_rate_limits(RULES), LocalBuckets()))
+    shared = RateLimitMiddleware(inner_app, RateLimiter(parse_rate_limits(RULES), StoreBuckets(MemoryStore())))
+    cases = [
+        ("no middleware", inner_app, "/lg/login"),
+        ("unlimited path", local, "/"),
+        ("ip+account, local", local, "/lg/login"),
+        ("ip+account, shared", shared, "/lg/login"),
+    ]
+
+    results = {}
+    for name, handler, path in cases:
+        asyncio.run(measure(handler, path, 1000, args.keys))  # прогрев
+        results[name] = asyncio.run(measure(handler, path, args.requests, args.keys))
+
+    baseline = results["no middleware"]
+    print(f"{args.requests} requests over {args.keys} distinct IPs/accounts")
+    print(f"{'case':<22}{'us/request':>12}{'overhead, us':>14}")
+    for name, per_request in results.items():
+        print(f"{name:<22}{per_request:>12.2f}{per_request - baseline:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
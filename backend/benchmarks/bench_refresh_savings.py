@@ -0,0 +1,102 @@
+"""Бенчмарк: сколько bcrypt-операций на активного пользователя в день убирает /lg/refresh.
+
+Моделируем рабочий день: access-токен живёт ACCESS_TOKEN_EXPIRE_MINUTES, клиент
+продлевает его либо повторным /lg/login (bcrypt), либо /lg/refresh. bcrypt-вызовы
+считаются по метрике password_hash_total{op="verify"}. Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_refresh_savings --users 3 --active-hours 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")  # повторные входы с одного IP
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.database.db import get_db
+from backend.app.security import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, get_password_hash
+from backend.app.utils.metrics import metrics
+from backend.main import app
+
+PASSWORD = "password123"
+
+
+async def simulate_day(strategy: str, users: int, renewals: int) -> dict:
+    verifies_before = metrics.counter("password_hash_total", op="verify")
+    renew_latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for i in range(users):
+            credentials = {"username": f"user{i}", "password": PASSWORD}
+            tokens = (await client.post("/lg/login", data=credentials)).json()
+            for _ in range(renewals):
+                started = time.perf_counter()
+                if strategy == "relogin":
+                    response = await client.post("/lg/login", data=credentials)
+                else:
+                    response = await client.post("/lg/refresh", json={"refresh_token": tokens["refresh_token"]})
+                renew_latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+                tokens = response.json()
+
+    return {
+        "verifies": metrics.counter("password_hash_total", op="verify") - verifies_before,
+        "renew_ms": sum(renew_latencies) / len(renew_latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--active-hours", type=float, default=8.0)
+    args = parser.parse_args()
+
+    renewals = int(args.active_hours * 60 / ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        db = session_factory()
+        hashed = get_password_hash(PASSWORD)
+        db.add_all([models.Player(username=f"user{i}", email=f"user{i}@example.com", hashed_password=hashed)
+                    for i in range(args.users)])
+        db.commit()
+        db.close()
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/bench.db")
+        async_session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+        async def override_get_db():
+            async with async_session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        results = {strategy: asyncio.run(simulate_day(strategy, args.users, renewals))
+                   for strategy in ("relogin", "refresh")}
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+    print(f"{args.users} users, {args.active_hours}h active/day, access token {ACCESS_TOKEN_EXPIRE_MINUTES} min "
+          f"-> {renewals} renewals/user/day")
+    print(f"{'strategy':<10}{'bcrypt/user/day':>17}{'renew, ms':>11}")
+    for strategy, result in results.items():
+        print(f"{strategy:<10}{result['verifies'] / args.users:>17.2f}{result['renew_ms']:>11.2f}")
+
+    # При refresh bcrypt нужен только на вход, а вход — раз в срок жизни refresh-токена
+    relogin = results["relogin"]["verifies"] / args.users
+    amortized = 1 / REFRESH_TOKEN_EXPIRE_DAYS
+    print(f"refresh with one login per {REFRESH_TOKEN_EXPIRE_DAYS}-day refresh lifetime: "
+          f"{amortized:.2f} bcrypt/user/day, {relogin - amortized:.2f} removed ({1 - amortized / relogin:.1%})")
+
+
+if __name__ == "__main__":
+    main()
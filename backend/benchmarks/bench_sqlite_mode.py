@@ -0,0 +1,96 @@
+"""Бенчмарк: параллельные регистрации и сохранения квестов в SQLite — текущая схема против режима SQLite.
+
+default — как было: пул соединений, режим журнала и synchronous по умолчанию (DELETE/FULL);
+          параллельные транзакции ждут блокировку и после busy timeout падают "database is locked".
+wal     — только pragmas (WAL, synchronous=NORMAL, кэш, mmap), запись по-прежнему из пула.
+writer  — pragmas и единственный писатель с групповым commit (write_session).
+Пишущая часть register_user (create_player с готовым хэшем — bcrypt не меряем) и
+generate_ai_quest (save_quests квеста с 5 задачами). Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_sqlite_mode --requests 2000 --concurrency 1,16,64
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.app.config import settings
+from backend.app.database import models, schemas
+from backend.app.database.db import engine_options, tune_sqlite, write_session
+from backend.app.database.sqlite import SQLiteWriter
+from backend.app.routers.auth import create_player
+from backend.app.services.quest_store import save_quests
+from backend.benchmarks.bench_quest_store import make_quest
+
+MODES = {"default": (False, False), "wal": (True, False), "writer": (True, True)}
+
+
+async def run(url: str, mode: str, operation: str, requests: int, concurrency: int, counter) -> tuple:
+    pragmas, queue = MODES[mode]
+    settings.SQLITE_WRITE_QUEUE = queue
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{url}", **engine_options(f"sqlite:///{url}", "primary",
+                                                                                      is_async=True))
+    if pragmas:
+        tune_sqlite(async_engine)
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+    quest = make_quest(0, 5)
+    in_flight = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with in_flight, session_factory() as db:
+            n = next(counter)
+            try:
+                async with write_session(db) as write_db:
+                    if operation == "register":
+                        user = schemas.PlayerCreate(username=f"u{n}", email=f"u{n}@example.com", password="password123")
+                        await create_player(write_db, user, "hash")
+                    else:
+                        await save_quests(write_db, 1, [quest], "bench")
+            except OperationalError:
+                errors += 1  # database is locked
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    await SQLiteWriter.close_all()
+    await async_engine.dispose()
+    return (requests - errors) / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000, help="операций на каждый прогон")
+    parser.add_argument("--concurrency", default="1,16,64")
+    args = parser.parse_args()
+    counter = itertools.count()
+
+    print(f"{args.requests} operations per run, {os.cpu_count()} CPU")
+    print(f"{'operation':<10}{'concurrency':>12} {'mode':<8}{'ops/s':>8}{'locked':>8}")
+    for operation in ("register", "quest"):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            for mode in MODES:
+                # Свежая база на каждый прогон: режим журнала хранится в файле
+                with tempfile.TemporaryDirectory() as tmp:
+                    engine = create_engine(f"sqlite:///{tmp}/bench.db")
+                    models.Base.metadata.create_all(bind=engine)
+                    with engine.begin() as connection:
+                        connection.execute(models.Player.__table__.insert().values(
+                            username="owner", email="owner@example.com", hashed_password="x"))
+                    engine.dispose()
+                    rate, errors = asyncio.run(run(f"{tmp}/bench.db", mode, operation, args.requests,
+                                                   concurrency, counter))
+                print(f"{operation:<10}{concurrency:>12} {mode:<8}{rate:>8.0f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Бенчмарк: /users/me/stats из дневных сводок против подсчёта по tasks — в зависимости от размера истории.
+
+rollup — реальный GET /users/me/stats (30 дней) по сводкам, заполненным StatsBackfill.
+scan   — те же числа запросом к tasks: группировка по дню и категории за окно
+         по completed_at плюс полный проход истории игрока для лучшей серии.
+Игроки с историей разного размера во временной SQLite. Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_stats --history 1000,100000,1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, UTC
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+import httpx
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.database.db import get_db, get_read_db
+from backend.app.security import create_access_token
+from backend.app.services.stats import StatsBackfill
+from backend.benchmarks.bench_login_storm import percentile
+from backend.main import app
+
+CATEGORIES = ["health", "career", "learning", None]
+
+
+def fill(engine, sizes: list) -> dict:
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    players = [models.Player(username=f"stats{size}", email=f"stats{size}@example.com", hashed_password="x")
+               for size in sizes]
+    db.add_all(players)
+    db.flush()
+    quests = {}
+    for player in players:
+        for category in CATEGORIES[:-1]:
+            quest = models.GeneratedQuest(title="Квест", description="", category=category, user_id=player.id)
+            db.add(quest)
+            db.flush()
+            quests[(player.id, category)] = quest.id
+    db.commit()
+    ids = {size: player.id for size, player in zip(sizes, players)}
+    db.close()
+
+    rng = random.Random(5)
+    now = datetime.now(UTC).replace(tzinfo=None)
+    with engine.begin() as connection:
+        for size, user_id in ids.items():
+            span = max(size // 20, 60)  # ~20 задач в день, не меньше двух месяцев истории
+            for offset in range(0, size, 50_000):
+                rows = []
+                for n in range(offset, min(offset + 50_000, size)):
+                    category = rng.choice(CATEGORIES)
+                    completed_at = now - timedelta(days=span * n / size, minutes=rng.randrange(600))
+                    rows.append({"title": "Задача", "user_id": user_id, "points": rng.randrange(5, 50),
+                                 "quest_id": quests[(user_id, category)] if category else None,
+                                 "is_completed": True, "completed_at": completed_at, "created_at": completed_at})
+                connection.execute(insert(models.Task.__table__), rows)
+    return ids
+
+
+async def scan(db, user_id: int, since: datetime):
+    day = func.date(models.Task.completed_at)
+    window = (await db.execute(
+        select(day, models.GeneratedQuest.category, func.count(), func.sum(models.Task.points))
+        .outerjoin(models.GeneratedQuest, models.GeneratedQuest.id == models.Task.quest_id)
+        .where(models.Task.user_id == user_id, models.Task.is_completed.is_(True), models.Task.completed_at >= since)
+        .group_by(day, models.GeneratedQuest.category)
+    )).all()
+    days = (await db.execute(select(day).distinct().where(models.Task.user_id == user_id,
+                                                           models.Task.is_completed.is_(True)))).all()
+    return window, days
+
+
+async def measure(database_url: str, ids: dict, repeats: int) -> dict:
+    async_engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for size, user_id in ids.items():
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': f'stats{size}'})}"}
+            rollup = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                response = await client.get("/users/me/stats", headers=headers, params={"days": 30})
+                rollup.append(time.perf_counter() - started)
+                assert response.status_code == 200
+            naive = []
+            since = datetime.now(UTC) - timedelta(days=30)
+            for _ in range(repeats):
+                started = time.perf_counter()
+                async with session_factory() as db:
+                    await scan(db, user_id, since)
+                naive.append(time.perf_counter() - started)
+            results[size] = (rollup, naive)
+    await async_engine.dispose()
+    app.dependency_overrides.clear()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", default="1000,100000,1000000", help="выполненных задач у игроков")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.history.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        started = time.perf_counter()
+        ids = fill(engine, sizes)
+        print(f"filled {sum(sizes)} tasks in {time.perf_counter() - started:.0f}s")
+
+        backfill = StatsBackfill(sessionmaker(bind=engine), chunk_size=10_000)
+        backfill.prepare()
+        started = time.perf_counter()
+        total = backfill.run()
+        elapsed = time.perf_counter() - started
+        print(f"backfill: {total} tasks in {elapsed:.1f}s, {total / elapsed:.0f} tasks/s")
+        engine.dispose()
+        results = asyncio.run(measure(f"sqlite+aiosqlite:///{tmp}/bench.db", ids, args.repeats))
+
+    print(f"/users/me/stats, 30 days, {args.repeats} requests per player, {os.cpu_count()} CPU")
+    print(f"{'history':>9}{'rollup p50, ms':>16}{'p99':>8}{'scan p50, ms':>14}{'p99':>8}")
+    for size, (rollup, naive) in results.items():
+        print(f"{size:>9}{percentile(rollup, 0.5) * 1000:>16.2f}{percentile(rollup, 0.99) * 1000:>8.2f}"
+              f"{percentile(naive, 0.5) * 1000:>14.2f}{percentile(naive, 0.99) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Бенчмарк: выполнения задач в секунду — опыт прямо в players против журнала XPBuffer.
+
+direct   — complete_tasks без буфера: UPDATE горячей строки игрока в каждой транзакции.
+buffered — complete_tasks с XPBuffer: строка в xp_journal, перенос в players пачками
+           фоновым flush; в общее время входит и последний перенос.
+Все выполнения приходятся на несколько «горячих» игроков. База — временная SQLite.
+Запуск из корня репозитория:
+
+    python -m backend.benchmarks.bench_xp_buffer --completions 4000 --players 4 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.services.progression import complete_tasks
+from backend.app.services.xp_buffer import XPBuffer
+from backend.benchmarks.bench_login_storm import percentile
+
+
+def fill(engine, players: int, completions: int) -> dict:
+    """Игроки и по completions задач на каждый режим; возвращает {режим: [(игрок, задача)]}"""
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    rows = [models.Player(username=f"xp{i}", email=f"xp{i}@example.com", hashed_password="x")
+            for i in range(players * 2)]
+    db.add_all(rows)
+    db.commit()
+    ids = [player.id for player in rows]
+    db.close()
+
+    plan = {}
+    with engine.begin() as connection:
+        for n, mode in enumerate(("direct", "buffered")):
+            owners = ids[n * players:(n + 1) * players]
+            task_ids = connection.execute(insert(models.Task.__table__).returning(models.Task.id), [
+                {"title": f"Задача {i}", "user_id": owners[i % players], "points": 10 + i % 50}
+                for i in range(completions)
+            ]).scalars().all()
+            plan[mode] = [(owners[i % players], task_id) for i, task_id in enumerate(sorted(task_ids))]
+    return plan
+
+
+async def run(session_factory, plan: list, concurrency: int, buffer) -> list:
+    in_flight = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def complete(user_id: int, task_id: int):
+        async with in_flight, session_factory() as db:
+            started = time.perf_counter()
+            await complete_tasks(db, user_id, [task_id], buffer)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(complete(user_id, task_id) for user_id, task_id in plan))
+    return latencies
+
+
+def experience(engine, plan: list) -> int:
+    with engine.connect() as connection:
+        owners = sorted({user_id for user_id, _ in plan})
+        return sum(connection.scalars(select(models.Player.experience).where(models.Player.id.in_(owners))))
+
+
+async def bench(engine, database_url: str, plan: dict, concurrency: int, interval: float):
+    async_engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+    buffer = XPBuffer(sessionmaker(bind=engine), flush_interval=interval)
+
+    print(f"{len(plan['direct'])} completions, concurrency {concurrency}, flush every {interval}s, "
+          f"{os.cpu_count()} CPU")
+    print(f"{'mode':<10}{'completions/s':>15}{'p50, ms':>10}{'p99, ms':>10}{'experience':>12}")
+    for mode in ("direct", "buffered"):
+        if mode == "buffered":
+            buffer.start()
+        started = time.perf_counter()
+        latencies = await run(session_factory, plan[mode], concurrency, buffer if mode == "buffered" else None)
+        if mode == "buffered":
+            await buffer.stop()
+        elapsed = time.perf_counter() - started
+        print(f"{mode:<10}{len(latencies) / elapsed:>15.0f}{percentile(latencies, 0.5) * 1000:>10.2f}"
+              f"{percentile(latencies, 0.99) * 1000:>10.2f}{experience(engine, plan[mode]):>12}")
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--completions", type=int, default=4000, help="выполнений задач на режим")
+    parser.add_argument("--players", type=int, default=4, help="горячих игроков")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=0.5, help="XP_FLUSH_INTERVAL, сек")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db", connect_args={"timeout": 30})
+        plan = fill(engine, args.players, args.completions)
+        asyncio.run(bench(engine, f"sqlite+aiosqlite:///{tmp}/bench.db?timeout=30", plan,
+                          args.concurrency, args.interval))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
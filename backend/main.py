@@ -3,10 +3,19 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from backend.app.config import settings
 from backend.app.database.db import init_db, engine, Base
-from backend.app.routers.ai_routers import ai_router
-from backend.app.routers.auth import  auth_router
-from backend.app.routers.login import lg_router
+from backend.app.database.sqlite import SQLiteWriter
+from backend.app.routers.ai_routers import ai_router, ai_service, quest_pool
+from backend.app.routers.auth import  auth_router, mail_sender
+from backend.app.routers.history import history_router
+from backend.app.routers.leaderboard import leaderboard_router, leaderboard
+from backend.app.routers.login import lg_router, rate_limiter
+from backend.app.routers.stats import stats_router, stats_backfill
+from backend.app.routers.tasks import tasks_router, xp_buffer
+from backend.app.security import password_hasher
+from backend.app.services.rate_limiter import RateLimitMiddleware
+from backend.app.utils.metrics import metrics
 
 
 @asynccontextmanager
@@ -20,10 +29,31 @@ async def lifespan(app: FastAPI):
         print(f" Database initialization failed: {e}")
         print("  Continuing without database initialization...")
 
+    password_hasher.start()
+    if settings.STATS_BACKFILL_ENABLED:
+        try:
+            stats_backfill.start()
+        except Exception as e:
+            print(f" Stats backfill not started: {e}")
+    if settings.QUEST_POOL_ENABLED:
+        quest_pool.start()
+    if settings.MAIL_SENDER_ENABLED:
+        mail_sender.start()
+    xp_buffer.start()  # и при выключенном буфере: дольёт журнал, оставшийся с прошлых запусков
+    leaderboard.start()
+
     yield
 
     # Shutdown
     print("🔴 Shutting down...")
+    await quest_pool.stop()
+    await mail_sender.stop()
+    await xp_buffer.stop()
+    await leaderboard.stop()
+    await stats_backfill.stop()
+    await SQLiteWriter.close_all()
+    await ai_service.aclose()
+    password_hasher.shutdown()
 
 
 
@@ -34,6 +64,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# --- Rate limiting ---
+# Добавляется раньше CORS, чтобы 429 тоже уходили с CORS-заголовками
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # --- CORS ---
 app.add_middleware(
     CORSMiddleware,
@@ -47,6 +81,10 @@ app.add_middleware(
 app.include_router(ai_router, prefix="/ai", tags=["AI"])
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
 app.include_router(lg_router, prefix="/lg", tags=["Lg"])
+app.include_router(history_router, tags=["History"])
+app.include_router(tasks_router, tags=["Tasks"])
+app.include_router(leaderboard_router, tags=["Leaderboard"])
+app.include_router(stats_router, tags=["Stats"])
 
 # --- Root ---
 @app.get("/")
@@ -54,5 +92,11 @@ def read_root():
     return {"message": "Welcome to Life Game App!"}
 
 
+# --- Metrics ---
+@app.get("/metrics")
+def read_metrics():
+    return metrics.snapshot()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
@@ -7,7 +7,7 @@ from sqlalchemy.orm import sessionmaker
 from backend.app.database import models
 from backend.app.security import get_password_hash, create_access_token
 from backend.main import app
-from backend.app.database.db import get_db
+from backend.app.database.db import get_db, get_read_db
 from backend.app.database.models import Base
 
 
@@ -42,6 +42,7 @@ def client(db):
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     yield TestClient(app)
 
 @pytest.fixture(scope="function")
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from backend.app.database.db import get_db, get_read_db
+from backend.app.database.models import Base
+from backend.app.database.sqlite import SQLiteWriter
+from backend.app.routers import ai_routers
+from backend.main import app
+
+
+class TemporaryDatabase:
+    """Файл SQLite одного теста: синхронные и асинхронные сессии к нему"""
+
+    def __init__(self, path):
+        self.engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=self.engine)
+        self.async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.AsyncSession = async_sessionmaker(self.async_engine, expire_on_commit=False)
+
+    async def get_db(self):
+        async with self.AsyncSession() as db:
+            yield db
+
+    def dispose(self):
+        self.engine.dispose()
+        asyncio.run(self.async_engine.dispose())
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Своя база на тест; get_db, get_read_db и кэш квестов приложения смотрят в неё"""
+
+    database = TemporaryDatabase(tmp_path / "app.db")
+    app.dependency_overrides[get_db] = database.get_db
+    app.dependency_overrides[get_read_db] = database.get_db
+    cache = ai_routers.ai_service.cache
+    if cache is not None and cache.session_factory is not None:
+        monkeypatch.setattr(cache, "session_factory", database.Session)
+    yield database
+    app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_read_db, None)
+    asyncio.run(SQLiteWriter.close_all())  # писатель этой базы держит свой engine
+    database.dispose()
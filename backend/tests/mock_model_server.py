@@ -0,0 +1,102 @@
+"""Локальный мок OpenAI-совместимой модели для тестов и бенчмарков.
+
+Поднимается через uvicorn в отдельном потоке, отвечает на /v1/chat/completions
+с настраиваемой задержкой и считает, сколько запросов и кусков стрима отдал.
+"""
+import asyncio
+import json
+import re
+import socket
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+QUEST = {
+    "title": "Мок-квест",
+    "description": "Квест от локальной мок-модели",
+    "steps": [
+        {"title": "Шаг 1", "description": "Первый шаг", "points": 10, "estimated_time": "10 минут"},
+        {"title": "Шаг 2", "description": "Второй шаг", "points": 20, "estimated_time": "20 минут"},
+    ],
+    "estimated_time": "30 минут",
+    "difficulty": "easy",
+    "category": "productivity",
+}
+
+
+BATCH_RE = re.compile(r"JSON-массив из (\d+)")
+
+
+class MockModelServer:
+    def __init__(self, delay: float = 0.0, chunk_delay: float = 0.0, content: str = None, chunks: list = None,
+                 token_delay: float = 0.0):
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.token_delay = token_delay  # имитация времени декодирования на каждый токен ответа
+        self.content = content or json.dumps(QUEST, ensure_ascii=False)
+        self.chunks = chunks
+        self.requests = 0
+        self.chunks_sent = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}/v1"
+        app = Starlette(routes=[Route("/v1/chat/completions", self.completions, methods=["POST"])])
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    async def completions(self, request):
+        body = await request.json()
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+
+        if body.get("stream"):
+            return StreamingResponse(self._stream(), media_type="text/event-stream")
+
+        prompt = body["messages"][0]["content"]
+        content = self.content
+        batch = BATCH_RE.search(prompt)
+        if batch:  # пакетный промпт — отвечаем массивом из N квестов
+            quests = [{**QUEST, "title": f"{QUEST['title']} {i + 1}"} for i in range(int(batch.group(1)))]
+            content = json.dumps(quests, ensure_ascii=False)
+
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        await asyncio.sleep(usage["completion_tokens"] * self.token_delay)
+
+        return JSONResponse({
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        })
+
+    async def _stream(self):
+        chunks = self.chunks or [self.content[i:i + 16] for i in range(0, len(self.content), 16)]
+        for chunk in chunks:
+            await asyncio.sleep(self.chunk_delay)
+            self.chunks_sent += 1
+            yield f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Mock model server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,95 @@
+"""Локальный SMTP-сервер для тестов и бенчмарков почты.
+
+Крутится на asyncio в отдельном потоке, понимает EHLO/AUTH PLAIN/MAIL/RCPT/DATA/RSET/QUIT
+и считает соединения, логины и принятые письма. Адресатам из refuse можно
+назначить код отказа (4xx — временный, 5xx — постоянный) на первые N попыток.
+"""
+import asyncio
+import socket
+import threading
+
+
+class SMTPStandIn:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay  # задержка на каждое письмо (имитация медленного relay)
+        self.connections = 0
+        self.logins = 0
+        self.messages = []  # (адресат, текст письма)
+        self.refuse = {}    # адресат -> [код, сколько ещё раз отказать]
+        self.port = _free_port()
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self.thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def refuse_recipient(self, address: str, code: int, times: int = 1):
+        self.refuse[address] = [code, times]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 stand-in ESMTP")
+        recipient = None
+        try:
+            while True:
+                line = (await reader.readline()).decode().rstrip("\r\n")
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command in ("EHLO", "HELO"):
+                    await reply("250-stand-in")
+                    await reply("250 AUTH PLAIN")
+                elif command == "AUTH":
+                    self.logins += 1
+                    await reply("235 Authentication successful")
+                elif command == "MAIL":
+                    recipient = None
+                    await reply("250 OK")
+                elif command == "RCPT":
+                    recipient = line.split(":", 1)[1].strip().strip("<>")
+                    refusal = self.refuse.get(recipient)
+                    if refusal and refusal[1] > 0:
+                        refusal[1] -= 1
+                        await reply(f"{refusal[0]} Recipient refused")
+                    else:
+                        await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = []
+                    while (chunk := await reader.readline()) not in (b".\r\n", b""):
+                        data.append(chunk.decode())
+                    await asyncio.sleep(self.delay)
+                    self.messages.append((recipient, "".join(data)))
+                    await reply("250 Queued")
+                elif command in ("RSET", "NOOP"):
+                    await reply("250 OK")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def __enter__(self):
+        self.thread.start()
+        started = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, "127.0.0.1", self.port), self._loop)
+        self._server = started.result(timeout=10)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.close()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self.thread.join(timeout=5)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
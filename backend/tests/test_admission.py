@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from backend.app.services.admission import AdmissionController, QueueFullError
+from backend.app.utils.metrics import metrics
+
+
+def test_concurrency_limit_and_fifo():
+    controller = AdmissionController(max_concurrency=2, max_queue=10, per_user_fair=False)
+    order, peak = [], [0]
+
+    async def job(i):
+        async with controller.slot():
+            peak[0] = max(peak[0], controller.active)
+            order.append(i)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        tasks = []
+        for i in range(6):
+            tasks.append(asyncio.create_task(job(i)))
+            await asyncio.sleep(0)  # фиксируем порядок постановки в очередь
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert peak[0] == 2
+    assert order == list(range(6))
+    assert controller.active == 0 and controller.queued == 0
+
+
+def test_queue_overflow_is_rejected_with_retry_after():
+    controller = AdmissionController(max_concurrency=1, max_queue=2, initial_service_time=3.0)
+    rejected_before = metrics.counter("ai_admission_rejected_total")
+
+    async def scenario():
+        await controller.acquire("a")
+        waiters = [asyncio.create_task(controller.acquire("a")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError) as excinfo:
+            await controller.acquire("a")
+        for _ in range(3):
+            controller.release()
+        await asyncio.gather(*waiters)
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    # 2 в очереди + новый запрос при одном слоте и 3с на генерацию
+    assert error.retry_after == 9
+    assert metrics.counter("ai_admission_rejected_total") == rejected_before + 1
+
+
+def test_per_user_fairness():
+    controller = AdmissionController(max_concurrency=1, max_queue=10, per_user_fair=True)
+    served = []
+
+    async def job(user):
+        async with controller.slot(user):
+            served.append(user)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await controller.acquire("blocker")
+        tasks = []
+        for user in ["a", "a", "a", "b", "c"]:
+            tasks.append(asyncio.create_task(job(user)))
+            await asyncio.sleep(0)
+        controller.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert served == ["a", "b", "c", "a", "a"]
+
+
+def test_cancelled_waiter_leaves_queue():
+    controller = AdmissionController(max_concurrency=1, max_queue=10)
+
+    async def scenario():
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+        waiter.cancel()
+        await asyncio.sleep(0)
+        assert controller.queued == 0
+        controller.release()
+
+    asyncio.run(scenario())
+    assert controller.active == 0
@@ -0,0 +1,102 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+import pytest
+
+from backend.app.database import models
+from backend.app.routers import ai_routers
+from backend.app.security import create_access_token, get_password_hash
+from backend.app.services.ai_backends import ChatBackend
+from backend.main import app
+from backend.tests.mock_model_server import MockModelServer
+
+GENERATIONS = 50
+MODEL_DELAY = 1.0
+
+
+@pytest.fixture
+def player(database):
+    db = database.Session()
+    suffix = uuid.uuid4().hex[:8]
+    user = models.Player(
+        username=f"load_{suffix}",
+        email=f"load_{suffix}@example.com",
+        hashed_password=get_password_hash("password123"),
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    yield user
+    db.close()
+
+
+@pytest.fixture
+def mock_model():
+    with MockModelServer(delay=MODEL_DELAY) as server:
+        original_client, original_model = ai_routers.ai_service.client, ai_routers.ai_service.default_model
+        ai_routers.ai_service.default_model = "mock-model"
+        yield server
+        ai_routers.ai_service.client, ai_routers.ai_service.default_model = original_client, original_model
+
+
+def p99(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+async def sample_latencies(client, player):
+    root, login = [], []
+    for _ in range(20):
+        start = time.perf_counter()
+        response = await client.get("/")
+        root.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    for _ in range(3):
+        start = time.perf_counter()
+        response = await client.post("/lg/login", data={"username": player.username, "password": "password123"})
+        login.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return p99(root), p99(login)
+
+
+def test_generation_does_not_block_event_loop(mock_model, player):
+    token = create_access_token({"sub": player.username})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def scenario():
+        # httpx-пул привязан к event loop, поэтому создаём бэкенд внутри сценария
+        ai_routers.ai_service.client = ChatBackend(base_url=mock_model.url, timeout=10)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            base_root, base_login = await sample_latencies(client, player)
+
+            started = time.perf_counter()
+            # Разные темы, чтобы кэш не отвечал вместо модели
+            generations = [
+                asyncio.create_task(client.post("/ai/users/me/generate-quest", json={"theme": f"тема {i}"},
+                                                headers=headers))
+                for i in range(GENERATIONS)
+            ]
+            await asyncio.sleep(0.1)  # даём запросам дойти до модели
+            load_root, load_login = await sample_latencies(client, player)
+            responses = await asyncio.gather(*generations)
+            elapsed = time.perf_counter() - started
+
+        await ai_routers.ai_service.aclose()
+        return base_root, base_login, load_root, load_login, responses, elapsed
+
+    base_root, base_login, load_root, load_login, responses, elapsed = asyncio.run(scenario())
+    print(f"\n/ p99: {base_root * 1000:.1f}ms idle, {load_root * 1000:.1f}ms under load; "
+          f"/lg/login p99: {base_login * 1000:.1f}ms idle, {load_login * 1000:.1f}ms under load; "
+          f"{GENERATIONS} generations in {elapsed:.2f}s")
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json()["title"] == "Мок-квест" for r in responses)
+    assert mock_model.requests == GENERATIONS
+    # Генерации идут параллельно, а не по очереди
+    assert elapsed < GENERATIONS * MODEL_DELAY / 5
+    # Пока модель думает, остальные эндпоинты отвечают как обычно
+    assert load_root < base_root + 0.25
+    assert load_login < base_login * 2 + 0.25
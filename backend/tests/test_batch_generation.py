@@ -0,0 +1,84 @@
+import asyncio
+import json
+import uuid
+
+import httpx
+import pytest
+
+from backend.app.database import models
+from backend.app.routers import ai_routers
+from backend.app.security import create_access_token
+from backend.app.services.ai_backends import ChatBackend
+from backend.app.services.ai_integration import AIservice
+from backend.main import app
+from backend.tests.mock_model_server import MockModelServer, QUEST
+
+
+@pytest.fixture
+def player(database):
+    db = database.Session()
+    suffix = uuid.uuid4().hex[:8]
+    user = models.Player(username=f"batch_{suffix}", email=f"batch_{suffix}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    yield user
+    db.close()
+
+
+def test_batch_endpoint_generates_and_persists_in_one_call(database, player):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': player.username})}"}
+    original_client = ai_routers.ai_service.client
+
+    async def scenario(server):
+        ai_routers.ai_service.client = ChatBackend(base_url=server.url)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/ai/users/me/generate-quests", json={"count": 5}, headers=headers)
+        await ai_routers.ai_service.aclose()
+        return response
+
+    try:
+        with MockModelServer() as server:
+            response = asyncio.run(scenario(server))
+    finally:
+        ai_routers.ai_service.client = original_client
+
+    assert response.status_code == 200
+    body = response.json()
+    assert server.requests == 1
+    assert [item["quest"]["title"] for item in body] == [f"{QUEST['title']} {i}" for i in range(1, 6)]
+    assert all(len(item["tasks"]) == len(QUEST["steps"]) for item in body)
+
+    db = database.Session()
+    assert db.query(models.GeneratedQuest).filter(models.GeneratedQuest.user_id == player.id).count() == 5
+    assert db.query(models.Task).filter(models.Task.user_id == player.id).count() == 5 * len(QUEST["steps"])
+    db.close()
+
+
+def test_batch_parser_drops_invalid_items():
+    service = AIservice(client=None)
+    content = "Вот квесты:\n" + json.dumps([QUEST, {"title": "без шагов"}, QUEST], ensure_ascii=False)
+    quests = service._parse_ai_batch_response(content)
+    assert len(quests) == 2
+
+
+class ShortBackend:
+    """Модель, вернувшая меньше квестов, чем просили"""
+
+    async def complete(self, model, messages, **params):
+        return json.dumps([{**QUEST, "title": f"{QUEST['title']} {i}"} for i in (1, 2)], ensure_ascii=False)
+
+
+def test_batch_always_returns_count_with_fallback():
+    user = {"level": 1, "goals": [], "habits": [], "preferences": {}}
+    offline = AIservice(client=None)
+    short = AIservice(client=ShortBackend())
+
+    quests = asyncio.run(offline.generate_quests(user, 6))
+    assert len(quests) == 6 and len({quest["title"] for quest in quests}) == 6
+
+    quests = asyncio.run(short.generate_quests(user, 4))
+    assert [quest["title"] for quest in quests[:2]] == [f"{QUEST['title']} 1", f"{QUEST['title']} 2"]
+    assert len(quests) == 4 and len({quest["title"] for quest in quests}) == 4
+    assert len(asyncio.run(short.generate_quests(user, 4, fallback=False))) == 2
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from backend.app import security
+from backend.app.config import settings
+from backend.app.database import models
+from backend.app.database.db import async_database_url, engine_options
+from backend.app.database.models import Base
+from backend.app.security import create_access_token, get_current_user
+from backend.app.services.kv_store import MemoryStore
+from backend.app.services.principal_cache import PrincipalCache
+from backend.app.utils.metrics import metrics
+
+
+def test_pool_settings_and_metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 1)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 1)
+    monkeypatch.setattr(settings, "DB_POOL_TIMEOUT", 0.2)
+    url = f"sqlite:///{tmp_path}/pool.db"
+    engine = create_engine(url, **engine_options(url, "pool_test"))
+    timeouts_before = metrics.counter("db_pool_timeouts_total", engine="pool_test")
+
+    first, second = engine.connect(), engine.connect()
+    assert metrics.gauge("db_pool_checked_out", engine="pool_test") == 2
+    assert metrics.gauge("db_pool_overflow", engine="pool_test") == 1
+
+    # Третьему соединению места нет: ждёт pool_timeout и падает
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    assert metrics.counter("db_pool_timeouts_total", engine="pool_test") == timeouts_before + 1
+
+    # Освободившееся соединение достаётся ждущему, ожидание попадает в сводку
+    threading.Timer(0.05, second.close).start()
+    third = engine.connect()
+    wait = metrics.summary("db_pool_wait_seconds", engine="pool_test")
+    assert wait["p99"] >= 0.04
+
+    for connection in (first, third):
+        connection.close()
+    assert metrics.gauge("db_pool_checked_out", engine="pool_test") == 0
+    assert engine.pool.size() == 1 and engine.pool._recycle == settings.DB_POOL_RECYCLE
+    engine.dispose()
+
+
+@pytest.mark.parametrize("cache_enabled", [True, False])
+def test_current_user_reads_replica_and_falls_back_to_primary(tmp_path, monkeypatch, cache_enabled):
+    sessions = {}
+    for name in ("primary", "replica"):
+        url = f"sqlite:///{tmp_path}/{name}.db"
+        sync_engine = create_engine(url)
+        Base.metadata.create_all(bind=sync_engine)
+        sessions[name] = (sessionmaker(bind=sync_engine),
+                          async_sessionmaker(create_async_engine(async_database_url(url), poolclass=NullPool), expire_on_commit=False))
+
+    def add_player(name, username, level):
+        db = sessions[name][0]()
+        db.add(models.Player(username=username, email=f"{username}@example.com", hashed_password="x", level=level))
+        db.commit()
+        db.close()
+
+    add_player("primary", "lagging", 2)
+    add_player("replica", "lagging", 1)  # реплика ещё не получила повышение уровня
+    add_player("primary", "newcomer", 1)  # на реплику ещё не доехал
+
+    store = MemoryStore()
+    cache = PrincipalCache(store, enabled=cache_enabled)
+    monkeypatch.setattr(security, "principal_cache", cache)
+    monkeypatch.setattr(security, "shared_store", store)
+    monkeypatch.setattr(security, "read_replica_enabled", True)
+    monkeypatch.setattr(security, "AsyncSessionLocal", sessions["primary"][1])
+
+    async def current(username):
+        cache.clear()
+        async with sessions["replica"][1]() as replica:
+            return await get_current_user(token=create_access_token({"sub": username}), db=replica)
+
+    async def scenario():
+        stale = await current("lagging")
+        newcomer = await current("newcomer")
+        # Запись прошла — дальше читаем с основной, и без кэша тоже
+        await security.invalidate_principal(models.Player(id=1, username="lagging", email="lagging@example.com"))
+        fresh = await current("lagging")
+        return stale.level, newcomer.username, fresh.level
+
+    assert asyncio.run(scenario()) == (1, "newcomer", 2)
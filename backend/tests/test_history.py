@@ -0,0 +1,102 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import create_engine, inspect, text
+
+from backend.app.database import models
+from backend.app.database.migrations import migrate
+from backend.app.database.models import Base
+from backend.app.security import create_access_token
+from backend.main import app
+
+
+def create_history(database):
+    """Игрок с тремя квестами (health/sport) и 25 задачами; у части задач одинаковый created_at"""
+
+    username = f"history_{uuid.uuid4().hex[:8]}"
+    db = database.Session()
+    player = models.Player(username=username, email=f"{username}@example.com", hashed_password="x")
+    db.add(player)
+    db.flush()
+    start = datetime(2025, 1, 1)
+    quests = [models.GeneratedQuest(title=f"Квест {i}", description="", user_id=player.id,
+                                    category="sport" if i == 1 else "health", created_at=start + timedelta(days=i))
+              for i in range(3)]
+    db.add_all(quests)
+    db.flush()
+    for i in range(25):
+        db.add(models.Task(title=f"Задача {i}", user_id=player.id, quest_id=quests[i % 3].id,
+                           is_completed=i % 3 == 2,  # все задачи третьего квеста выполнены
+                           created_at=start + timedelta(minutes=i // 2)))  # пары с равным created_at
+    db.commit()
+    db.close()
+    return username
+
+
+def test_keyset_pages_and_filters(database):
+    username = create_history(database)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            results = {}
+
+            async def pages(path, **params):
+                items, cursor, count = [], None, 0
+                while True:
+                    query = {**params, **({"cursor": cursor} if cursor else {})}
+                    response = await client.get(path, headers=headers, params=query)
+                    assert response.status_code == 200, response.text
+                    body = response.json()
+                    items += body["items"]
+                    count += 1
+                    if body["next_cursor"] is None:
+                        return items, count
+                    cursor = body["next_cursor"]
+
+            results["tasks"] = await pages("/users/me/tasks", limit=4)
+            results["done"] = await pages("/users/me/tasks", limit=4, completed=True)
+            results["sport"] = await pages("/users/me/tasks", limit=100, category="sport")
+            results["quests"] = await pages("/users/me/quests", limit=2)
+            results["done_quests"] = await pages("/users/me/quests", completed=True)
+            results["open_quests"] = await pages("/users/me/quests", completed=False, category="health")
+            results["bad"] = await client.get("/users/me/tasks", headers=headers, params={"cursor": "garbage"})
+            return results
+
+    results = asyncio.run(scenario())
+
+    tasks, pages = results["tasks"]
+    assert pages == 7 and [task["title"] for task in tasks] == [f"Задача {i}" for i in range(24, -1, -1)]
+    keys = [(task["created_at"], task["id"]) for task in tasks]
+    assert keys == sorted(keys, reverse=True) and len(set(keys)) == 25
+
+    assert {task["title"] for task in results["done"][0]} == {f"Задача {i}" for i in range(2, 25, 3)}
+    assert {task["title"] for task in results["sport"][0]} == {f"Задача {i}" for i in range(1, 25, 3)}
+    assert [quest["title"] for quest in results["quests"][0]] == ["Квест 2", "Квест 1", "Квест 0"]
+    assert [quest["title"] for quest in results["done_quests"][0]] == ["Квест 2"]
+    assert [quest["title"] for quest in results["open_quests"][0]] == ["Квест 0"]
+    assert results["bad"].status_code == 400
+
+
+def test_migration_creates_listing_indexes(tmp_path):
+    legacy = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    Base.metadata.create_all(bind=legacy)
+    with legacy.begin() as connection:  # база, созданная до появления индексов
+        for name in ("ix_tasks_user_created", "ix_tasks_quest_id", "ix_generated_quests_user_created"):
+            connection.execute(text(f"DROP INDEX {name}"))
+
+    assert "0001_history_listing_indexes" in migrate(legacy)
+    assert migrate(legacy) == []
+    indexes = {index["name"]: index["column_names"] for index in inspect(legacy).get_indexes("tasks")}
+    assert indexes["ix_tasks_user_created"] == ["user_id", "created_at", "id"]
+    assert "ix_tasks_quest_id" in indexes
+
+    with legacy.connect() as connection:
+        plan = connection.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE user_id = 1 AND (created_at, id) < ('2025-01-01', 5) "
+            "ORDER BY created_at DESC, id DESC LIMIT 21")).all()
+    assert "ix_tasks_user_created" in " ".join(row[-1] for row in plan)
+    legacy.dispose()
@@ -0,0 +1,150 @@
+import asyncio
+import random
+import uuid
+from bisect import bisect_left
+from datetime import datetime, UTC
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from backend.app.database import models
+from backend.app.database.db import get_db, get_read_db
+from backend.app.database.models import Base
+from backend.app.routers.leaderboard import get_leaderboard
+from backend.app.security import create_access_token
+from backend.app.services.leaderboard import Leaderboard
+from backend.app.utils.ranking import RankedList
+from backend.main import app
+
+
+@pytest.fixture
+def board_db(tmp_path):
+    """Своя база на тест: рейтинг считает всех игроков в ней, чужие из прошлых запусков мешали бы"""
+    engine = create_engine(f"sqlite:///{tmp_path}/leaderboard.db")
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/leaderboard.db", poolclass=NullPool)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine), async_sessionmaker(async_engine,
+                                                                                          expire_on_commit=False)
+    engine.dispose()
+
+
+def create_player(session_factory, experience, category=None, points=()):
+    username = f"lb_{uuid.uuid4().hex[:8]}"
+    db = session_factory()
+    player = models.Player(username=username, email=f"{username}@example.com", hashed_password="x",
+                           experience=experience)
+    db.add(player)
+    db.flush()
+    task_ids = []
+    if category:
+        quest = models.GeneratedQuest(title="Квест", description="", category=category, user_id=player.id)
+        db.add(quest)
+        db.flush()
+        tasks = [models.Task(title=f"Шаг {i}", points=p, user_id=player.id, quest_id=quest.id)
+                 for i, p in enumerate(points)]
+        db.add_all(tasks)
+        db.flush()
+        task_ids = [task.id for task in tasks]
+    db.commit()
+    result = username, player.id, task_ids
+    db.close()
+    return result
+
+
+def test_ranked_list_matches_sorted_list():
+    rng = random.Random(3)
+    ranked, reference = RankedList(load=8), []
+    for _ in range(5000):
+        if reference and rng.random() < 0.4:
+            value = rng.choice(reference)
+            ranked.remove(value)
+            reference.remove(value)
+        else:
+            value = rng.randrange(-10 ** 12, 10 ** 12)
+            ranked.add(value)
+            reference.insert(bisect_left(reference, value), value)
+    assert list(ranked) == reference
+    for _ in range(300):
+        value, position = rng.randrange(-10 ** 12, 10 ** 12), rng.randrange(len(reference))
+        assert ranked.index(value) == bisect_left(reference, value)
+        assert ranked[position] == reference[position]
+        assert ranked.slice(position, position + 7) == reference[position:position + 7]
+
+
+def test_rank_top_and_neighbours_follow_completions(board_db):
+    session_factory, async_session_factory = board_db
+
+    async def override_get_db():
+        async with async_session_factory() as db:
+            yield db
+
+    category = f"cat_{uuid.uuid4().hex[:6]}"
+    leader, _, _ = create_player(session_factory, 500, category, [40])
+    chaser, chaser_id, chaser_tasks = create_player(session_factory, 100, category, [300, 200])
+    third, _, _ = create_player(session_factory, 50)
+    leaderboard = Leaderboard(session_factory)
+    asyncio.run(leaderboard.rebuild())
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_leaderboard] = lambda: leaderboard
+
+    def headers(username):
+        return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            before = (await client.get("/users/me/rank", headers=headers(chaser), params={"neighbours": 1})).json()
+            # Без синхронизации с базой: рейтинг обновляет само выполнение
+            await client.post("/users/me/tasks/complete", headers=headers(chaser), json={"task_ids": chaser_tasks})
+            after = (await client.get("/users/me/rank", headers=headers(chaser))).json()
+            top = (await client.get("/leaderboard", headers=headers(third), params={"limit": 3})).json()
+            by_category = (await client.get("/leaderboard", headers=headers(third),
+                                            params={"category": category})).json()
+            outside = (await client.get("/users/me/rank", headers=headers(third),
+                                        params={"category": category})).json()
+            return before, after, top, by_category, outside
+
+    try:
+        before, after, top, by_category, outside = asyncio.run(scenario())
+    finally:
+        app.dependency_overrides.pop(get_leaderboard)
+
+    assert before["rank"] == 2 and [entry["username"] for entry in before["neighbours"]] == [leader, chaser, third]
+    assert (after["rank"], after["experience"]) == (1, 600)
+    assert [(entry["rank"], entry["username"]) for entry in top["entries"]] == [(1, chaser), (2, leader), (3, third)]
+    assert by_category["total"] == 1 and by_category["entries"][0]["experience"] == 500
+    assert outside["rank"] is None and outside["neighbours"] == []
+
+
+def test_snapshot_restart_catches_up_without_full_scan(board_db, tmp_path):
+    session_factory, _ = board_db
+    path = str(tmp_path / "leaderboard.snapshot")
+    create_player(session_factory, 3000)
+    _, player_id, _ = create_player(session_factory, 1000)
+    first = Leaderboard(session_factory, snapshot_path=path)
+    asyncio.run(first.rebuild())
+    asyncio.run(first.save_snapshot())
+
+    # После снимка: игрок выполнил задачу в другом воркере, зарегистрировался новый
+    db = session_factory()
+    db.execute(update(models.Player).where(models.Player.id == player_id)
+               .values(experience=models.Player.experience + 5000))
+    db.add(models.Task(title="Задача", points=5000, user_id=player_id, is_completed=True,
+                       completed_at=datetime.now(UTC)))
+    db.commit()
+    db.close()
+    _, newcomer_id, _ = create_player(session_factory, 2000)
+
+    restarted = Leaderboard(session_factory, snapshot_path=path)
+    restarted._scan_all = None  # полный проход по базе здесь не нужен
+    asyncio.run(restarted.ready())
+
+    board = restarted.board()
+    assert len(board) == len(first.board()) + 1
+    assert board.score(player_id) == 6000 and board.rank(player_id) == 1
+    assert board.score(newcomer_id) == 2000 and board.rank(newcomer_id) == 3
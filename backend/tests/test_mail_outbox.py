@@ -0,0 +1,129 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, UTC
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.database.models import Base
+from backend.app.services.mail_outbox import MailSender, SMTPPool
+from backend.app.utils.mailer import enqueue_email
+from backend.main import app
+from backend.tests.smtp_stand_in import SMTPStandIn
+
+
+@pytest.fixture
+def outbox_db(tmp_path):
+    """Отдельная база: общий outbox тестов заполняют регистрации из других модулей"""
+    outbox_engine = create_engine(f"sqlite:///{tmp_path}/outbox.db")
+    Base.metadata.create_all(bind=outbox_engine)
+    yield sessionmaker(bind=outbox_engine)
+    outbox_engine.dispose()
+
+
+def enqueue(session_factory, addresses):
+    db = session_factory()
+    for address in addresses:
+        enqueue_email(db, address, "Тема", f"Письмо для {address}")
+    db.commit()
+    db.close()
+
+
+def statuses(session_factory):
+    db = session_factory()
+    rows = db.execute(select(models.OutboxMail.to_email, models.OutboxMail.status,
+                             models.OutboxMail.attempts)).all()
+    db.close()
+    return {email: (status, attempts) for email, status, attempts in rows}
+
+
+def make_sender(session_factory, smtp, **kwargs):
+    pool = SMTPPool("127.0.0.1", smtp.port, "game@example.com", "secret", starttls=False, size=2)
+    return MailSender(session_factory, pool, **kwargs)
+
+
+def test_register_only_enqueues_verification_mail(database):
+    suffix = uuid.uuid4().hex[:8]
+    email = f"mail_{suffix}@example.com"
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/auth/register", json={
+                "username": f"mail_{suffix}", "email": email, "password": "password123"})
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    db = database.Session()
+    mail = db.query(models.OutboxMail).filter(models.OutboxMail.to_email == email).one()
+    db.close()
+    assert mail.status == "pending" and "verify-email?token=" in mail.body
+
+
+def test_sender_reuses_pooled_sessions_and_reports_throughput(outbox_db):
+    addresses = [f"user{i}@example.com" for i in range(300)]
+    enqueue(outbox_db, addresses)
+
+    with SMTPStandIn() as smtp:
+        sender = make_sender(outbox_db, smtp, batch_size=50)
+
+        async def scenario():
+            started = time.perf_counter()
+            while await sender.send_once():
+                pass
+            elapsed = time.perf_counter() - started
+            await sender.pool.close()
+            return elapsed
+
+        elapsed = asyncio.run(scenario())
+
+    print(f"\nmail outbox: {len(addresses)} messages in {elapsed:.2f}s "
+          f"({len(addresses) / elapsed:.0f} msg/s), {smtp.connections} SMTP connections")
+    assert sorted(rcpt for rcpt, _ in smtp.messages) == sorted(addresses)
+    assert smtp.connections == smtp.logins == 2  # по логину на соединение пула, а не на письмо
+    assert {status for status, _ in statuses(outbox_db).values()} == {"sent"}
+
+
+def test_sender_retries_transient_and_fails_permanent(outbox_db):
+    enqueue(outbox_db, ["ok@example.com", "later@example.com", "bad@example.com"])
+
+    with SMTPStandIn() as smtp:
+        smtp.refuse_recipient("later@example.com", 451)
+        smtp.refuse_recipient("bad@example.com", 550)
+        sender = make_sender(outbox_db, smtp, retry_base=0.0)
+
+        async def scenario():
+            first = await sender.send_once()
+            after_first = statuses(outbox_db)
+            second = await sender.send_once()
+            await sender.pool.close()
+            return first, after_first, second
+
+        first, after_first, second = asyncio.run(scenario())
+
+    assert first == 3 and second == 1
+    assert after_first["ok@example.com"] == ("sent", 1)
+    assert after_first["later@example.com"] == ("pending", 1)
+    assert after_first["bad@example.com"] == ("failed", 1)
+    assert statuses(outbox_db)["later@example.com"] == ("sent", 2)
+    assert [rcpt for rcpt, _ in smtp.messages] == ["ok@example.com", "later@example.com"]
+
+
+def test_claimed_mail_is_not_sent_twice(outbox_db):
+    enqueue(outbox_db, ["once@example.com"])
+    with SMTPStandIn() as smtp:
+        sender = make_sender(outbox_db, smtp)
+        claimed = sender._claim(10)
+        # Второй воркер видит письмо в аренде и не берёт его
+        assert [mail["to_email"] for mail in claimed] == ["once@example.com"]
+        assert sender._claim(10) == []
+
+    db = outbox_db()
+    mail = db.query(models.OutboxMail).one()
+    db.close()
+    assert mail.next_attempt_at > datetime.now(UTC).replace(tzinfo=None)
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from backend.app.services.ai_integration import AIservice
+from backend.app.services.model_router import (BackendStats, ModelRouter, NoBackendAvailableError, RoutedBackend,
+                                                TemplateBackend, parse_backends)
+from backend.tests.mock_model_server import QUEST
+
+MESSAGES = [{"role": "user", "content": "квест"}]
+
+
+class FakeBackend:
+    """Мок-backend: фиксированная задержка, опциональная ошибка, учёт вызовов и отмен"""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+        self.closed_streams = 0
+
+    async def complete(self, model, messages, **params):
+        self.calls += 1
+        self.params = params
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return self.name
+
+    async def stream(self, model, messages, **params):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError(f"{self.name} is down")
+            for part in ("a", "b", "c"):
+                yield f"{self.name}:{part}"
+        finally:
+            self.closed_streams += 1
+
+
+def make_router(*backends, hedge_delay=0.0, template=None):
+    routed = [RoutedBackend(b.name, b, f"org/{b.name}") for b in backends]
+    if template is not None:
+        routed.append(RoutedBackend("template", TemplateBackend(lambda prompt, batch: template), None,
+                                    last_resort=True))
+    return ModelRouter(routed, hedge_delay=hedge_delay)
+
+
+def test_parse_backends():
+    assert parse_backends("a=org/m1@http://h1/v1, b=m2@http://h2:8000/v1") == [
+        ("a", "org/m1", "http://h1/v1"), ("b", "m2", "http://h2:8000/v1")]
+    assert parse_backends("") == []
+    with pytest.raises(ValueError):
+        parse_backends("broken")
+
+
+def test_stats_percentiles_and_circuit():
+    now = [0.0]
+    stats = BackendStats(window=10, cooldown=30, clock=lambda: now[0])
+    for latency in (0.1, 0.2, 0.3, 0.4, 1.0):
+        stats.record("complete", latency, ok=True)
+    assert stats.percentile("complete", 0.5) == 0.3
+    assert stats.percentile("complete", 0.95) == 1.0
+    assert stats.percentile("stream", 0.5) is None
+
+    for _ in range(3):
+        stats.record("complete", None, ok=False)
+    assert not stats.healthy()
+    now[0] = 31
+    assert stats.healthy()
+    stats.record("complete", None, ok=False)  # ошибка после паузы — снова вне ротации
+    assert not stats.healthy()
+
+
+def test_routes_to_fastest_healthy_backend():
+    slow, fast = FakeBackend("slow"), FakeBackend("fast")
+    router = make_router(slow, fast)
+    router.backends[0].stats.record("complete", 2.0, ok=True)
+    router.backends[1].stats.record("complete", 0.5, ok=True)
+
+    assert asyncio.run(router.complete(MESSAGES)) == "fast"
+    assert (slow.calls, fast.calls) == (0, 1)
+
+
+def test_user_model_hint_takes_priority():
+    slow, fast = FakeBackend("slow"), FakeBackend("fast")
+    router = make_router(slow, fast)
+    router.backends[0].stats.record("complete", 2.0, ok=True)
+    router.backends[1].stats.record("complete", 0.5, ok=True)
+
+    assert asyncio.run(router.complete(MESSAGES, hint="slow")) == "slow"
+    assert asyncio.run(router.complete(MESSAGES, hint="unknown-model")) == "fast"
+
+
+def test_hedged_request_takes_first_answer_and_cancels_loser():
+    stuck, quick = FakeBackend("stuck", delay=2.0), FakeBackend("quick", delay=0.05)
+    router = make_router(stuck, quick, hedge_delay=0.1)
+
+    async def scenario():
+        started = time.perf_counter()
+        result = await router.complete(MESSAGES)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0)  # даём отмене дойти до проигравшего
+        return result, elapsed
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == "quick"
+    assert elapsed < 0.5
+    assert (stuck.calls, quick.calls) == (1, 1)
+    assert stuck.cancelled == 1
+
+
+def test_failed_backend_drops_to_the_back():
+    broken, spare = FakeBackend("broken", fail=True), FakeBackend("spare", delay=0.01)
+    router = make_router(broken, spare)
+
+    async def scenario():
+        return [await router.complete(MESSAGES) for _ in range(5)]
+
+    assert asyncio.run(scenario()) == ["spare"] * 5
+    assert broken.calls == 1  # после первой ошибки broken уходит в конец очереди
+
+
+def test_template_is_last_resort_only():
+    down = FakeBackend("down", fail=True)
+    router = make_router(down, template=json.dumps(QUEST))
+
+    assert json.loads(asyncio.run(router.complete(MESSAGES))) == QUEST
+    with pytest.raises(NoBackendAvailableError):
+        asyncio.run(router.complete(MESSAGES, last_resort=False))
+
+
+def test_template_batch_is_explicit_and_distinct():
+    service = AIservice(client=FakeBackend("unused"))
+    remote = FakeBackend("remote")
+    service.client = ModelRouter([RoutedBackend("remote", remote, "org/remote"),
+                                  RoutedBackend("template", TemplateBackend(service._render_template), None,
+                                                last_resort=True)])
+    user = {"level": 1, "goals": ["здоровье"], "habits": [], "preferences": {}}
+
+    asyncio.run(service.client.complete(MESSAGES, batch=3))
+    assert "batch" not in remote.params  # в запрос к API не уходит
+
+    # Размер пачки не зависит от текста промпта
+    quests = json.loads(service._render_template("Цели: здоровье\nСделай несколько квестов", batch=7))
+    titles = [quest["title"] for quest in quests]
+    assert len(titles) == 7 and len(set(titles)) == 7
+    assert quests[0] == service._generate_fallback_quest(user)
+    assert json.loads(service._render_template("Цели: здоровье")) == service._generate_fallback_quest(user)
+
+
+def test_stream_hedge_switches_to_first_backend_with_a_chunk():
+    stuck, quick = FakeBackend("stuck", delay=2.0), FakeBackend("quick", delay=0.05)
+    router = make_router(stuck, quick, hedge_delay=0.1)
+
+    async def scenario():
+        chunks = [chunk async for chunk in router.stream(MESSAGES)]
+        await asyncio.sleep(0.01)
+        return chunks
+
+    assert asyncio.run(scenario()) == ["quick:a", "quick:b", "quick:c"]
+    assert stuck.closed_streams == 1 and quick.closed_streams == 1
+
+
+def test_service_fallback_only_when_allowed():
+    service = AIservice(client=make_router(FakeBackend("down", fail=True)))
+    service.cache = None
+    user = {"level": 1, "goals": ["здоровье"], "habits": [], "preferences": {}}
+
+    quest = asyncio.run(service.generate_quest(user, use_cache=False))
+    assert quest == service._generate_fallback_quest(user)
+
+    with pytest.raises(NoBackendAvailableError):
+        asyncio.run(service.generate_quest(user, use_cache=False, fallback=False))
@@ -0,0 +1,144 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from backend.app.database import models
+from backend.app.security import create_access_token
+from backend.app.services.kv_store import MemoryStore
+from backend.app.services.principal_cache import PrincipalCache
+from backend.main import app
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_player(player_id=1, name="cached"):
+    return models.Player(id=player_id, username=name, email=f"{name}@example.com", hashed_password="x",
+                         level=3, goals=["здоровье"], is_active=True)
+
+
+def test_lookup_put_ttl_and_lru():
+    clock = FakeClock()
+    cache = PrincipalCache(MemoryStore(clock=clock), max_entries=2, ttl=10, clock=clock)
+
+    async def scenario():
+        cached, version = await cache.lookup("a")
+        assert cached is None
+        cache.put("a", make_player(1, "a"), version)
+
+        cached, _ = await cache.lookup("a")
+        assert (cached.id, cached.level, cached.goals) == (1, 3, ["здоровье"])
+        cached.goals.append("мутация")  # копия на запрос — кэш не портится
+        assert (await cache.lookup("a"))[0].goals == ["здоровье"]
+
+        cache.put("b", make_player(2, "b"), "")
+        await cache.lookup("a")
+        cache.put("c", make_player(3, "c"), "")  # вытесняется "b": к "a" обращались позже
+        assert (await cache.lookup("b"))[0] is None
+        assert (await cache.lookup("a"))[0] is not None
+
+        clock.now = 11
+        assert (await cache.lookup("a"))[0] is None
+
+    asyncio.run(scenario())
+
+
+def test_invalidation_reaches_other_workers():
+    store = MemoryStore()
+    worker_a, worker_b = PrincipalCache(store), PrincipalCache(store)
+    player = make_player()
+
+    async def scenario():
+        for worker in (worker_a, worker_b):
+            _, version = await worker.lookup(player.username)
+            worker.put(player.username, player, version)
+
+        await worker_a.invalidate_player(player)
+        # worker_b ничего не знает о записи, но версия в общем хранилище уже другая
+        assert (await worker_b.lookup(player.username))[0] is None
+        assert (await worker_a.lookup(player.email))[0] is None
+
+    asyncio.run(scenario())
+
+
+def test_stale_put_is_discarded():
+    cache = PrincipalCache(MemoryStore())
+    player = make_player()
+
+    async def scenario():
+        _, version = await cache.lookup(player.username)
+        await cache.invalidate(player.username)  # игрока изменили, пока мы читали его из БД
+        cache.put(player.username, player, version)
+        assert (await cache.lookup(player.username))[0] is None
+
+    asyncio.run(scenario())
+
+
+def test_expired_version_does_not_revive_stale_entry():
+    clock = FakeClock()
+    cache = PrincipalCache(MemoryStore(clock=clock), ttl=10, clock=clock)
+    player = make_player()
+
+    async def scenario():
+        await cache.invalidate(player.username)
+        clock.now = 19  # кэшируем незадолго до истечения версии
+        _, version = await cache.lookup(player.username)
+        cache.put(player.username, player, version)
+        clock.now = 21  # версия истекла
+        await cache.invalidate(player.username)  # следующее изменение ставит новую, а не ту же
+        assert (await cache.lookup(player.username))[0] is None
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def player(database):
+    db = database.Session()
+    suffix = uuid.uuid4().hex[:8]
+    user = models.Player(username=f"principal_{suffix}", email=f"principal_{suffix}@example.com",
+                         hashed_password="x")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    yield user
+    db.close()
+
+
+def test_authenticated_requests_skip_player_query(database, player):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': player.username})}"}
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if "FROM players" in statement:
+            statements.append(statement)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.get("/ai/users/me/ai-settings", headers=headers)
+            queries_after_first = len(statements)
+            for _ in range(5):
+                assert (await client.get("/ai/users/me/ai-settings", headers=headers)).status_code == 200
+            queries_after_cached = len(statements)
+
+            updated = await client.put("/ai/users/me/ai-settings", json={"model": "llama-3"}, headers=headers)
+            after_update = await client.get("/ai/users/me/ai-settings", headers=headers)
+        return first, queries_after_first, queries_after_cached, updated, after_update
+
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        first, after_first, after_cached, updated, after_update = asyncio.run(scenario())
+    finally:
+        event.remove(database.async_engine.sync_engine, "before_cursor_execute", count)
+
+    assert first.status_code == 200 and after_first == 1
+    assert after_cached == after_first  # 5 запросов без обращения к players
+    assert updated.status_code == 200
+    assert after_update.json()["model"] == "llama-3"  # запись сбросила кэш
@@ -0,0 +1,134 @@
+import asyncio
+import random
+import uuid
+
+import httpx
+from sqlalchemy import create_engine, func, insert, select, text
+
+from backend.app.database import models
+from backend.app.database.migrations import migrate
+from backend.app.security import create_access_token
+from backend.app.utils.leveling import level_for_xp, xp_for_level
+from backend.main import app
+
+
+def create_player_with_tasks(database, points):
+    username = f"xp_{uuid.uuid4().hex[:8]}"
+    db = database.Session()
+    player = models.Player(username=username, email=f"{username}@example.com", hashed_password="x")
+    db.add(player)
+    db.flush()
+    tasks = [models.Task(title=f"Задача {i}", points=p, user_id=player.id) for i, p in enumerate(points)]
+    db.add_all(tasks)
+    db.commit()
+    result = username, player.id, [task.id for task in tasks]
+    db.close()
+    return result
+
+
+def player_state(database, player_id):
+    db = database.Session()
+    player = db.get(models.Player, player_id)
+    completed = db.scalar(select(func.count()).select_from(models.Task)
+                          .where(models.Task.user_id == player_id, models.Task.is_completed.is_(True)))
+    db.close()
+    return player.experience, player.level, completed
+
+
+def test_closed_form_level_matches_iteration():
+    def iterative(total):  # прежний check_level_up: опыт внутри уровня, уровни по одному
+        level, rest = 1, total
+        while rest >= level ** 2 * 100:
+            rest -= level ** 2 * 100
+            level += 1
+        return level
+
+    rng = random.Random(7)
+    totals = list(range(0, 5000, 7)) + [rng.randrange(10 ** 9) for _ in range(200)]
+    totals += [xp_for_level(level) + delta for level in range(2, 300) for delta in (-1, 0, 1)]
+    assert all(level_for_xp(total) == iterative(total) for total in totals)
+
+
+def test_complete_single_and_batch(database):
+    username, player_id, task_ids = create_player_with_tasks(database, [60, 50, 300])
+    _, _, foreign = create_player_with_tasks(database, [10])
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.post(f"/users/me/tasks/{task_ids[0]}/complete", headers=headers)
+            again = await client.post(f"/users/me/tasks/{task_ids[0]}/complete", headers=headers)
+            missing = await client.post(f"/users/me/tasks/{foreign[0]}/complete", headers=headers)
+            batch = await client.post("/users/me/tasks/complete", headers=headers,
+                                      json={"task_ids": task_ids + foreign})
+            return first.json(), again.json(), missing.status_code, batch.json()
+
+    first, again, missing, batch = asyncio.run(scenario())
+
+    assert (first["experience_gained"], first["level"], first["leveled_up"]) == (60, 1, False)
+    assert again["completed"] == [] and again["experience_gained"] == 0 and again["experience"] == 60
+    assert missing == 404
+    assert batch["completed"] == task_ids[1:] and batch["experience_gained"] == 350
+    # 410 опыта: уровень 2 начинается со 100, уровень 3 — с 500
+    assert (batch["experience"], batch["level"], batch["leveled_up"], batch["next_level_experience"]) == \
+           (410, 2, True, 500)
+    assert player_state(database, player_id) == (410, 2, 3)
+
+
+def test_parallel_completions_never_lose_experience(database):
+    points = [random.Random(i).randint(5, 200) for i in range(120)]
+    username, player_id, task_ids = create_player_with_tasks(database, points)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+    rng = random.Random(42)
+    # Пересекающиеся пачки и одиночные завершения: каждая задача приходит в нескольких запросах
+    requests = [("batch", rng.sample(task_ids, 15)) for _ in range(30)]
+    requests += [("single", [task_id]) for task_id in task_ids]
+    rng.shuffle(requests)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            # 16 запросов одновременно: больше SQLite с одним писателем упирается в busy timeout
+            in_flight = asyncio.Semaphore(16)
+
+            async def send(kind, ids):
+                async with in_flight:
+                    if kind == "single":
+                        return await client.post(f"/users/me/tasks/{ids[0]}/complete", headers=headers)
+                    return await client.post("/users/me/tasks/complete", headers=headers, json={"task_ids": ids})
+
+            return await asyncio.gather(*(send(kind, ids) for kind, ids in requests))
+
+    responses = asyncio.run(scenario())
+
+    assert all(response.status_code == 200 for response in responses)
+    bodies = [response.json() for response in responses]
+    completed = [task_id for body in bodies for task_id in body["completed"]]
+    assert sorted(completed) == sorted(task_ids)  # каждая задача закрыта ровно одним запросом
+    assert sum(body["experience_gained"] for body in bodies) == sum(points)
+    assert player_state(database, player_id) == (sum(points), level_for_xp(sum(points)), len(task_ids))
+
+
+def test_cumulative_experience_migration_skips_databases_built_by_create_all(tmp_path):
+    """0002 переводит опыт внутри уровня в суммарный только в старых базах, а не в созданных create_all"""
+
+    def migrate_twice(name, experience, legacy):
+        engine = create_engine(f"sqlite:///{tmp_path}/{name}.db")
+        models.Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            connection.execute(insert(models.Player).values(username=name, email=f"{name}@example.com",
+                                                            hashed_password="x", level=3, experience=experience))
+            if legacy:  # база до индексов истории, когда schema_migrations ещё не было
+                connection.execute(text("DROP INDEX ix_tasks_user_created"))
+        applied = [migrate(engine), migrate(engine)]
+        with engine.connect() as connection:
+            stored = connection.scalar(select(models.Player.experience))
+        engine.dispose()
+        return applied, stored
+
+    assert migrate_twice("current", xp_for_level(3) + 10, legacy=False) == ([[], []], xp_for_level(3) + 10)
+
+    (applied, again), stored = migrate_twice("legacy", 10, legacy=True)
+    assert "0002_cumulative_experience" in applied and again == []
+    assert stored == xp_for_level(3) + 10
@@ -0,0 +1,100 @@
+import asyncio
+import uuid
+
+from backend.app.services.ai_integration import AIservice
+from backend.app.services.quest_cache import QuestCache, profile_fingerprint
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingBackend:
+    """Фейковая модель: считает вызовы и каждый раз отдаёт новый квест"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def complete(self, model, messages, **params):
+        self.calls += 1
+        return ('{"title": "Квест %d", "description": "d", "steps": [], '
+                '"estimated_time": "1 день", "difficulty": "easy", "category": "health"}' % self.calls)
+
+    async def aclose(self):
+        pass
+
+
+def quest(n):
+    return {"title": f"q{n}"}
+
+
+def test_fingerprint_is_normalized():
+    a = {"level": 3, "goals": ["Здоровье", "спорт "], "habits": [], "preferences": {"a": 1}}
+    b = {"level": 3, "goals": ["спорт", "здоровье"], "habits": None, "preferences": {"a": 1}, "theme": None}
+    assert profile_fingerprint(a) == profile_fingerprint(b)
+    assert profile_fingerprint(a) != profile_fingerprint({**a, "category": "sport"})
+    assert profile_fingerprint(a) != profile_fingerprint({**a, "model": "Qwen2.5-7B-Instruct"})
+
+
+def test_variants_pool_then_hits():
+    cache = QuestCache(variants=2)
+
+    async def scenario():
+        assert await cache.get("k") is None
+        await cache.put("k", quest(1))
+        assert await cache.get("k") is None  # ещё копим разнообразие
+        await cache.put("k", quest(2))
+        return [await cache.get("k") for _ in range(10)]
+
+    served = asyncio.run(scenario())
+    assert all(q in (quest(1), quest(2)) for q in served)
+
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock()
+    cache = QuestCache(max_entries=2, ttl=10, variants=1, clock=clock)
+
+    async def scenario():
+        await cache.put("a", quest(1))
+        await cache.put("b", quest(2))
+        assert await cache.get("a") == quest(1)   # "a" становится свежее "b"
+        await cache.put("c", quest(3))            # вытесняет "b"
+        evicted = await cache.get("b")
+        clock.now = 11
+        expired = await cache.get("a")
+        return evicted, expired
+
+    evicted, expired = asyncio.run(scenario())
+    assert evicted is None
+    assert expired is None
+    stats = cache.stats()
+    assert stats["evictions_lru"] >= 1
+    assert stats["evictions_ttl"] >= 1
+
+
+def test_db_tier_survives_memory_loss(database):
+    key = uuid.uuid4().hex
+    cache = QuestCache(variants=1, session_factory=database.Session)
+
+    async def scenario():
+        await cache.put(key, quest(42))
+        cache.clear()
+        return await cache.get(key)
+
+    assert asyncio.run(scenario()) == quest(42)
+
+
+def test_generate_quest_uses_cache():
+    backend = CountingBackend()
+    service = AIservice(client=backend, cache=QuestCache(variants=2))
+    user_data = {"level": 1, "goals": ["здоровье"], "habits": [], "preferences": {}}
+
+    async def scenario():
+        return [await service.generate_quest(user_data) for _ in range(10)]
+
+    quests = asyncio.run(scenario())
+    assert backend.calls == 2
+    assert {q["title"] for q in quests} == {"Квест 1", "Квест 2"}
@@ -0,0 +1,110 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.database import models
+from backend.app.database.migrations import migrate
+from backend.app.database.models import Base
+from backend.app.services.ai_integration import AIservice
+from backend.app.services.quest_pool import QuestPool
+from backend.app.utils.metrics import metrics
+from backend.tests.test_quest_cache import CountingBackend
+
+@pytest.fixture
+def pool(database):
+    # Уникальная категория, чтобы не пересекаться с другими тестами в той же БД
+    category = f"cat_{uuid.uuid4().hex[:8]}"
+    service = AIservice(client=CountingBackend(), cache=None)
+    return QuestPool(service, database.Session, size=3, refill_batch=100, concurrency=2,
+                     level_bands="1-5,6-", categories=category)
+
+
+@pytest.fixture
+def players(database):
+    db = database.Session()
+    users = []
+    for _ in range(6):
+        suffix = uuid.uuid4().hex[:8]
+        user = models.Player(username=f"pool_{suffix}", email=f"pool_{suffix}@example.com", hashed_password="x")
+        db.add(user)
+        users.append(user)
+    db.commit()
+    ids = [u.id for u in users]
+    db.close()
+    return ids
+
+
+def test_band_for_level(pool):
+    assert pool.band_for_level(1) == "1-5"
+    assert pool.band_for_level(5) == "1-5"
+    assert pool.band_for_level(40) == "6-"
+
+
+def test_refill_tops_up_every_slot(pool):
+    created = asyncio.run(pool.refill_once())
+    assert created == 6  # 2 диапазона * size
+    category = pool.categories[0]
+    depths = {slot: depth for slot, depth in pool.depths().items() if slot[1] == category}  # база общая с прошлыми запусками
+    assert depths == {("1-5", category): 3, ("6-", category): 3}
+    assert metrics.gauge("quest_pool_depth", band="1-5", category=category) == 3
+
+    # Полный пул больше не пополняется
+    assert asyncio.run(pool.refill_once()) == 0
+
+
+def test_claim_assigns_quest_and_copies_steps(database, pool, players):
+    asyncio.run(pool.refill_once())
+    category = pool.categories[0]
+
+    async def claim():
+        async with database.AsyncSession() as db:
+            return await pool.claim(db, players[0], level=2, category=category)
+
+    quest = asyncio.run(claim())
+
+    assert quest is not None
+    assert quest.user_id == players[0]
+    db = database.Session()
+    tasks = db.query(models.Task).filter(models.Task.quest_id == quest.id).all()
+    assert len(tasks) == len(quest.steps)
+    assert all(t.user_id == players[0] for t in tasks)
+    db.close()
+    assert pool.depths()[("1-5", category)] == 2
+
+
+def test_concurrent_claims_never_share_a_quest(database, pool, players):
+    asyncio.run(pool.refill_once())
+    category = pool.categories[0]
+
+    async def claim(user_id):
+        async with database.AsyncSession() as db:
+            return await pool.claim(db, user_id, level=1, category=category, attempts=10)
+
+    async def claim_all():
+        return await asyncio.gather(*(claim(user_id) for user_id in players))
+
+    results = asyncio.run(claim_all())
+
+    claimed = [q.id for q in results if q is not None]
+    assert len(claimed) == len(set(claimed)) == 3
+
+
+def test_migration_adds_level_band_to_existing_table(tmp_path):
+    legacy = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    Base.metadata.create_all(bind=legacy)
+    with legacy.begin() as connection:  # generated_quests, созданная до пула предгенерации
+        connection.execute(text("DROP INDEX ix_generated_quests_level_band"))
+        connection.execute(text("ALTER TABLE generated_quests DROP COLUMN level_band"))
+
+    assert "0004_generated_quests_level_band" in migrate(legacy)
+    assert "level_band" in {column["name"] for column in inspect(legacy).get_columns("generated_quests")}
+    assert "ix_generated_quests_level_band" in {index["name"] for index in inspect(legacy).get_indexes("generated_quests")}
+
+    pool = QuestPool(AIservice(client=CountingBackend(), cache=None), sessionmaker(bind=legacy), size=1,
+                     level_bands="1-", categories="legacy")
+    assert asyncio.run(pool.refill_once()) == 1
+    assert pool.depths() == {("1-", "legacy"): 1}
+    legacy.dispose()
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from backend.app.database import models
+from backend.app.database.models import Base
+from backend.app.services.quest_store import save_pool_quests, save_quests
+
+
+def make_quest(n, steps=3):
+    return {
+        "title": f"Квест {n}", "description": "Описание", "estimated_time": "1 час",
+        "difficulty": "easy", "category": "health",
+        "steps": [{"title": f"Шаг {n}.{i}", "description": "", "points": 10 * (i + 1), "estimated_time": "10 минут"}
+                  for i in range(steps)],
+    }
+
+
+@pytest.fixture
+def store_db(tmp_path):
+    url = f"sqlite:///{tmp_path}/store.db"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    player = models.Player(username="store", email="store@example.com", hashed_password="x")
+    db.add(player)
+    db.commit()
+    user_id = player.id
+    db.close()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/store.db", poolclass=NullPool)
+    yield sessionmaker(bind=engine), async_sessionmaker(async_engine, expire_on_commit=False), user_id
+    engine.dispose()
+
+
+def counts(session_factory):
+    db = session_factory()
+    result = (db.scalar(select(func.count()).select_from(models.GeneratedQuest)),
+              db.scalar(select(func.count()).select_from(models.Task)))
+    db.close()
+    return result
+
+
+def test_save_quests_is_two_inserts_in_one_transaction(store_db):
+    session_factory, async_session_factory, user_id = store_db
+    statements = []
+
+    async def scenario():
+        async with async_session_factory() as db:
+            listener = lambda conn, cursor, statement, *args: statements.append(statement.split()[0])
+            event.listen(db.bind.sync_engine, "before_cursor_execute", listener)
+            try:
+                return await save_quests(db, user_id, [make_quest(n, steps=n + 1) for n in range(10)], "mock")
+            finally:
+                event.remove(db.bind.sync_engine, "before_cursor_execute", listener)
+
+    saved = asyncio.run(scenario())
+
+    assert statements == ["INSERT", "INSERT"]
+    assert [response.quest.title for response in saved] == [f"Квест {n}" for n in range(10)]
+    assert [len(response.tasks) for response in saved] == [n + 1 for n in range(10)]
+    assert all(task.title.startswith(f"Шаг {n}.") for n, response in enumerate(saved) for task in response.tasks)
+    assert saved[3].tasks[2].points == 30 and saved[0].quest.user_id == user_id
+    assert counts(session_factory) == (10, sum(range(1, 11)))
+
+
+def test_failed_task_insert_leaves_no_quest(store_db):
+    session_factory, async_session_factory, user_id = store_db
+    broken = make_quest(1)
+    broken["steps"][1]["title"] = None  # title задачи NOT NULL
+
+    async def scenario():
+        async with async_session_factory() as db:
+            await save_quests(db, user_id, [make_quest(0), broken], "mock")
+
+    with pytest.raises(IntegrityError):
+        asyncio.run(scenario())
+    assert counts(session_factory) == (0, 0)
+
+
+def test_save_pool_quests_keeps_band_and_order(store_db):
+    session_factory = store_db[0]
+    quests = [{**make_quest(n), "category": "sport", "level_band": "6-10"} for n in range(3)]
+
+    db = session_factory()
+    ids = save_pool_quests(db, quests, "mock")
+    rows = db.execute(select(models.GeneratedQuest.id, models.GeneratedQuest.title, models.GeneratedQuest.user_id,
+                             models.GeneratedQuest.level_band).order_by(models.GeneratedQuest.id)).all()
+    db.close()
+
+    assert [(row.id, row.title) for row in rows] == list(zip(ids, ["Квест 0", "Квест 1", "Квест 2"]))
+    assert {(row.user_id, row.level_band) for row in rows} == {(None, "6-10")}
+    assert counts(session_factory)[1] == 0
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import random
+import uuid
+
+import httpx
+import pytest
+
+from backend.app.database import models
+from backend.app.routers import ai_routers
+from backend.app.security import create_access_token
+from backend.app.services.ai_backends import ChatBackend
+from backend.app.services.quest_stream_parser import QuestStreamParser
+from backend.main import app
+from backend.tests.mock_model_server import MockModelServer, QUEST
+
+TRICKY_QUEST = {**QUEST, "title": 'Квест "в кавычках" {и скобках}', "description": "Строка с \\ и [массивом]"}
+
+
+def parse_all(chunks):
+    parser = QuestStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return parser, events
+
+
+def test_parser_emits_events_in_order_char_by_char():
+    text = "```json\n" + json.dumps(TRICKY_QUEST, ensure_ascii=False) + "\n```"
+    parser, events = parse_all(list(text))
+
+    assert parser.finished
+    assert [e for e, _ in events] == ["title", "description", "step", "step", "done"]
+    assert events[0][1] == TRICKY_QUEST["title"]
+    assert events[1][1] == TRICKY_QUEST["description"]
+    assert events[2][1] == QUEST["steps"][0]
+    assert events[-1][1] == TRICKY_QUEST
+
+
+def test_parser_is_independent_of_chunking():
+    text = json.dumps(TRICKY_QUEST, ensure_ascii=False)
+    rng = random.Random(7)
+    for _ in range(20):
+        cuts = sorted(rng.sample(range(1, len(text)), 15))
+        chunks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        _, events = parse_all(chunks)
+        assert events[-1] == ("done", TRICKY_QUEST)
+
+
+def test_parser_reports_unfinished_stream():
+    text = json.dumps(QUEST, ensure_ascii=False)
+    parser, events = parse_all([text[: len(text) // 2]])
+    assert not parser.finished
+    assert ("title", QUEST["title"]) in events
+
+
+@pytest.fixture
+def player(database):
+    db = database.Session()
+    suffix = uuid.uuid4().hex[:8]
+    user = models.Player(username=f"stream_{suffix}", email=f"stream_{suffix}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    yield user
+    db.close()
+
+
+def read_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_endpoint_persists_steps_incrementally(database, player):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': player.username})}"}
+    original_client = ai_routers.ai_service.client
+
+    async def scenario(server):
+        ai_routers.ai_service.client = ChatBackend(base_url=server.url)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/ai/users/me/generate-quest-stream",
+                                         json={"theme": uuid.uuid4().hex}, headers=headers)
+        await ai_routers.ai_service.aclose()
+        return response
+
+    try:
+        with MockModelServer(chunk_delay=0.001) as server:
+            response = asyncio.run(scenario(server))
+    finally:
+        ai_routers.ai_service.client = original_client
+
+    assert response.status_code == 200
+    events = read_sse(response.text)
+    assert [e for e, _ in events] == ["title", "description", "step", "step", "done"]
+
+    quest_id = events[-1][1]["quest"]["id"]
+    step_events = [data for event, data in events if event == "step"]
+    assert all(data["quest_id"] == quest_id and data["task_id"] for data in step_events)
+
+    db = database.Session()
+    quest = db.get(models.GeneratedQuest, quest_id)
+    assert quest.user_id == player.id
+    assert quest.steps == QUEST["steps"]
+    tasks = db.query(models.Task).filter(models.Task.quest_id == quest_id).order_by(models.Task.id).all()
+    assert [t.id for t in tasks] == [data["task_id"] for data in step_events]
+    db.close()
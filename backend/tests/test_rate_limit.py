@@ -0,0 +1,202 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+
+from backend.app.database import models
+from backend.app.database.db import get_db
+from backend.app.security import get_password_hash
+from backend.app.services.kv_store import MemoryStore
+from backend.app.services.rate_limiter import Limit, LocalBuckets, StoreBuckets, parse_rate_limits
+from backend.app.utils.metrics import metrics
+from backend.main import app, rate_limiter
+
+db_sessions = []
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def limits(database, monkeypatch):
+    """Подменяет правила глобального лимитера на тестовые, со свежими вёдрами"""
+
+    async def counting_get_db():
+        db_sessions.append(1)
+        async for db in database.get_db():
+            yield db
+
+    def apply(spec):
+        monkeypatch.setattr(rate_limiter, "rules", parse_rate_limits(spec))
+        monkeypatch.setattr(rate_limiter, "buckets", LocalBuckets(shards=4))
+        monkeypatch.setattr(rate_limiter, "enabled", True)
+
+    db_sessions.clear()
+    app.dependency_overrides[get_db] = counting_get_db
+    return apply
+
+
+def test_parse_rate_limits():
+    rules = parse_rate_limits("/lg/login ip=20/60 account=5/30; /auth/register ip=3/3600")
+    assert rules["/lg/login"].ip == Limit(20, 60.0)
+    assert rules["/lg/login"].account == Limit(5, 30.0)
+    assert rules["/auth/register"].account is None
+    with pytest.raises(ValueError):
+        parse_rate_limits("/lg/login user=5/60")
+
+
+def test_local_buckets_burst_refill_and_compaction():
+    clock = FakeClock()
+    buckets = LocalBuckets(shards=2, max_keys_per_shard=4, clock=clock)
+    limit = Limit(3, 30)  # 1 токен в 10 секунд
+
+    async def scenario():
+        assert [await buckets.hit("k", limit) for _ in range(3)] == [0, 0, 0]
+        assert await buckets.hit("k", limit) == pytest.approx(10)
+        clock.now += 10
+        assert await buckets.hit("k", limit) == 0
+        assert await buckets.hit("k", limit) > 0
+
+        for i in range(20):
+            await buckets.hit(f"other{i}", limit)
+        clock.now += 60  # все вёдра снова полные — при переполнении шарда их можно выбросить
+        for i in range(20, 40):
+            await buckets.hit(f"other{i}", limit)
+        keys = {key for _, shard in buckets._shards for key in shard}
+        assert keys == {f"other{i}" for i in range(20, 40)}
+
+    asyncio.run(scenario())
+
+
+def test_compaction_keeps_buckets_of_slower_limits():
+    clock = FakeClock()
+    buckets = LocalBuckets(shards=1, max_keys_per_shard=4, clock=clock)
+    slow, fast = Limit(1, 3600), Limit(3, 30)
+
+    async def scenario():
+        assert await buckets.hit("slow", slow) == 0
+        clock.now += 60  # по окну fast ведро давно было бы полным, по своему — ещё нет
+        for i in range(10):
+            await buckets.hit(f"fast{i}", fast)
+        return await buckets.hit("slow", slow)
+
+    assert asyncio.run(scenario()) == pytest.approx(3600 - 60)
+
+
+def test_store_buckets_share_counters_between_workers():
+    clock = FakeClock()
+    store = MemoryStore(clock=clock)
+    workers = [StoreBuckets(store, clock=clock), StoreBuckets(store, clock=clock)]
+    limit = Limit(2, 60)
+
+    async def scenario():
+        assert await workers[0].hit("k", limit) == 0
+        assert await workers[1].hit("k", limit) == 0
+        assert await workers[0].hit("k", limit) == pytest.approx(60 - 1000 % 60)
+        clock.now += 60
+        assert await workers[1].hit("k", limit) == 0
+
+    asyncio.run(scenario())
+
+
+def test_login_limited_by_account_before_db_and_bcrypt(limits):
+    limits("/lg/login ip=100/60 account=2/60")
+    account = f"victim_{uuid.uuid4().hex[:8]}"
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            allowed = [await client.post("/lg/login", data={"username": account, "password": "wrong"})
+                       for _ in range(2)]
+            sessions, verifies = len(db_sessions), metrics.counter("password_hash_total", op="verify")
+            limited = await client.post("/lg/login", data={"username": account.upper(), "password": "wrong"})
+            untouched = (len(db_sessions), metrics.counter("password_hash_total", op="verify")) == (sessions, verifies)
+            other = await client.post("/lg/login", data={"username": "someone_else", "password": "wrong"})
+        return allowed, limited, untouched, other
+
+    allowed, limited, untouched, other = asyncio.run(scenario())
+
+    assert [r.status_code for r in allowed] == [400, 400]
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+    assert untouched  # отказ без сессии БД и без bcrypt
+    assert other.status_code == 400
+
+
+def test_username_and_email_share_one_account_bucket(database, limits):
+    limits("/lg/login ip=100/60 account=2/60")
+    suffix = uuid.uuid4().hex[:8]
+    username, email = f"both_{suffix}", f"both_{suffix}@example.com"
+    db = database.Session()
+    db.add(models.Player(username=username, email=email, hashed_password=get_password_hash("password123")))
+    db.commit()
+    db.close()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [(await client.post("/lg/login", data={"username": login, "password": "wrong"})).status_code
+                    for login in (username, email, username, email)]
+
+    # Каждый идентификатор сам по себе ещё в лимите, но учётка одна
+    assert asyncio.run(scenario()) == [400, 400, 429, 429]
+
+
+def test_account_limit_covers_multipart_and_rejects_other_formats(limits):
+    limits("/lg/login ip=100/60 account=2/60")
+    account = f"multi_{uuid.uuid4().hex[:8]}"
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            statuses = [(await client.post("/lg/login", files={"username": (None, account),
+                                                                "password": (None, "wrong")})).status_code
+                        for _ in range(3)]
+            plain = await client.post("/lg/login", content=f"username={account}",
+                                      headers={"content-type": "text/plain"})
+        return statuses, plain
+
+    statuses, plain = asyncio.run(scenario())
+    assert statuses == [400, 400, 429]
+    assert plain.status_code == 415
+
+
+def test_oversized_body_rejected_instead_of_skipping_account_limit(limits):
+    limits("/lg/login ip=100/60 account=1/60")
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/lg/login", data={"username": "victim", "password": "wrong",
+                                                        "padding": "x" * 70_000})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 413
+    assert db_sessions == []
+
+
+def test_register_limited_by_ip_and_body_passed_through(limits):
+    limits("/auth/register ip=1/60")
+    suffix = uuid.uuid4().hex[:8]
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.post("/auth/register", json={
+                "username": f"rl_{suffix}", "email": f"rl_{suffix}@example.com", "password": "password123"})
+            second = await client.post("/auth/register", json={
+                "username": f"rl2_{suffix}", "email": f"rl2_{suffix}@example.com", "password": "password123"})
+            root = await client.post("/")
+        return first, second, root
+
+    first, second, root = asyncio.run(scenario())
+
+    assert first.status_code == 200 and first.json()["username"] == f"rl_{suffix}"
+    assert second.status_code == 429
+    assert root.status_code == 405  # пути без правил лимитер не трогает
@@ -0,0 +1,90 @@
+import asyncio
+import uuid
+from datetime import datetime, UTC
+
+import httpx
+import pytest
+from jose import jwt
+
+from backend.app import security
+from backend.app.database import models
+from backend.app.services.kv_store import MemoryStore
+from backend.app.services.refresh_tokens import RefreshTokenStore, TokenReuseError, TokenRevokedError
+from backend.main import app
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def player(database):
+    db = database.Session()
+    suffix = uuid.uuid4().hex[:8]
+    user = models.Player(username=f"refresh_{suffix}", email=f"refresh_{suffix}@example.com",
+                         hashed_password=security.get_password_hash("password123"))
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    yield user
+    db.close()
+
+
+def test_refresh_token_lives_for_days():
+    token = security.create_refresh_token({"sub": "someone"})
+    claims = jwt.decode(token, security.REFRESH_SECRET_KEY, algorithms=[security.ALGORITHM])
+    lifetime = claims["exp"] - datetime.now(UTC).timestamp()
+    assert lifetime > (security.REFRESH_TOKEN_EXPIRE_DAYS - 1) * 86400
+    assert claims["fam"] == claims["jti"]
+
+
+def test_rotation_reuse_and_expiry_compaction():
+    clock = FakeClock()
+    kv = MemoryStore(clock=clock, compact_every=1)
+    store = RefreshTokenStore(kv, family_ttl=100, clock=clock)
+
+    async def scenario():
+        first = {"jti": "a", "fam": "f", "exp": clock.now + 50}
+        await store.rotate(first)
+        with pytest.raises(TokenReuseError):
+            await store.rotate(first)
+        with pytest.raises(TokenRevokedError):
+            await store.rotate({"jti": "b", "fam": "f", "exp": clock.now + 50})
+
+        await store.rotate({"jti": "c", "fam": "other", "exp": clock.now + 10})
+        clock.now += 200
+        await kv.set("tick", 1)  # любая запись запускает уборку истёкших ключей
+        assert len(kv) == 1
+
+    asyncio.run(scenario())
+
+
+def test_refresh_endpoint_rotates_and_detects_reuse(player):
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            login = await client.post("/lg/login", data={"username": player.username, "password": "password123"})
+            first = login.json()["refresh_token"]
+
+            rotated = await client.post("/lg/refresh", json={"refresh_token": first})
+            second = rotated.json()["refresh_token"]
+
+            reused = await client.post("/lg/refresh", json={"refresh_token": first})
+            # После повтора отозвано всё семейство, включая свежий токен
+            after_reuse = await client.post("/lg/refresh", json={"refresh_token": second})
+            garbage = await client.post("/lg/refresh", json={"refresh_token": "not.a.token"})
+        return login, rotated, reused, after_reuse, garbage, first, second
+
+    login, rotated, reused, after_reuse, garbage, first, second = asyncio.run(scenario())
+
+    assert login.status_code == 200
+    assert rotated.status_code == 200 and second != first
+    assert jwt.get_unverified_claims(rotated.json()["access_token"])["sub"] == player.email
+    assert jwt.get_unverified_claims(second)["fam"] == jwt.get_unverified_claims(first)["fam"]
+    assert reused.status_code == 401
+    assert after_reuse.status_code == 401
+    assert garbage.status_code == 401
@@ -0,0 +1,100 @@
+import asyncio
+import io
+import json
+import uuid
+
+import httpx
+from sqlalchemy import event, select
+
+from backend.app.database import models
+from backend.app.database.sqlite import SQLiteWriter
+from backend.app.security import get_password_hash, verify_password
+from backend.app.services.password_hasher import PasswordHasher
+from backend.app.services.player_import import PlayerImporter, read_records
+from backend.main import app
+
+
+def test_register_is_single_insert_and_maps_conflicts(database):
+    suffix = uuid.uuid4().hex[:8]
+    user = {"username": f"reg_{suffix}", "email": f"reg_{suffix}@example.com", "password": "password123"}
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if "players" in statement:
+            statements.append(statement.split()[0])
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Запись идёт либо через сессию обработчика, либо через писателя SQLite — слушаем оба движка
+            engines = [database.async_engine.sync_engine,
+                       SQLiteWriter.for_engine(database.async_engine).engine.sync_engine]
+            for sync_engine in engines:
+                event.listen(sync_engine, "before_cursor_execute", record)
+            try:
+                created = await client.post("/auth/register", json=user)
+            finally:
+                for sync_engine in engines:
+                    event.remove(sync_engine, "before_cursor_execute", record)
+            same_email = await client.post("/auth/register", json={**user, "username": f"other_{suffix}"})
+            same_username = await client.post("/auth/register", json={**user, "email": f"other_{suffix}@example.com"})
+        return created, same_email, same_username
+
+    created, same_email, same_username = asyncio.run(scenario())
+
+    assert created.status_code == 200
+    assert created.json()["level"] == 1 and created.json()["username"] == user["username"]
+    assert statements == ["INSERT"]
+    assert (same_email.status_code, same_email.json()["detail"]) == (400, "Email already registered")
+    assert (same_username.status_code, same_username.json()["detail"]) == (400, "Username already taken")
+
+
+def test_read_records_numbers_physical_lines():
+    # Поле в кавычках через две строки и пустые строки сдвигают номер записи относительно строки файла
+    csv_text = 'username,email\n"multi\nline",a@example.com\nplain,b@example.com\n'
+    ndjson = '{"username": "a"}\n\n\n{"username": "b"}\n'
+
+    assert [line for line, _ in read_records(io.StringIO(csv_text), "csv")] == [3, 4]
+    assert [line for line, _ in read_records(io.StringIO(ndjson), "ndjson")] == [1, 4]
+
+
+def test_bulk_import_csv_and_ndjson(database):
+    suffix = uuid.uuid4().hex[:8]
+    prehashed = get_password_hash("partnerpass")
+    existing = models.Player(username=f"taken_{suffix}", email=f"taken_{suffix}@example.com", hashed_password="x")
+    db = database.Session()
+    db.add(existing)
+    db.commit()
+    db.close()
+
+    rows = ["username,email,password,hashed_password",
+            f"csv_a_{suffix},csv_a_{suffix}@example.com,password123,"]
+    rows += [f"csv_{i}_{suffix},csv_{i}_{suffix}@example.com,,{prehashed}" for i in range(5)]
+    rows += [f"taken_{suffix},new_{suffix}@example.com,,{prehashed}",   # логин уже занят в БД
+             f"csv_0_{suffix},dup_{suffix}@example.com,,{prehashed}",   # повтор внутри файла
+             f"short_{suffix},short_{suffix}@example.com,123,",         # пароль короче 8 символов
+             f"cut_{suffix},cut_{suffix}@example.com,,{prehashed[:-1]}"]  # обрезанный хэш
+    ndjson = "\n".join(json.dumps({"username": f"nd_{i}_{suffix}", "email": f"nd_{i}_{suffix}@example.com",
+                                   "hashed_password": prehashed}) for i in range(3))
+    # Обрезанная строка, строка не с объектом и хэш не строкой — отклоняются, импорт продолжается
+    ndjson += '\n\n{"username": "broken",\n[1, 2]\n' + json.dumps(
+        {"username": f"nd_x_{suffix}", "email": f"nd_x_{suffix}@example.com", "hashed_password": 12345})
+
+    importer = PlayerImporter(database.Session, PasswordHasher(use_processes=False), batch_size=2)
+    csv_report = asyncio.run(importer.run(read_records(io.StringIO("\n".join(rows)), "csv")))
+    nd_report = asyncio.run(importer.run(read_records(io.StringIO(ndjson), "ndjson")))
+
+    assert (csv_report.inserted, csv_report.duplicates, csv_report.invalid) == (6, 2, 2)
+    assert "line 10" in csv_report.errors[0]  # номер строки в файле, считая заголовок
+    assert csv_report.errors[1].startswith("line 11: hashed_password")
+    assert (nd_report.inserted, nd_report.duplicates, nd_report.invalid) == (3, 0, 3)
+    assert [error.split(":")[0] for error in nd_report.errors] == ["line 5", "line 6", "line 7"]
+    assert "invalid JSON" in nd_report.errors[0] and "hashed_password" in nd_report.errors[2]
+
+    db = database.Session()
+    hashed = db.execute(select(models.Player.hashed_password)
+                        .where(models.Player.username == f"csv_a_{suffix}")).scalar_one()
+    imported = db.query(models.Player).filter(models.Player.username == f"nd_2_{suffix}").one()
+    db.close()
+    assert verify_password("password123", hashed)
+    assert imported.hashed_password == prehashed and imported.level == 1
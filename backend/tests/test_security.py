@@ -7,28 +7,29 @@ from jose import jwt
 
 from backend.app import security
 from backend.app.database import models
+from backend.app.services.password_hasher import PasswordHasher
 
 
 # ---------- FIXTURES ----------
 
 class DummyDB:
-    """Фейковая база для тестов"""
+    """Фейковая асинхронная база для тестов"""
     def __init__(self, users):
         self.users = users
 
-    def query(self, model):
-        return self
-
-    def filter(self, condition):
-        username = condition.right.value  # достаем имя из фильтра
+    async def execute(self, statement):
+        username = statement.whereclause.right.value  # достаем имя из фильтра
         user = next((u for u in self.users if u.username == username), None)
-        return DummyQuery(user)
+        return DummyResult(user)
 
 
-class DummyQuery:
+class DummyResult:
     def __init__(self, user):
         self.user = user
 
+    def scalars(self):
+        return self
+
     def first(self):
         return self.user
 
@@ -98,6 +99,28 @@ def test_password_hash_and_verify():
     assert security.verify_password("wrongpass", hashed) is False
 
 
+def test_password_hash_and_verify_in_process_pool():
+    hasher = PasswordHasher(workers=2)
+
+    async def scenario():
+        hashed = await hasher.hash("password123")
+        checks = await asyncio.gather(hasher.verify("password123", hashed), hasher.verify("wrongpass", hashed))
+        return hashed, checks
+
+    try:
+        hashed, checks = asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
+
+    assert security.verify_password("password123", hashed) is True
+    assert checks == [True, False]
+
+
+def test_async_hash_rejects_too_long_password():
+    with pytest.raises(ValueError):
+        asyncio.run(security.get_password_hash_async("x" * 73))
+
+
 def test_create_access_token_and_decode():
     data = {"sub": "testuser"}
     token = security.create_access_token(data, expires_delta=timedelta(minutes=5))
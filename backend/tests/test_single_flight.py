@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+from backend.app.services.ai_integration import AIservice
+from backend.app.services.single_flight import SharedStream
+from backend.tests.mock_model_server import QUEST
+
+N = 20
+
+
+class SlowMockBackend:
+    """Мок-модель: отвечает с задержкой и считает upstream-вызовы"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.complete_calls = 0
+        self.stream_calls = 0
+
+    async def complete(self, model, messages, **params):
+        self.complete_calls += 1
+        await asyncio.sleep(self.delay)
+        return json.dumps(QUEST, ensure_ascii=False)
+
+    async def stream(self, model, messages, **params):
+        self.stream_calls += 1
+        content = json.dumps(QUEST, ensure_ascii=False)
+        for i in range(0, len(content), 20):
+            await asyncio.sleep(self.delay / 10)
+            yield content[i:i + 20]
+
+    async def aclose(self):
+        pass
+
+
+def make_service(backend):
+    service = AIservice(client=backend)
+    service.cache = None
+    return service
+
+
+USER = {"level": 2, "goals": ["здоровье"], "habits": [], "preferences": {}}
+
+
+def test_identical_requests_share_one_upstream_call():
+    backend = SlowMockBackend()
+    service = make_service(backend)
+
+    async def scenario():
+        return await asyncio.gather(*(service.generate_quest(dict(USER)) for _ in range(N)))
+
+    quests = asyncio.run(scenario())
+    assert backend.complete_calls == 1
+    assert all(q["title"] == QUEST["title"] for q in quests)
+
+
+def test_different_profiles_are_not_merged():
+    backend = SlowMockBackend()
+    service = make_service(backend)
+
+    async def scenario():
+        return await asyncio.gather(*(service.generate_quest({**USER, "level": i}) for i in range(5)))
+
+    asyncio.run(scenario())
+    assert backend.complete_calls == 5
+
+
+def test_streaming_subscribers_each_get_full_replay():
+    backend = SlowMockBackend()
+    service = make_service(backend)
+
+    async def consume(delay):
+        await asyncio.sleep(delay)  # опоздавшие подписчики тоже получают всё с начала
+        chunks = await service.generate_quest(dict(USER), stream=True)
+        return "".join([chunk async for chunk in chunks])
+
+    async def scenario():
+        return await asyncio.gather(*(consume(i * 0.01) for i in range(N)))
+
+    texts = asyncio.run(scenario())
+    assert backend.stream_calls == 1
+    assert all(json.loads(text) == QUEST for text in texts)
+
+
+def test_follower_cancellation_does_not_cancel_shared_call():
+    backend = SlowMockBackend()
+    service = make_service(backend)
+
+    async def scenario():
+        leader = asyncio.create_task(service.generate_quest(dict(USER)))
+        follower = asyncio.create_task(service.generate_quest(dict(USER)))
+        await asyncio.sleep(0.05)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(scenario())["title"] == QUEST["title"]
+    assert backend.complete_calls == 1
+
+
+def test_stream_without_subscribers_is_cancelled_after_attach_timeout():
+    async def endless():
+        while True:
+            await asyncio.sleep(0.01)
+            yield "chunk"
+
+    async def scenario():
+        orphan = SharedStream(endless(), attach_timeout=0.05)  # клиент ушёл до начала ответа
+        attached = SharedStream(endless(), attach_timeout=0.05)
+        subscription = attached.subscribe()
+        await subscription.__anext__()
+        await asyncio.sleep(0.15)
+        state = orphan.cancelled, attached.cancelled
+        await subscription.aclose()
+        return state
+
+    assert asyncio.run(scenario()) == (True, False)
@@ -0,0 +1,137 @@
+import asyncio
+import uuid
+
+import httpx
+from sqlalchemy import create_engine, event, func, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from backend.app.config import settings
+from backend.app.database import models
+from backend.app.database.db import tune_sqlite
+from backend.app.database.sqlite import SQLiteWriter
+from backend.app.routers import ai_routers
+from backend.app.security import create_access_token, create_email_token
+from backend.main import app
+from backend.tests.mock_model_server import QUEST
+
+
+def temp_database(tmp_path):
+    engine = tune_sqlite(create_engine(f"sqlite:///{tmp_path}/app.db"))
+    models.Base.metadata.create_all(bind=engine)
+    return engine, create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/app.db", poolclass=NullPool)
+
+
+def player(n):
+    return {"username": f"w{n}", "email": f"w{n}@example.com", "hashed_password": "x"}
+
+
+def test_pragmas_applied_on_connect(tmp_path):
+    engine, _ = temp_database(tmp_path)
+    with engine.connect() as connection:
+        pragma = lambda name: connection.execute(text(f"PRAGMA {name}")).scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("cache_size") == -65536 and pragma("busy_timeout") == 5000
+    engine.dispose()
+
+
+def test_writer_group_commits_and_isolates_failed_blocks(tmp_path):
+    engine, writer_source = temp_database(tmp_path)
+    writer = SQLiteWriter.for_engine(writer_source)
+    commits = []
+    event.listen(writer.engine.sync_engine, "commit", lambda conn: commits.append(1))
+
+    async def write(n):
+        async with writer.session() as db:
+            await db.execute(insert(models.Player).values(**player(n)))
+            if n % 10 == 3:
+                raise RuntimeError("block failed")  # без commit: savepoint блока откатывается
+            await db.commit()
+
+    async def scenario():
+        results = await asyncio.gather(*(write(n) for n in range(60)), return_exceptions=True)
+        await writer.close()
+        return results
+
+    results = asyncio.run(scenario())
+
+    failed = {n for n, result in enumerate(results) if isinstance(result, RuntimeError)}
+    assert failed == {n for n in range(60) if n % 10 == 3}
+    with engine.connect() as connection:
+        names = set(connection.scalars(select(models.Player.username)))
+    assert names == {f"w{n}" for n in range(60) if n not in failed}
+    assert 0 < len(commits) < 60 / 4  # блоки, стоявшие в очереди вместе, ушли одним COMMIT
+    engine.dispose()
+
+
+def test_concurrent_registrations_do_not_lock(database):
+    suffix = uuid.uuid4().hex[:6]
+
+    async def register(n):
+        # Свой адрес на запрос: лимит регистраций — на IP
+        transport = httpx.ASGITransport(app=app, client=(f"10.0.0.{n + 1}", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            return await client.post("/auth/register", json={"username": f"sq_{suffix}_{n}", "password": "password123",
+                                                             "email": f"sq_{suffix}_{n}@example.com"})
+
+    async def scenario():
+        return await asyncio.gather(*(register(n) for n in range(20)))
+
+    responses = asyncio.run(scenario())
+
+    assert [response.status_code for response in responses] == [200] * 20
+
+    async def count():
+        async with database.AsyncSession() as db:
+            return await db.scalar(select(func.count()).select_from(models.Player)
+                                   .where(models.Player.username.like(f"sq_{suffix}_%")))
+
+    assert asyncio.run(count()) == 20
+
+
+def test_handler_writes_go_through_the_writer(database, monkeypatch):
+    """Настройки AI, подтверждение email, выдача из пула и стрим квеста пишут через SQLiteWriter"""
+
+    band = ai_routers.quest_pool.band_for_level(1)
+    with database.engine.begin() as connection:
+        user_id = connection.execute(insert(models.Player).values(**player(1))).inserted_primary_key[0]
+        connection.execute(insert(models.GeneratedQuest).values(
+            title="Из пула", description="d", steps=QUEST["steps"][:1], estimated_time="1h", difficulty="easy",
+            ai_generated=True, level_band=band, category="pool"))
+
+    sessions = []
+    session = SQLiteWriter.session
+    monkeypatch.setattr(SQLiteWriter, "session", lambda writer: sessions.append(1) or session(writer))
+    monkeypatch.setattr(settings, "QUEST_POOL_ENABLED", True)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'w1'})}"}
+
+    async def scenario():
+        writes = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.put("/ai/users/me/ai-settings", headers=headers,
+                                        json={"enabled": True, "model": "local"})
+            writes.append((response.status_code, len(sessions)))
+            response = await client.get("/auth/verify-email", params={"token": create_email_token({"sub": "w1@example.com"})})
+            writes.append((response.status_code, len(sessions)))
+            response = await client.post("/ai/users/me/generate-quest", headers=headers, json={"category": "pool"})
+            writes.append((response.status_code, len(sessions)))
+
+        writer = ai_routers.StreamingQuestWriter(database.async_engine, user_id, "local")
+        for kind, payload in [("title", QUEST["title"]), ("description", QUEST["description"]),
+                               ("step", QUEST["steps"][0]), ("done", QUEST)]:
+            await writer.handle(kind, payload)
+        writes.append((writer.quest_id, len(sessions)))
+        return writes
+
+    writes = asyncio.run(scenario())
+
+    assert writes[:3] == [(200, 1), (200, 2), (200, 3)]
+    assert writes[3][0] is not None and writes[3][1] == 7  # по блоку записи на каждое событие стрима
+    with database.engine.connect() as connection:
+        stored = connection.execute(select(models.Player.ai_settings, models.Player.is_verified)).one()
+        assert stored[0]["model"] == "local" and stored[1]
+        owners = dict(connection.execute(select(models.GeneratedQuest.title, models.GeneratedQuest.user_id)).all())
+        assert owners == {"Из пула": user_id, QUEST["title"]: user_id}
+        assert connection.scalar(select(func.count()).select_from(models.Task)) == 2  # шаг квеста из пула и шаг из стрима
@@ -0,0 +1,120 @@
+import asyncio
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta, UTC
+
+import httpx
+from sqlalchemy import select
+
+from backend.app.database import models
+from backend.app.security import create_access_token
+from backend.app.services.stats import StatsBackfill, read_stats, record_completions
+from backend.main import app
+
+
+def create_player(database, tasks=()):
+    """tasks — (points, категория квеста или None, completed_at или None)"""
+    username = f"stats_{uuid.uuid4().hex[:8]}"
+    db = database.Session()
+    player = models.Player(username=username, email=f"{username}@example.com", hashed_password="x")
+    db.add(player)
+    db.flush()
+    quests = {}
+    task_ids = []
+    for points, category, completed_at in tasks:
+        if category and category not in quests:
+            quests[category] = models.GeneratedQuest(title="Квест", description="", category=category,
+                                                     user_id=player.id)
+            db.add(quests[category])
+            db.flush()
+        task = models.Task(title="Задача", points=points, user_id=player.id,
+                           quest_id=quests[category].id if category else None,
+                           is_completed=completed_at is not None, completed_at=completed_at)
+        db.add(task)
+        db.flush()
+        task_ids.append(task.id)
+    db.commit()
+    result = username, player.id, task_ids
+    db.close()
+    return result
+
+
+def rollups(database, player_id):
+    db = database.Session()
+    rows = db.execute(select(models.DailyStat.day, models.DailyStat.category, models.DailyStat.tasks_completed,
+                             models.DailyStat.experience).where(models.DailyStat.user_id == player_id)).all()
+    streak = db.get(models.PlayerStreak, player_id)
+    db.close()
+    return ({(day, category): (tasks, xp) for day, category, tasks, xp in rows},
+            (streak.current_streak, streak.longest_streak, streak.last_active_day) if streak else None)
+
+
+def test_completions_feed_stats_endpoint(database):
+    username, player_id, task_ids = create_player(database, [(30, "health", None), (20, "health", None), (5, None, None)])
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post(f"/users/me/tasks/{task_ids[0]}/complete", headers=headers)
+            await client.post("/users/me/tasks/complete", headers=headers, json={"task_ids": task_ids})
+            return (await client.get("/users/me/stats", headers=headers, params={"days": 7})).json()
+
+    stats = asyncio.run(scenario())
+
+    today = datetime.now(UTC).date()
+    assert len(stats["days"]) == 7 and stats["days"][-1] == \
+           {"day": today.isoformat(), "tasks_completed": 3, "experience": 55}
+    assert sum(day["tasks_completed"] for day in stats["days"][:-1]) == 0
+    assert stats["categories"] == [{"category": None, "tasks_completed": 1, "experience": 5},
+                                   {"category": "health", "tasks_completed": 2, "experience": 50}]
+    assert (stats["week_tasks_completed"], stats["week_experience"]) == (3, 55)
+    assert (stats["current_streak"], stats["longest_streak"]) == (1, 1)
+
+
+def test_streak_continues_resets_and_expires(database):
+    _, player_id, _ = create_player(database)
+    start = date(2024, 3, 1)
+
+    async def scenario():
+        async with database.AsyncSession() as db:
+            for offset in (0, 1, 2, 2, 4, 5):  # три дня подряд, пропуск, ещё два
+                await record_completions(db, player_id, [(0, 10, None)], start + timedelta(days=offset))
+            await db.commit()
+            return [await read_stats(db, player_id, 7, start + timedelta(days=offset)) for offset in (5, 6, 7)]
+
+    on_day, next_day, expired = asyncio.run(scenario())
+
+    assert rollups(database, player_id)[1] == (2, 3, start + timedelta(days=5))
+    assert (on_day.current_streak, next_day.current_streak, expired.current_streak) == (2, 2, 0)
+    assert expired.longest_streak == 3
+    assert on_day.days[-1].tasks_completed == 1 and on_day.days[4].tasks_completed == 0  # 2024-03-04 пропущен
+
+
+def test_backfill_matches_history_resumes_and_never_double_counts(database):
+    start = datetime(2020, 5, 4, 10, 0)
+    history = [(10 + i % 7, ["health", "career", None][i % 3], start + timedelta(hours=13 * i)) for i in range(40)]
+    _, player_id, _ = create_player(database, history + [(99, "health", None)])  # невыполненная не считается
+
+    expected = defaultdict(lambda: [0, 0])
+    for points, category, completed_at in history:
+        expected[(completed_at.date(), category or "")][0] += 1
+        expected[(completed_at.date(), category or "")][1] += points
+
+    name = f"test_{uuid.uuid4().hex[:8]}"  # своя запись прогресса: в общей базе есть задачи других тестов
+    first = StatsBackfill(database.Session, chunk_size=6)
+    first.NAME = name
+    first.prepare(cutoff=datetime(2021, 1, 1))
+    assert first._backfill_chunk() > 0  # «упал» после первого куска
+
+    resumed = StatsBackfill(database.Session, chunk_size=6)
+    resumed.NAME = name
+    assert resumed.prepare(cutoff=datetime(2030, 1, 1)) == (datetime(2021, 1, 1), False)  # cutoff прежний
+    resumed.run()
+    assert resumed.prepare() == (datetime(2021, 1, 1), True)
+    assert resumed.run() == 0  # уже дошли до конца: ничего не прибавляется повторно
+
+    days, streak = rollups(database, player_id)
+    assert days == {key: tuple(value) for key, value in expected.items()}
+    assert streak == (len({completed_at.date() for _, _, completed_at in history}),) * 2 + \
+           (history[-1][2].date(),)
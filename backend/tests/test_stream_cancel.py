@@ -0,0 +1,164 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+import httpx
+import pytest
+import uvicorn
+
+from backend.app.database import models
+from backend.app.routers import ai_routers
+from backend.app.security import create_access_token
+from backend.app.services.ai_backends import ChatBackend
+from backend.app.services.stream_registry import StreamRegistry, parse_last_event_id
+from backend.app.utils.metrics import metrics
+from backend.main import app
+from backend.tests.mock_model_server import MockModelServer, QUEST, _free_port
+
+
+@pytest.fixture
+def player(database):
+    db = database.Session()
+    suffix = uuid.uuid4().hex[:8]
+    user = models.Player(username=f"cancel_{suffix}", email=f"cancel_{suffix}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    yield user
+    db.close()
+
+
+@pytest.fixture
+def app_server():
+    """Настоящий uvicorn: через ASGITransport разрыв соединения клиентом не проверить"""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "App server did not start"
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_client_disconnect_cancels_upstream_generation(player, app_server):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': player.username})}"}
+    original_client = ai_routers.ai_service.client
+
+    content = json.dumps(QUEST, ensure_ascii=False)
+    chunks = [content[i:i + 4] for i in range(0, len(content), 4)]
+    cancelled_before = metrics.counter("ai_stream_cancelled_total")
+
+    try:
+        with MockModelServer(chunk_delay=0.05, chunks=chunks) as server:
+            ai_routers.ai_service.client = ChatBackend(base_url=server.url)
+            with httpx.Client(base_url=app_server, timeout=10) as client:
+                with client.stream("POST", "/ai/users/me/generate-quest-stream",
+                                   json={"theme": uuid.uuid4().hex}, headers=headers) as response:
+                    assert response.status_code == 200
+                    for line in response.iter_lines():
+                        if line.startswith("event: title"):
+                            break
+            # Клиент ушёл, дочитав только название
+
+            assert wait_for(lambda: metrics.counter("ai_stream_cancelled_total") > cancelled_before)
+            assert wait_for(lambda: ai_routers.ai_service.admission.active == 0)
+            sent_after_cancel = server.chunks_sent
+            time.sleep(0.5)
+            assert server.chunks_sent <= sent_after_cancel + 1
+            assert server.chunks_sent < len(chunks) // 2
+    finally:
+        ai_routers.ai_service.client = original_client
+
+
+def sse_blocks(response):
+    """(id, event, data) из SSE-ответа; комментарии-пинги пропускаются"""
+    block = {}
+    for line in response.iter_lines():
+        if not line:
+            if "event" in block:
+                yield block.get("id"), block["event"], json.loads(block["data"])
+            block = {}
+        elif not line.startswith(":"):
+            key, _, value = line.partition(": ")
+            block[key] = value
+
+
+def test_reconnect_with_last_event_id_resumes_same_generation(player, app_server):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': player.username})}"}
+    original_client = ai_routers.ai_service.client
+
+    content = json.dumps(QUEST, ensure_ascii=False)
+    chunks = [content[i:i + 4] for i in range(0, len(content), 4)]
+    body = {"theme": uuid.uuid4().hex, "resumable": True}
+
+    try:
+        with MockModelServer(chunk_delay=0.02, chunks=chunks) as server:
+            ai_routers.ai_service.client = ChatBackend(base_url=server.url)
+            with httpx.Client(base_url=app_server, timeout=10) as client:
+                url = "/ai/users/me/generate-quest-stream"
+                with client.stream("POST", url, json=body, headers=headers) as response:
+                    stream_id = response.headers["X-Stream-ID"]
+                    first = next(sse_blocks(response))
+                assert first[0] == f"{stream_id}:1" and first[1] == "title"
+
+                # Обрыв после первого события — переподключаемся и дочитываем
+                with client.stream("POST", url, json=body, headers={**headers, "Last-Event-ID": first[0]}) as response:
+                    assert response.status_code == 200
+                    rest = list(sse_blocks(response))
+                assert [e for _, e, _ in rest] == ["description", "step", "step", "done"]
+                assert [i for i, _, _ in rest] == [f"{stream_id}:{n}" for n in range(2, 6)]
+
+                # Завершённую генерацию можно перечитать целиком
+                with client.stream("POST", url, json=body,
+                                   headers={**headers, "Last-Event-ID": f"{stream_id}:0"}) as response:
+                    replay = list(sse_blocks(response))
+                assert [e for _, e, _ in replay] == ["title", "description", "step", "step", "done"]
+                assert replay[-1][2]["quest"]["id"] == rest[-1][2]["quest"]["id"]
+
+                unknown = client.post(url, json=body, headers={**headers, "Last-Event-ID": "nope:1"})
+                assert unknown.status_code == 404
+                malformed = client.post(url, json=body, headers={**headers, "Last-Event-ID": "garbage"})
+                assert malformed.status_code == 400
+
+            assert server.requests == 1  # ни одно переподключение не запустило новую генерацию
+    finally:
+        ai_routers.ai_service.client = original_client
+
+
+def test_registry_ttl_eviction_and_owner():
+    async def source():
+        yield "event"
+
+    async def scenario():
+        now = [0.0]
+        registry = StreamRegistry(max_streams=2, ttl=10, grace=0, clock=lambda: now[0])
+        first, _ = registry.start(1, source())
+        second, _ = registry.start(1, source())
+        assert registry.get(first, owner=2) is None
+        assert registry.get(first, owner=1) is not None
+
+        registry.start(1, source())
+        assert registry.get(first, owner=1) is None  # вытеснен как самый старый
+        now[0] = 11
+        assert registry.get(second, owner=1) is None and len(registry) == 0
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert parse_last_event_id("abc:7") == ("abc", 7)
+    with pytest.raises(ValueError):
+        parse_last_event_id("abc")
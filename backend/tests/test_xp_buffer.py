@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import uuid
+
+import httpx
+from sqlalchemy import event, func, select
+
+from backend.app.database import models
+from backend.app.security import create_access_token
+from backend.app.services.progression import complete_tasks
+from backend.app.services.xp_buffer import XPBuffer
+from backend.main import app
+
+
+def create_player_with_tasks(database, points):
+    username = f"xpbuf_{uuid.uuid4().hex[:8]}"
+    db = database.Session()
+    player = models.Player(username=username, email=f"{username}@example.com", hashed_password="x")
+    db.add(player)
+    db.flush()
+    tasks = [models.Task(title=f"Задача {i}", points=p, user_id=player.id) for i, p in enumerate(points)]
+    db.add_all(tasks)
+    db.commit()
+    result = username, player.id, [task.id for task in tasks]
+    db.close()
+    return result
+
+
+def stored(database, player_id):
+    db = database.Session()
+    player = db.get(models.Player, player_id)
+    journal = db.scalar(select(func.count()).select_from(models.XPJournal).where(models.XPJournal.user_id == player_id))
+    db.close()
+    return player.experience, player.level, journal
+
+
+def complete_each(database, buffer, player_id, task_ids):
+    async def scenario():
+        for task_id in task_ids:
+            async with database.AsyncSession() as db:
+                await complete_tasks(db, player_id, [task_id], buffer)
+
+    asyncio.run(scenario())
+
+
+def test_flush_coalesces_into_one_update_per_player(database):
+    buffer = XPBuffer(database.Session, max_pending=10 ** 6)
+    _, first, first_tasks = create_player_with_tasks(database, [40] * 10)
+    _, second, second_tasks = create_player_with_tasks(database, [70] * 5)
+    complete_each(database, buffer, first, first_tasks)
+    complete_each(database, buffer, second, second_tasks)
+    assert stored(database, first) == (0, 1, 10) and stored(database, second) == (0, 1, 5)  # players ещё не тронут
+
+    updates = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE PLAYERS SET EXPERIENCE"):
+            updates.append(len(parameters) if executemany else 1)
+
+    event.listen(database.engine, "before_cursor_execute", count)
+    try:
+        asyncio.run(buffer.flush())
+    finally:
+        event.remove(database.engine, "before_cursor_execute", count)
+
+    assert updates == [2]  # один executemany на пачку, по строке на игрока
+    assert stored(database, first) == (400, 2, 0) and stored(database, second) == (350, 2, 0)
+
+
+def test_journal_survives_lost_buffer_and_is_merged_on_read(database):
+    username, player_id, task_ids = create_player_with_tasks(database, [60, 50])
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+    # Процесс, который записал опыт в журнал, «упал» до переноса: от буфера ничего не осталось
+    complete_each(database, XPBuffer(database.Session), player_id, task_ids)
+
+    async def progress():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.get("/users/me/progress", headers=headers)).json()
+
+    assert stored(database, player_id) == (0, 1, 2)
+    before = asyncio.run(progress())
+    assert (before["experience"], before["level"], before["next_level_experience"]) == (110, 2, 500)
+
+    # Журнал переносит любой другой экземпляр
+    assert asyncio.run(XPBuffer(database.Session).flush()) >= 2
+    assert stored(database, player_id) == (110, 2, 0)
+    assert asyncio.run(progress()) == before
+
+
+def test_concurrent_flushes_apply_each_record_once(database):
+    buffer = XPBuffer(database.Session, batch_size=7)
+    _, player_id, task_ids = create_player_with_tasks(database, list(range(1, 41)))
+    complete_each(database, buffer, player_id, task_ids)
+
+    barrier = threading.Barrier(4)
+    moved = []
+
+    def flush():
+        barrier.wait()
+        moved.append(asyncio.run(buffer.flush()))
+
+    threads = [threading.Thread(target=flush) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stored(database, player_id)[0] == sum(range(1, 41)) and stored(database, player_id)[2] == 0
+    assert sum(moved) >= 40  # записи других тестов тоже могли оказаться в журнале